@@ -3,6 +3,7 @@ import asyncio
 import configparser
 import inspect
 import json
+from itertools import chain
 from pathlib import Path
 from typing import Type
 
@@ -10,51 +11,90 @@ import aiometer
 import orjson
 import pandas as pd
 from async_timeout import timeout
-from openpyxl import load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.workbook import Workbook
-from openpyxl.worksheet.worksheet import Worksheet
 
 from loguru import logger
 from pandas import DataFrame
 from tqdm.asyncio import tqdm
 
+from lib.DealDatabase import DealDatabase
 from lib.constants import GLOBAL_COUPON_PROVIDERS
 from stores.lib import BaseStore
-from utils.spreadsheets import write_grouped_rows_with_colors, clean_workbook
+from utils.spreadsheets import (
+    register_named_styles,
+    write_csv,
+    write_formatted_rows,
+    write_grouped_rows_with_colors,
+)
 import coupons
 import stores
 from offline_folium import offline   # noqa
 
 from stores.lib.constants import HEADERS
+from utils.call_ai_model_gemini import (
+    get_extraction_cache,
+    get_extraction_client,
+    get_rate_limiter,
+)
 from utils.config import get_config
+from utils.deal_database import get_deal_database, get_deal_history, get_output_writer
+from utils.dedup import get_deduplicator
+from utils.executors import run_in_process, run_in_thread, shutdown_executors
 from utils.geocoding import determine_store_paths
+from utils.telemetry import get_telemetry
 from utils.matching import match_multiple_columns
+from utils.normalization import column_style, deals_frame, frame_rows, to_python
+from utils.parquet_export import export_parquet
 
 logger.remove()
 
 # Log all errors, warnings, and info to the console
 logger.add(tqdm.write, level='DEBUG')
 
-Worksheet.to_list = lambda ws: list(ws.iter_rows(values_only=True))
-
 
 async def main():
     Path('output/stores').mkdir(exist_ok=True, parents=True)
     section = _setup_config()
+    get_extraction_client()
 
     await _handle_stores(section)
     await _handle_coupons(section)
 
+    # every row has to be committed before the matchups and the export read the deal database
+    output_writer = get_output_writer()
+    await output_writer.close()
+    logger.info(f'Output writer stats: {output_writer.stats()}')
+    if deal_history := get_deal_history():
+        logger.info(f'Deal history stats: {deal_history.stats()}')
+        deal_history.close()
+
+    extraction_cache = get_extraction_cache()
+    logger.info(f'Extraction cache stats: {extraction_cache.stats()}')
+    extraction_cache.close()
+    logger.info(f'Gemini rate limiter stats: {get_rate_limiter().stats()}')
+    logger.info(f'Cross-store deduplication stats: {get_deduplicator().stats()}')
+    logger.info(f'Gemini model tier stats: {get_extraction_client().tier_stats()}')
+    logger.info(f'Gemini credential pool stats: {get_extraction_client().pool.stats()}')
+    if encoding_stats := get_extraction_client().encoding_stats():
+        logger.info(f'Prompt input tokens per item by encoding: {encoding_stats}')
+
+    telemetry_path = section.get('TELEMETRY_PATH', 'output/telemetry.json')
+    telemetry_summary = get_telemetry().write_summary(telemetry_path)
+    logger.info(
+        f'Extraction telemetry written to {telemetry_path} ({telemetry_summary["total"]["calls"]} calls, cost {telemetry_summary["total"]["cost"]})'
+    )
+
     await _compare_products()
     await determine_store_paths()
 
+    shutdown_executors()
+
 
 async def _compare_products():
-    wb = load_workbook('output/stores.xlsx')
-    sheet_names = wb.sheetnames
+    deal_database = get_deal_database()
+    sheet_names = deal_database.sheet_names()
 
-    newspaper_coupons = get_global_coupons(sheet_names, wb)
+    newspaper_coupons = get_global_coupons(sheet_names, deal_database)
 
     tasks = []
     # get the sales
@@ -66,7 +106,7 @@ async def _compare_products():
 
         tasks.append(
             run_matchups_for_store(
-                newspaper_coupons, sheet_name, sheet_names, wb
+                newspaper_coupons, sheet_name, sheet_names, deal_database
             )
         )
 
@@ -77,48 +117,97 @@ async def _compare_products():
             logger.error(f'Error comparing products: {result}')
             continue
 
-    clean_workbook(wb)
+    # the workbook is only an export of the deal database, so it is written once, at the end of the run
+    await run_in_thread(_save_workbook, sheet_names, deal_database)
+    await run_in_thread(_split_sheets_by_store, sheet_names, deal_database)
+
+    section = get_config()['config']
+    if section.getboolean('PARQUET_EXPORT', True):
+        parquet_path = section.get('PARQUET_EXPORT_PATH', 'output/parquet')
+        counts = await run_in_thread(
+            export_parquet,
+            sheet_names,
+            deal_database,
+            parquet_path,
+            section.get('PARQUET_COMPRESSION', 'zstd'),
+        )
+        if counts:
+            logger.info(f'Parquet datasets written to {parquet_path}: {counts}')
 
-    wb.save('output/stores.xlsx')
+    deal_database.close()
+
+
+MATCHUP_CSV_HEADERS = [*HEADERS, 'Matched Field', 'Matched Value', 'Match Percentage', 'Matched Rows']
+
+
+def _save_workbook(sheet_names: list[str], deal_database: DealDatabase):
+    # a write-only workbook streams every sheet to disk as it is written, so memory stays flat
+    wb = Workbook(write_only=True)
+    styles = register_named_styles(wb)
+
+    title_header = [h.replace('_', ' ').title() for h in HEADERS]
+    for sheet_name in sheet_names:
+        if deal_database.get_matchup_columns(sheet_name):
+            write_grouped_rows_with_colors(
+                chain(
+                    [deal_database.get_matchup_columns(sheet_name)],
+                    deal_database.iter_matchups(sheet_name),
+                ),
+                wb.create_sheet(f'{sheet_name}-matchups'),
+                styles,
+            )
 
-    _split_sheets_by_store(wb)
+    for sheet_name in sheet_names:
+        # one store's table at a time, typed in a single columnar pass
+        sales = deals_frame(deal_database.iter_values(sheet_name))
+        write_formatted_rows(
+            wb.create_sheet(title=sheet_name),
+            styles,
+            HEADERS,
+            title_header,
+            [column_style(sales[column]) for column in HEADERS],
+            frame_rows(sales),
+        )
 
+    wb.save('output/stores.xlsx')
     wb.close()
 
 
-def _split_sheets_by_store(wb: Workbook):
+def _split_sheets_by_store(sheet_names: list[str], deal_database: DealDatabase):
     if Path('output/stores').exists():
         shutil.rmtree('output/stores')
 
     Path('output/stores').mkdir(exist_ok=True, parents=True)
 
-    # split the stores into separate files
-    sheet_names = wb.sheetnames
+    # split the stores into separate files, streamed straight from the deal database
     for sheet_name in sheet_names:
+        if deal_database.get_matchup_columns(sheet_name):
+            write_csv(
+                f'output/stores/{sheet_name}-matchups.csv',
+                MATCHUP_CSV_HEADERS,
+                deal_database.iter_matchups(sheet_name),
+            )
+
         if sheet_name.endswith(('coupons', 'com')):
             continue
 
-        # convert the sheet to a dataframe
-        sales = wb[sheet_name]
-        values = list(sales.values)[1:]
-        sales = DataFrame(values, columns=HEADERS if not sheet_name.endswith('matchups') else [*HEADERS, "Matched Field", "Matched Value", 'Match Percentage', 'Matched Rows'])
-
-        # save it as a csv
-        sales.to_csv(f'output/stores/{sheet_name}.csv', index=False)
+        write_csv(
+            f'output/stores/{sheet_name}.csv',
+            HEADERS,
+            deal_database.iter_values(sheet_name),
+        )
 
 
-def get_global_coupons(sheet_names: list[str], wb: Workbook):
+def get_global_coupons(sheet_names: list[str], deal_database: DealDatabase):
     global_coupons = []
 
     for sheet_name in sheet_names:
         if not sheet_name.endswith(GLOBAL_COUPON_PROVIDERS):
             continue
 
-        sheet = wb[sheet_name]
-        values = list(sheet.values)[1:]
-        global_coupons.extend(values)
+        global_coupons.extend(deal_database.iter_values(sheet_name))
 
-    global_coupons = DataFrame(global_coupons, columns=HEADERS)
+    global_coupons = to_python(deals_frame(global_coupons))
 
     if global_coupons.empty:
         logger.error('No coupons found in the global coupon sheets')
@@ -130,15 +219,16 @@ async def run_matchups_for_store(
     newspaper_coupons: DataFrame,
     sheet_name: str,
     sheet_names: list[str],
-    wb: Workbook,
+    deal_database: DealDatabase,
 ):
     sales, total_coupons = _get_sales_and_coupons(
-        newspaper_coupons, sheet_name, sheet_names, wb
+        newspaper_coupons, sheet_name, sheet_names, deal_database
     )
 
     try:
-        # compare the products
-        matches = match_multiple_columns(
+        # compare the products - fuzzy matching is CPU-bound, so it runs in the process pool
+        matches = await run_in_process(
+            match_multiple_columns,
             total_coupons,
             sales,
             ['brand_name', 'product_name', 'product_variety'],
@@ -148,31 +238,29 @@ async def run_matchups_for_store(
         )
     except Exception as e:
         logger.error(f'Error comparing products for {sheet_name}: {e}')
+        # don't export the matchups of an earlier run this week
+        deal_database.set_matchups(sheet_name, [], [])
         return
 
-    sheet = wb.create_sheet(f'{sheet_name}-matchups', 0)
-    rows = dataframe_to_rows(matches, index=False, header=True)
-
-    write_grouped_rows_with_colors(rows, sheet)
+    deal_database.set_matchups(
+        sheet_name,
+        list(matches.columns),
+        frame_rows(matches),
+    )
 
 
 def _get_sales_and_coupons(
     newspaper_coupons: DataFrame,
     sheet_name: str,
     sheet_names: list[str],
-    wb: Workbook,
+    deal_database: DealDatabase,
 ):
-    if f'{sheet_name}-matchups' in sheet_names:
-        del wb[f'{sheet_name}-matchups']
-
-    sales = wb[sheet_name]
-    values = list(sales.values)[1:]
-    sales = DataFrame(values, columns=HEADERS)
+    sales = to_python(deals_frame(deal_database.iter_values(sheet_name)))
     total_coupons = DataFrame()
 
     if f'{sheet_name}-coupons' in sheet_names:
-        values = wb[f'{sheet_name}-coupons'].to_list()[1:]
-        total_coupons = DataFrame(values, columns=HEADERS)
+        values = deal_database.iter_values(f'{sheet_name}-coupons')
+        total_coupons = to_python(deals_frame(values))
 
     if isinstance(newspaper_coupons, DataFrame):
         total_coupons = pd.concat(
@@ -247,15 +335,10 @@ def _setup_config():
             'No [config] section found in config.ini - please create one.'
         )
 
-    if 'GOOGLE_PROJECT_ID' in section:
-        import vertexai as genai
-
-        genai.init(project=section['GOOGLE_PROJECT_ID'])
-    elif 'GOOGLE_API_KEY' in section:
-        import google.generativeai as genai
-
-        genai.configure(api_key=section['GOOGLE_API_KEY'])
-    else:
+    # every pool member gets its own API client, so nothing is configured globally here
+    if section.get('EXTRACTION_BACKEND', 'gemini').lower() == 'fake':
+        logger.warning('Using the offline fake extraction backend - no Gemini calls will be made')
+    elif not any(key in section for key in ('GOOGLE_PROJECT_ID', 'GOOGLE_API_KEY', 'GEMINI_POOL')):
         raise Exception(
             "No Google API key found in config.ini - please add one under 'OPENAI_KEY' or 'GOOGLE_API_KEY' in the [config] section."
         )
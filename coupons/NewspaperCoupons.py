@@ -1,5 +1,5 @@
 import asyncio
-import dateutil
+import dateutil.parser
 import httpx
 
 import re
@@ -9,6 +9,7 @@ from more_itertools import chunked
 
 from stores.lib.BaseStore import CouponBaseStore
 from utils.call_ai_model_gemini import extract_products_using_gemini, GeminiCallInput
+from utils.executors import run_in_process
 
 
 class NewspaperCoupons(CouponBaseStore):
@@ -63,64 +64,78 @@ class NewspaperCoupons(CouponBaseStore):
         await self.process_queue()
 
     async def _clean_coupons(self, responses):
-        for response in responses:
-            html_content = response.content
-            soup = BeautifulSoup(
-                html_content, 'html.parser', from_encoding='latin1'
+        # parsing the inserts is CPU-bound, so the pages are parsed in parallel off the event loop
+        pages = await asyncio.gather(
+            *[
+                run_in_process(_parse_coupon_page, response.content)
+                for response in responses
+            ]
+        )
+
+        for coupons in pages:
+            self.processing_queue.extend(coupons)
+
+
+def _parse_coupon_page(html_content: bytes) -> list[dict]:
+    coupons = []
+    soup = BeautifulSoup(
+        html_content, 'html.parser', from_encoding='latin1'
+    )
+    table = soup.find('table', class_='DescTable')
+
+    rows = table.find_all('tr')
+    cols = [head.text for head in table.find_all('th')]
+
+    for row in rows:
+        cells = row.find_all('td')
+
+        if len(cells) < len(cols):
+            continue
+
+        exp = (
+            cells[cols.index('Exp')]
+            .text.removeprefix('(')
+            .removesuffix(')')
+        )
+        current_year = datetime.today().year
+        exp = f'{exp}/{current_year}'
+        if exp:
+            exp = dateutil.parser.parse(exp)
+            if exp <= datetime.today():
+                continue
+        else:
+            continue
+
+        if not cells:
+            continue
+
+        elif len(cells) == 1:
+            coupons.append(
+                {
+                    'raw_text': cells[0].text,
+                    'sale_amount_off': 'N/A',
+                    'required_purchase_quantity': 'N/A',
+                    'deal_type': 'COUPON',
+                    'valid_from': datetime.today().strftime('%Y-%m-%d'),
+                    'valid_to': exp.strftime('%Y-%m-%d'),
+                }
             )
-            table = soup.find('table', class_='DescTable')
-
-            rows = table.find_all('tr')
-            cols = [head.text for head in table.find_all('th')]
-
-            for row in rows:
-                cells = row.find_all('td')
-
-                if len(cells) < len(cols):
-                    continue
-
-                exp = (
-                    cells[cols.index('Exp')]
-                    .text.removeprefix('(')
-                    .removesuffix(')')
-                )
-                current_year = datetime.today().year
-                exp = f'{exp}/{current_year}'
-                if exp:
-                    exp = dateutil.parser.parse(exp)
-                    if exp <= datetime.today():
-                        continue
-                else:
-                    continue
-
-                if not cells:
-                    continue
-
-                elif len(cells) == 1:
-                    self.processing_queue.append(
-                        {
-                            'raw_text': cells[0].text,
-                            'sale_amount_off': 'N/A',
-                            'required_purchase_quantity': 'N/A',
-                            'deal_type': 'COUPON',
-                            'valid_from': datetime.today().strftime('%Y-%m-%d'),
-                            'valid_to': exp.strftime('%Y-%m-%d'),
-                        }
-                    )
-                    continue
-
-                sale_amount_off = 'N/A'
-                required_purchase_quantity = 'N/A'
-                if cells[1] and '/' in cells[1].text:
-                    sale_amount_off, required_purchase_quantity = cells[1].text.split('/')
-
-                self.processing_queue.append(
-                    {
-                        'raw_text': cells[0].text + ' ' + cells[1].text,
-                        'sale_amount_off': sale_amount_off,
-                        'required_purchase_quantity': required_purchase_quantity,
-                        'deal_type': 'COUPON',
-                        'valid_from': datetime.today().strftime('%Y-%m-%d'),
-                        'valid_to': exp.strftime('%Y-%m-%d'),
-                    }
-                )
+            continue
+
+        sale_amount_off = 'N/A'
+        required_purchase_quantity = 'N/A'
+        if cells[1] and '/' in cells[1].text:
+            sale_amount_off, required_purchase_quantity = cells[1].text.split('/')
+
+        coupons.append(
+            {
+                'raw_text': cells[0].text + ' ' + cells[1].text,
+                'sale_amount_off': sale_amount_off,
+                'required_purchase_quantity': required_purchase_quantity,
+                'deal_type': 'COUPON',
+                'valid_from': datetime.today().strftime('%Y-%m-%d'),
+                'valid_to': exp.strftime('%Y-%m-%d'),
+            }
+        )
+
+    return coupons
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Iterable
+
+
+class PoolMember:
+    """
+    One set of credentials in a `CredentialPool` - an API key, or a Vertex project and region.
+
+    Args:
+        name (str): A log-safe name for the member (never the API key itself).
+        weight (float, optional): The member's share of traffic relative to the other members. Defaults to 1.
+        **credentials: Whatever the backend needs to build a client for this member.
+
+    Attributes:
+        in_flight (int): Requests currently running against this member.
+        ejected_until (float): `time.monotonic()` timestamp before which the member is not scheduled.
+        consecutive_failures (int): Failures since the last success, used to grow the ejection time.
+
+    """
+
+    def __init__(self, name: str, weight: float = 1.0, **credentials: Any) -> None:
+        self.name = name
+        self.weight = max(float(weight), 0.01)
+        self.credentials = credentials
+
+        self.in_flight = 0
+        self.ejected_until = 0.0
+        self.consecutive_failures = 0
+
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def is_available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+
+class CredentialPool:
+    """
+    Spreads requests across several sets of credentials, so a run is no longer capped by a single quota.
+
+    Each request goes to the available member with the fewest in-flight requests per unit of weight,
+    falling back to the fewest total requests per unit of weight - so an idle pool is walked in weighted
+    round-robin order, and a busy pool always picks its least loaded member. A member that answers with
+    a 429 or a 5xx is ejected for the server's Retry-After period, or an exponentially growing backoff,
+    and is scheduled again once that period is over. When every member is ejected, callers wait for the
+    first one to come back.
+
+    The pool only schedules members - it never talks to the API itself - so it can be driven by fake
+    members in local tests.
+
+    Args:
+        members (Iterable[PoolMember]): The members of the pool.
+        base_ejection_seconds (float, optional): The ejection time after a first failure. Defaults to 5.
+        max_ejection_seconds (float, optional): The maximum ejection time. Defaults to 60.
+
+    Attributes:
+        waited_seconds (float): Total time callers spent waiting for an ejected pool to recover.
+
+    """
+
+    def __init__(
+        self,
+        members: Iterable[PoolMember],
+        base_ejection_seconds: float = 5.0,
+        max_ejection_seconds: float = 60.0,
+    ) -> None:
+        self.members = list(members)
+        if not self.members:
+            raise Exception('A credential pool needs at least one member')
+
+        self._base_ejection_seconds = base_ejection_seconds
+        self._max_ejection_seconds = max_ejection_seconds
+
+        self.waited_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def available_members(self) -> list[PoolMember]:
+        now = time.monotonic()
+        return [member for member in self.members if member.is_available(now)]
+
+    async def acquire(self, exclude: PoolMember | None = None) -> PoolMember:
+        """
+        Schedules the next request. `exclude` is skipped unless it is the only available member.
+        """
+        while True:
+            available = self.available_members()
+            if available:
+                member = min(
+                    [m for m in available if m is not exclude] or available,
+                    key=lambda m: (m.in_flight / m.weight, m.requests / m.weight),
+                )
+                member.in_flight += 1
+                member.requests += 1
+                return member
+
+            wait = min(member.ejected_until for member in self.members) - time.monotonic()
+            if wait > 0:
+                self.waited_seconds += wait
+                await asyncio.sleep(wait)
+
+    def release(self, member: PoolMember, succeeded: bool = True) -> None:
+        member.in_flight = max(member.in_flight - 1, 0)
+
+        if succeeded:
+            member.consecutive_failures = 0
+
+    def eject(self, member: PoolMember, seconds: float | None = None) -> float:
+        """
+        Takes `member` out of rotation for `seconds`, or for an exponential backoff based on its
+        consecutive failures. Returns the ejection time that was applied.
+        """
+        member.failures += 1
+        member.consecutive_failures += 1
+        member.ejections += 1
+
+        if seconds is None:
+            seconds = min(
+                self._base_ejection_seconds * 2 ** (member.consecutive_failures - 1),
+                self._max_ejection_seconds,
+            )
+
+        member.ejected_until = max(member.ejected_until, time.monotonic() + seconds)
+        return seconds
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {
+            member.name: {
+                'weight': member.weight,
+                'requests': member.requests,
+                'failures': member.failures,
+                'ejections': member.ejections,
+            }
+            for member in self.members
+        }
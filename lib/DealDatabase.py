@@ -0,0 +1,380 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import orjson
+
+
+class DealDatabase:
+    """
+    The system of record for a run's sales, coupons and matchups, backed by SQLite.
+
+    Every store writes its rows into one `deals` table, with one column per header, partitioned by
+    sheet (the store or coupon source) and ISO week. Resetting a store only clears its partition for the
+    current week, so earlier weeks are kept. Matchups are stored per sheet as JSON rows, since their
+    columns depend on the match. The Excel workbook is only generated from this database once, at the
+    end of the run.
+
+    When a store finishes, a manifest is written in the same transaction as its last rows: the row count,
+    the range of its validity dates, the publications it was built from and a hash of its content.
+    Freshness checks only read the manifest, and resetting a store removes it, so a store that was
+    interrupted is never mistaken for a complete one.
+
+    Next to the headers, every row records the publication and the queued item it was extracted from
+    (`METADATA_COLUMNS`), so a later run can carry unchanged items over instead of extracting them again.
+
+    Every thread gets its own connection - the `OutputWriter` commits from worker threads while stores
+    read from the event loop - so a transaction never interleaves with another thread's statements, and
+    readers only see committed rows.
+
+    Args:
+        path (str | Path, optional): Location of the SQLite database. Defaults to `output/deals.sqlite`.
+        headers (list[str]): The deal columns, in order.
+        date_columns (Iterable[str], optional): Columns that hold dates - stored as ISO strings.
+        boolean_columns (Iterable[str], optional): Columns that hold booleans - stored as integers.
+        week (str | None, optional): The partition to read and write, e.g. `2024-W18`. Defaults to the current ISO week.
+
+    """
+
+    DEFAULT_PATH = 'output/deals.sqlite'
+    METADATA_COLUMNS = ['publication_id', 'item_key', 'item_hash']
+
+    def __init__(
+        self,
+        path: str | Path = DEFAULT_PATH,
+        headers: list[str] = (),
+        date_columns: Iterable[str] = (),
+        boolean_columns: Iterable[str] = (),
+        week: str | None = None,
+    ) -> None:
+        self._path = Path(path)
+        self.headers = list(headers)
+        self._date_columns = set(date_columns)
+        self._boolean_columns = set(boolean_columns)
+        self.week = week or datetime.now().strftime('%G-W%V')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+        self._schema_ready = False
+
+        self._columns_sql = ', '.join(f'"{header}"' for header in self.headers)
+        self._metadata_columns_sql = ', '.join(self.METADATA_COLUMNS)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            # only `close` touches a connection from another thread
+            connection = sqlite3.connect(self._path, timeout=30, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            with self._lock:
+                if not self._schema_ready:
+                    self._create_schema(connection)
+                    self._schema_ready = True
+
+                self._connections.append(connection)
+
+            self._local.connection = connection
+
+        return connection
+
+    def _create_schema(self, connection: sqlite3.Connection) -> None:
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS deals ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'sheet TEXT NOT NULL, '
+            'week TEXT NOT NULL, '
+            + ', '.join(f'"{column}"' for column in [*self.headers, *self.METADATA_COLUMNS])
+            + ')'
+        )
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS deals_sheet_week ON deals (sheet, week)'
+        )
+        # databases written before a column was added
+        existing_columns = {
+            column for _, column, *_ in connection.execute('PRAGMA table_info(deals)')
+        }
+        for column in [*self.headers, *self.METADATA_COLUMNS]:
+            if column not in existing_columns:
+                connection.execute(f'ALTER TABLE deals ADD COLUMN "{column}"')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS matchups ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'sheet TEXT NOT NULL, '
+            'week TEXT NOT NULL, '
+            'columns BLOB NOT NULL, '
+            'row_values BLOB NOT NULL)'
+        )
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS matchups_sheet_week ON matchups (sheet, week)'
+        )
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS manifests ('
+            'sheet TEXT NOT NULL, '
+            'week TEXT NOT NULL, '
+            'row_count INTEGER NOT NULL, '
+            'valid_from_min TEXT, '
+            'valid_from_max TEXT, '
+            'valid_to_min TEXT, '
+            'valid_to_max TEXT, '
+            'publication_ids BLOB NOT NULL, '
+            'content_hash TEXT NOT NULL, '
+            'finished_at TEXT NOT NULL, '
+            'PRIMARY KEY (sheet, week))'
+        )
+        connection.commit()
+
+    def _to_sql(self, header: str, value: Any) -> Any:
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()[:10]
+
+        if isinstance(value, bool):
+            return int(value)
+
+        if value is None or isinstance(value, (int, float, str)):
+            return value
+
+        # numpy scalars and anything else pandas hands over
+        return value.item() if hasattr(value, 'item') else str(value)
+
+    def _from_sql(self, header: str, value: Any) -> Any:
+        if header in self._boolean_columns and isinstance(value, int):
+            return bool(value)
+
+        if header in self._date_columns and isinstance(value, str):
+            try:
+                return date.fromisoformat(value)
+            except ValueError:
+                return value
+
+        return value
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def rollback(self) -> None:
+        self.connection.rollback()
+
+    def reset_sheet(self, sheet: str, commit: bool = True) -> None:
+        self.connection.execute(
+            'DELETE FROM deals WHERE sheet = ? AND week = ?', (sheet, self.week)
+        )
+        self.connection.execute(
+            'DELETE FROM manifests WHERE sheet = ? AND week = ?', (sheet, self.week)
+        )
+        if commit:
+            self.connection.commit()
+
+    def add_rows(self, sheet: str, rows: list[dict[str, Any]], commit: bool = True) -> None:
+        self.connection.executemany(
+            f'INSERT INTO deals (sheet, week, {self._columns_sql}, {self._metadata_columns_sql}) '
+            f'VALUES (?, ?, {", ".join("?" for _ in [*self.headers, *self.METADATA_COLUMNS])})',
+            [
+                (
+                    sheet,
+                    self.week,
+                    *(self._to_sql(header, row.get(header, 'N/A')) for header in self.headers),
+                    *(row.get(column) for column in self.METADATA_COLUMNS),
+                )
+                for row in rows
+            ],
+        )
+        if commit:
+            self.connection.commit()
+
+    def iter_values(self, sheet: str) -> Iterator[list[Any]]:
+        cursor = self.connection.execute(
+            f'SELECT {self._columns_sql} FROM deals WHERE sheet = ? AND week = ? ORDER BY id',
+            (sheet, self.week),
+        )
+        for row in cursor:
+            yield [self._from_sql(header, value) for header, value in zip(self.headers, row)]
+
+    def get_values(self, sheet: str) -> list[list[Any]]:
+        return list(self.iter_values(sheet))
+
+    def get_rows(self, sheet: str) -> list[dict[str, Any]]:
+        return [dict(zip(self.headers, values)) for values in self.get_values(sheet)]
+
+    def get_previous_rows(
+        self, sheet: str, finished: bool = True, interrupted: bool = True
+    ) -> list[dict[str, Any]]:
+        """
+        Rows of earlier runs of `sheet`, with their `METADATA_COLUMNS`: with `finished`, the rows of the last
+        run that finished, and with `interrupted`, the rows a run of this week committed before it was
+        interrupted - they are its checkpoint. Where both have the same item, the interrupted run wins.
+        """
+        manifest = self.get_manifest(sheet, latest=True)
+        weeks = []
+        if interrupted and (manifest is None or manifest['week'] != self.week):
+            weeks.append(self.week)
+
+        if finished and manifest is not None:
+            weeks.append(manifest['week'])
+
+        columns = [*self.headers, *self.METADATA_COLUMNS]
+        rows = []
+        seen_keys = set()
+        for week in weeks:
+            cursor = self.connection.execute(
+                f'SELECT {self._columns_sql}, {self._metadata_columns_sql} FROM deals '
+                'WHERE sheet = ? AND week = ? ORDER BY id',
+                (sheet, week),
+            )
+            week_rows = [
+                {column: self._from_sql(column, value) for column, value in zip(columns, row)}
+                for row in cursor
+            ]
+            rows.extend(row for row in week_rows if row['item_key'] not in seen_keys)
+            seen_keys.update(row['item_key'] for row in week_rows if row['item_key'])
+
+        return rows
+
+    def sheet_names(self) -> list[str]:
+        """
+        The sheets with rows in the current week, in the order they were first written.
+        """
+        cursor = self.connection.execute(
+            'SELECT sheet FROM deals WHERE week = ? GROUP BY sheet ORDER BY MIN(id)',
+            (self.week,),
+        )
+        return [sheet for sheet, in cursor]
+
+    def _date_range(self, sheet: str, column: str) -> tuple[str | None, str | None]:
+        if column not in self.headers:
+            return None, None
+
+        # dates are stored as ISO strings, so they sort chronologically
+        return self.connection.execute(
+            f'SELECT MIN("{column}"), MAX("{column}") FROM deals '
+            f'WHERE sheet = ? AND week = ? AND "{column}" GLOB \'[0-9][0-9][0-9][0-9]-*\'',
+            (sheet, self.week),
+        ).fetchone()
+
+    def write_manifest(
+        self, sheet: str, publication_ids: list[str] | None = None, commit: bool = True
+    ) -> dict[str, Any]:
+        digest = hashlib.sha256()
+        row_count = 0
+        for values in self.connection.execute(
+            f'SELECT {self._columns_sql} FROM deals WHERE sheet = ? AND week = ? ORDER BY id',
+            (sheet, self.week),
+        ):
+            digest.update(orjson.dumps(values))
+            row_count += 1
+
+        valid_from_min, valid_from_max = self._date_range(sheet, 'valid_from')
+        valid_to_min, valid_to_max = self._date_range(sheet, 'valid_to')
+        manifest = {
+            'sheet': sheet,
+            'week': self.week,
+            'row_count': row_count,
+            'valid_from_min': valid_from_min,
+            'valid_from_max': valid_from_max,
+            'valid_to_min': valid_to_min,
+            'valid_to_max': valid_to_max,
+            'publication_ids': sorted({str(i) for i in publication_ids or []}),
+            'content_hash': digest.hexdigest(),
+            'finished_at': datetime.now().isoformat(),
+        }
+
+        self.connection.execute(
+            f'INSERT OR REPLACE INTO manifests ({", ".join(manifest)}) '
+            f'VALUES ({", ".join("?" for _ in manifest)})',
+            [
+                orjson.dumps(value) if key == 'publication_ids' else value
+                for key, value in manifest.items()
+            ],
+        )
+        if commit:
+            self.connection.commit()
+
+        return manifest
+
+    def get_manifest(self, sheet: str, latest: bool = False) -> dict[str, Any] | None:
+        """
+        The manifest of `sheet` for the current week, or with `latest` for the last week it finished in.
+        """
+        cursor = self.connection.execute(
+            'SELECT * FROM manifests WHERE sheet = ? AND week <= ? ORDER BY week DESC LIMIT 1'
+            if latest
+            else 'SELECT * FROM manifests WHERE sheet = ? AND week = ?',
+            (sheet, self.week),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+
+        manifest = dict(zip([column for column, *_ in cursor.description], row))
+        manifest['publication_ids'] = orjson.loads(manifest['publication_ids'])
+        return manifest
+
+    def has_current_data(self, sheet: str) -> bool:
+        """
+        Whether `sheet` finished this week with rows that are still valid - answered from its manifest alone.
+        """
+        manifest = self.get_manifest(sheet)
+        if manifest is None or not manifest['row_count']:
+            return False
+
+        return (manifest['valid_to_max'] or '') >= date.today().isoformat()
+
+    def set_matchups(
+        self, sheet: str, columns: list[str], rows: Iterable[Iterable[Any]]
+    ) -> None:
+        """
+        Replaces the matchups of `sheet` for the current week - an empty `rows` clears them.
+        """
+        columns_blob = orjson.dumps(columns)
+        self.connection.execute(
+            'DELETE FROM matchups WHERE sheet = ? AND week = ?', (sheet, self.week)
+        )
+        self.connection.executemany(
+            'INSERT INTO matchups (sheet, week, columns, row_values) VALUES (?, ?, ?, ?)',
+            [
+                (
+                    sheet,
+                    self.week,
+                    columns_blob,
+                    orjson.dumps(
+                        list(row), option=orjson.OPT_SERIALIZE_NUMPY, default=str
+                    ),
+                )
+                for row in rows
+            ],
+        )
+        self.connection.commit()
+
+    def get_matchup_columns(self, sheet: str) -> list[str]:
+        row = self.connection.execute(
+            'SELECT columns FROM matchups WHERE sheet = ? AND week = ? LIMIT 1',
+            (sheet, self.week),
+        ).fetchone()
+        return orjson.loads(row[0]) if row else []
+
+    def iter_matchups(self, sheet: str) -> Iterator[list[Any]]:
+        columns = self.get_matchup_columns(sheet)
+        cursor = self.connection.execute(
+            'SELECT row_values FROM matchups WHERE sheet = ? AND week = ? ORDER BY id',
+            (sheet, self.week),
+        )
+        for row_blob, in cursor:
+            yield [
+                self._from_sql(column, value)
+                for column, value in zip(columns, orjson.loads(row_blob))
+            ]
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+
+            self._connections = []
+            # threads that still hold a closed connection open a new one on their next call
+            self._local = threading.local()
@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Iterable
+
+WORD = re.compile(r'[a-z0-9]+')
+EMPTY_VALUES = frozenset(['', 'n/a', 'na', 'none', 'null', 'unknown'])
+
+
+def _text(value: Any) -> str | None:
+    if value is None:
+        return None
+
+    text = ' '.join(str(value).split())
+    return None if text.lower() in EMPTY_VALUES else text
+
+
+def _number(value: Any) -> float | None:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+
+    return float(value)
+
+
+def _week_number(week: str) -> int:
+    # `2024-W07` -> 202407, so weeks sort and compare as integers
+    year, number = week.split('-W')
+    return int(year) * 100 + int(number)
+
+
+def _week_name(week_number: int) -> str:
+    return f'{week_number // 100}-W{week_number % 100:02d}'
+
+
+def canonical_product_key(brand: Any, name: Any, variety: Any = None) -> str:
+    """
+    The identity of a product across stores and weeks - the sorted, de-duplicated words of its brand, name
+    and variety, so `Coca-Cola Classic 12 oz` and `Classic Coca Cola 12 OZ` are the same product.
+    """
+    words = WORD.findall(' '.join(_text(value) or '' for value in (brand, name, variety)).lower())
+    return ' '.join(sorted(set(words)))
+
+
+class DealHistory:
+    """
+    A compact, append-only history of every finished store run, for judging whether a sale is a good one.
+
+    Each store's rows are recorded once per ISO week as a snapshot; running a store again in the same week
+    replaces its snapshot, and a snapshot whose content hash didn't change is skipped. Store names, brands
+    and products are dictionary-encoded into integer ids, and a product is identified by its
+    `canonical_product_key`, so the same item is tracked across stores and differently written names.
+    Observations are indexed by product and week, so price history, lowest-seen price and deal frequency
+    queries only touch the rows of the product they ask about.
+
+    Args:
+        path (str | Path, optional): Location of the SQLite database. Defaults to `output/history.sqlite`.
+
+    """
+
+    DEFAULT_PATH = 'output/history.sqlite'
+
+    def __init__(self, path: str | Path = DEFAULT_PATH) -> None:
+        self._path = Path(path)
+        self._connection: sqlite3.Connection | None = None
+
+        self._store_ids: dict[str, int] = {}
+        self._brand_ids: dict[str, int] = {}
+        self._product_ids: dict[str, int] = {}
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self._path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.executescript(
+                '''
+                CREATE TABLE IF NOT EXISTS stores (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE
+                );
+                CREATE TABLE IF NOT EXISTS brands (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE
+                );
+                CREATE TABLE IF NOT EXISTS products (
+                    id INTEGER PRIMARY KEY,
+                    canonical_key TEXT NOT NULL UNIQUE,
+                    brand_id INTEGER REFERENCES brands (id),
+                    name TEXT,
+                    variety TEXT
+                );
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    store_id INTEGER NOT NULL REFERENCES stores (id),
+                    week INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    row_count INTEGER NOT NULL,
+                    recorded_at TEXT NOT NULL,
+                    PRIMARY KEY (store_id, week)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS observations (
+                    product_id INTEGER NOT NULL REFERENCES products (id),
+                    week INTEGER NOT NULL,
+                    store_id INTEGER NOT NULL REFERENCES stores (id),
+                    price REAL,
+                    sale_price REAL,
+                    deal_type TEXT,
+                    valid_from TEXT,
+                    valid_to TEXT
+                );
+                CREATE INDEX IF NOT EXISTS observations_product_week ON observations (product_id, week);
+                CREATE INDEX IF NOT EXISTS observations_store_week ON observations (store_id, week);
+                '''
+            )
+            self._connection.commit()
+
+        return self._connection
+
+    def _get_id(self, table: str, cache: dict[str, int], name: str) -> int:
+        if name not in cache:
+            self.connection.execute(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', (name,))
+            cache[name] = self.connection.execute(
+                f'SELECT id FROM {table} WHERE name = ?', (name,)
+            ).fetchone()[0]
+
+        return cache[name]
+
+    def _get_product_id(self, row: dict[str, Any]) -> int | None:
+        key = canonical_product_key(row.get('brand_name'), row.get('product_name'), row.get('product_variety'))
+        if not key:
+            return None
+
+        if key not in self._product_ids:
+            brand = _text(row.get('brand_name'))
+            self.connection.execute(
+                'INSERT OR IGNORE INTO products (canonical_key, brand_id, name, variety) VALUES (?, ?, ?, ?)',
+                (
+                    key,
+                    self._get_id('brands', self._brand_ids, brand) if brand else None,
+                    _text(row.get('product_name')),
+                    _text(row.get('product_variety')),
+                ),
+            )
+            self._product_ids[key] = self.connection.execute(
+                'SELECT id FROM products WHERE canonical_key = ?', (key,)
+            ).fetchone()[0]
+
+        return self._product_ids[key]
+
+    def add_snapshot(
+        self, store: str, week: str, content_hash: str, rows: Iterable[dict[str, Any]]
+    ) -> bool:
+        """
+        Records the rows of one finished store run. Returns False when the week's snapshot of the store
+        already has the same content.
+        """
+        try:
+            store_id = self._get_id('stores', self._store_ids, store)
+            week_number = _week_number(week)
+
+            existing = self.connection.execute(
+                'SELECT content_hash FROM snapshots WHERE store_id = ? AND week = ?',
+                (store_id, week_number),
+            ).fetchone()
+            if existing is not None and existing[0] == content_hash:
+                # the store's id may be new - don't leave its insert holding the write lock
+                self.connection.commit()
+                return False
+
+            self.connection.execute(
+                'DELETE FROM observations WHERE store_id = ? AND week = ?',
+                (store_id, week_number),
+            )
+
+            observations = []
+            for row in rows:
+                product_id = self._get_product_id(row)
+                if product_id is None:
+                    continue
+
+                observations.append(
+                    (
+                        product_id,
+                        week_number,
+                        store_id,
+                        _number(row.get('price')),
+                        _number(row.get('sale_price')),
+                        _text(row.get('deal_type')),
+                        *(
+                            value.isoformat() if isinstance(value, date) else _text(value)
+                            for value in (row.get('valid_from'), row.get('valid_to'))
+                        ),
+                    )
+                )
+
+            self.connection.executemany(
+                'INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?)', observations
+            )
+            self.connection.execute(
+                'INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)',
+                (store_id, week_number, content_hash, len(observations), datetime.now().isoformat()),
+            )
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            # ids that were cached inside the rolled back transaction no longer exist
+            self._store_ids.clear()
+            self._brand_ids.clear()
+            self._product_ids.clear()
+            raise
+
+        return True
+
+    def find_products(self, text: str, limit: int = 20) -> list[dict[str, Any]]:
+        """
+        Products whose canonical key contains every word of `text`.
+        """
+        words = sorted(set(WORD.findall(text.lower())))
+        if not words:
+            return []
+
+        cursor = self.connection.execute(
+            'SELECT products.id, products.canonical_key, brands.name, products.name, products.variety '
+            'FROM products LEFT JOIN brands ON brands.id = products.brand_id WHERE '
+            + ' AND '.join('products.canonical_key LIKE ?' for _ in words)
+            + ' ORDER BY length(products.canonical_key) LIMIT ?',
+            (*(f'%{word}%' for word in words), limit),
+        )
+        return [
+            {'id': product_id, 'canonical_key': key, 'brand': brand, 'name': name, 'variety': variety}
+            for product_id, key, brand, name, variety in cursor
+        ]
+
+    def _resolve_product(self, product: int | str) -> int | None:
+        if isinstance(product, int):
+            return product
+
+        row = self.connection.execute(
+            'SELECT id FROM products WHERE canonical_key = ?', (canonical_product_key(product, None),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _weeks_back(self, weeks: int | None) -> int:
+        if not weeks:
+            return 0
+
+        start = date.today().toordinal() - 7 * (weeks - 1)
+        return _week_number(date.fromordinal(start).strftime('%G-W%V'))
+
+    def price_history(
+        self, product: int | str, store: str | None = None, weeks: int | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Every observation of `product` - a product id or its name - oldest first, optionally for one
+        store and the last `weeks` weeks. `effective_price` is the sale price, or the regular price when
+        the deal has none.
+        """
+        product_id = self._resolve_product(product)
+        if product_id is None:
+            return []
+
+        query = (
+            'SELECT observations.week, stores.name, price, sale_price, COALESCE(sale_price, price), '
+            'deal_type, valid_from, valid_to '
+            'FROM observations JOIN stores ON stores.id = observations.store_id '
+            'WHERE product_id = ? AND week >= ?'
+        )
+        parameters: list[Any] = [product_id, self._weeks_back(weeks)]
+        if store is not None:
+            query += ' AND stores.name = ?'
+            parameters.append(store)
+
+        cursor = self.connection.execute(query + ' ORDER BY observations.week, stores.name', parameters)
+        return [
+            {
+                'week': _week_name(week),
+                'store': store_name,
+                'price': price,
+                'sale_price': sale_price,
+                'effective_price': effective_price,
+                'deal_type': deal_type,
+                'valid_from': valid_from,
+                'valid_to': valid_to,
+            }
+            for week, store_name, price, sale_price, effective_price, deal_type, valid_from, valid_to in cursor
+        ]
+
+    def lowest_price(self, product: int | str, weeks: int | None = None) -> dict[str, Any] | None:
+        product_id = self._resolve_product(product)
+        if product_id is None:
+            return None
+
+        row = self.connection.execute(
+            'SELECT COALESCE(sale_price, price) AS effective_price, observations.week, stores.name '
+            'FROM observations JOIN stores ON stores.id = observations.store_id '
+            'WHERE product_id = ? AND week >= ? AND effective_price IS NOT NULL '
+            'ORDER BY effective_price, observations.week DESC LIMIT 1',
+            (product_id, self._weeks_back(weeks)),
+        ).fetchone()
+        if row is None:
+            return None
+
+        effective_price, week, store_name = row
+        return {'price': effective_price, 'week': _week_name(week), 'store': store_name}
+
+    def deal_frequency(self, product: int | str, weeks: int = 52) -> dict[str, Any]:
+        """
+        How often `product` was on sale over the last `weeks` weeks - overall and per store - as the share
+        of weeks it appeared in, next to how often the history has data for at all.
+        """
+        product_id = self._resolve_product(product)
+        since = self._weeks_back(weeks)
+
+        weeks_recorded = self.connection.execute(
+            'SELECT COUNT(DISTINCT week) FROM snapshots WHERE week >= ?', (since,)
+        ).fetchone()[0]
+        if product_id is None or not weeks_recorded:
+            return {'weeks_recorded': weeks_recorded, 'weeks_on_sale': 0, 'frequency': 0.0, 'by_store': {}}
+
+        weeks_on_sale = self.connection.execute(
+            'SELECT COUNT(DISTINCT week) FROM observations WHERE product_id = ? AND week >= ?',
+            (product_id, since),
+        ).fetchone()[0]
+        by_store = {
+            store_name: round(store_weeks / weeks_recorded, 3)
+            for store_name, store_weeks in self.connection.execute(
+                'SELECT stores.name, COUNT(DISTINCT week) FROM observations '
+                'JOIN stores ON stores.id = observations.store_id '
+                'WHERE product_id = ? AND week >= ? GROUP BY stores.name',
+                (product_id, since),
+            )
+        }
+
+        return {
+            'weeks_recorded': weeks_recorded,
+            'weeks_on_sale': weeks_on_sale,
+            'frequency': round(weeks_on_sale / weeks_recorded, 3),
+            'by_store': by_store,
+        }
+
+    def stats(self) -> dict[str, int]:
+        return {
+            table: self.connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in ('stores', 'brands', 'products', 'snapshots', 'observations')
+        }
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+
+class ExtractionCache:
+    """
+    A persistent, content-addressed cache for Gemini extraction results, backed by SQLite.
+
+    Entries are keyed by a hash of everything that influences the model output - the rendered prompt,
+    the normalized user input, the model name and the sampling parameters - so identical input (this
+    week vs. last week, or the same item across banners) is only ever extracted once. Stores cache every
+    item on its own rather than whole batches, which the packer puts together differently on every run.
+
+    Lookups don't write - the access times of hits are kept in memory and saved with the next write,
+    eviction or `close`, or once `TOUCH_BATCH_SIZE` of them are pending. The cache can be used from the
+    thread pool, so lookups and writes stay off the event loop; one lock serializes them.
+
+    Args:
+        path (str | Path, optional): Location of the SQLite database. Defaults to `output/cache/extraction.sqlite`.
+        ttl_seconds (float, optional): How long an entry stays valid. Expired entries are treated as misses
+            and removed on eviction. Defaults to 7 days.
+        max_entries (int, optional): The maximum number of entries to keep. The least recently used entries
+            are evicted once this is exceeded. Defaults to 50,000.
+        bypass (bool, optional): When set, every lookup misses and nothing is written. Defaults to False.
+
+    Attributes:
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that were not in the cache (or were expired).
+        writes (int): Number of entries written.
+        evictions (int): Number of entries removed by TTL or size based eviction.
+
+    """
+
+    DEFAULT_PATH = 'output/cache/extraction.sqlite'
+    DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+    DEFAULT_MAX_ENTRIES = 50_000
+    TOUCH_BATCH_SIZE = 500
+
+    def __init__(
+        self,
+        path: str | Path = DEFAULT_PATH,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        bypass: bool = False,
+    ) -> None:
+        self._path = Path(path)
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self._bypass = bypass
+        self._connection: sqlite3.Connection | None = None
+        self._pending_touches: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self._path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS extractions ('
+                'key TEXT PRIMARY KEY, '
+                'products BLOB NOT NULL, '
+                'created_at REAL NOT NULL, '
+                'accessed_at REAL NOT NULL)'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS extractions_accessed_at ON extractions (accessed_at)'
+            )
+            self._connection.commit()
+
+        return self._connection
+
+    @staticmethod
+    def normalize_user_input(user_input: Any) -> bytes:
+        """
+        Serializes a batch of user input deterministically, so that batches which only differ in key order
+        or surrounding whitespace hash to the same key.
+        """
+
+        def _normalize(value):
+            if isinstance(value, dict):
+                return {str(k): _normalize(v) for k, v in value.items()}
+            if isinstance(value, (list, tuple)):
+                return [_normalize(v) for v in value]
+            if isinstance(value, str):
+                return ' '.join(value.split())
+            return value
+
+        return orjson.dumps(
+            _normalize(user_input),
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+            default=str,
+        )
+
+    @classmethod
+    def make_key(
+        cls, prompt_str: str, user_input: Any, model_name: str, **model_options
+    ) -> str:
+        digest = hashlib.sha256()
+        digest.update(prompt_str.encode('utf-8'))
+        digest.update(b'\x00')
+        digest.update(cls.normalize_user_input(user_input))
+        digest.update(b'\x00')
+        digest.update(model_name.encode('utf-8'))
+        digest.update(b'\x00')
+        digest.update(orjson.dumps(model_options, option=orjson.OPT_SORT_KEYS))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> list[dict[str, Any]] | None:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: list[str]) -> dict[str, list[dict[str, Any]]]:
+        """
+        Looks up every key of `keys` at once, and returns the products of the ones that were found.
+        """
+        if self._bypass:
+            self.misses += len(keys)
+            return {}
+
+        found = {}
+        now = time.time()
+        with self._lock:
+            # stay below SQLite's limit on query parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                for key, products, created_at in self.connection.execute(
+                    'SELECT key, products, created_at FROM extractions '
+                    f'WHERE key IN ({", ".join("?" for _ in chunk)})',
+                    chunk,
+                ):
+                    if now - created_at <= self._ttl_seconds:
+                        found[key] = orjson.loads(products)
+                        self._pending_touches[key] = now
+
+            if len(self._pending_touches) >= self.TOUCH_BATCH_SIZE:
+                self._save_touches()
+                self.connection.commit()
+
+        hits = sum(key in found for key in keys)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return found
+
+    def _save_touches(self) -> None:
+        # the caller commits
+        if self._pending_touches:
+            self.connection.executemany(
+                'UPDATE extractions SET accessed_at = ? WHERE key = ?',
+                [(accessed_at, key) for key, accessed_at in self._pending_touches.items()],
+            )
+            self._pending_touches.clear()
+
+    def set(self, key: str, products: list[dict[str, Any]]) -> None:
+        self.set_many({key: products})
+
+    def set_many(self, entries: dict[str, list[dict[str, Any]]]) -> None:
+        """
+        Writes every entry of `entries` (keys to their products) in one transaction.
+        """
+        if self._bypass or not entries:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._save_touches()
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO extractions (key, products, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                [
+                    (key, orjson.dumps(products, default=str), now, now)
+                    for key, products in entries.items()
+                ],
+            )
+            self.connection.commit()
+
+        self.writes += len(entries)
+
+    def evict(self) -> int:
+        """
+        Removes expired entries, then the least recently used entries until at most `max_entries` remain.
+
+        Returns:
+            int: The number of entries that were removed.
+
+        """
+        if self._bypass:
+            return 0
+
+        with self._lock:
+            # the least recently used entries have to be told apart by their latest access
+            self._save_touches()
+            cursor = self.connection.execute(
+                'DELETE FROM extractions WHERE created_at < ?',
+                (time.time() - self._ttl_seconds,),
+            )
+            removed = cursor.rowcount
+
+            cursor = self.connection.execute(
+                'DELETE FROM extractions WHERE key IN ('
+                'SELECT key FROM extractions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self._max_entries,),
+            )
+            removed += cursor.rowcount
+            self.connection.commit()
+
+        self.evictions += removed
+        return removed
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'bypass': self._bypass,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._save_touches()
+                self._connection.commit()
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import re
+from datetime import date, timedelta
+from typing import Any
+
+import orjson
+
+CODE_BLOCK = re.compile(r'```[a-z]*\n(.*?)\n?```', re.DOTALL)
+NUMBER = re.compile(r'\d+(?:\.\d+)?')
+
+
+class FakeServerError(Exception):
+    def __init__(self, message: str, code: int = 503) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+class _FinishReason:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+
+class _FunctionCall:
+    def __init__(self, name: str, args: dict[str, Any]) -> None:
+        self.name = name
+        self.args = args
+
+    def to_dict(self) -> dict[str, Any]:
+        return {'name': self.name, 'args': self.args}
+
+
+class _Part:
+    def __init__(self, function_call: _FunctionCall | None = None, text: str | None = None) -> None:
+        if function_call is not None:
+            self.function_call = function_call
+
+        if text is not None:
+            self.text = text
+
+
+class _Content:
+    def __init__(self, parts: list[_Part]) -> None:
+        self.role = 'model'
+        self.parts = parts
+
+
+class _Candidate:
+    def __init__(self, content: _Content, finish_reason: str = 'STOP') -> None:
+        self.content = content
+        self.finish_reason = _FinishReason(finish_reason)
+
+
+class _UsageMetadata:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int) -> None:
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class _Response:
+    def __init__(self, candidates: list[_Candidate], usage_metadata: _UsageMetadata) -> None:
+        self.candidates = candidates
+        self.usage_metadata = usage_metadata
+
+
+class FakeGeminiModel:
+    """
+    An offline stand-in for a Gemini `GenerativeModel`, for load testing the extraction pipeline.
+
+    `generate_content_async` reads the batch back out of the prompt and answers with a schema-valid
+    `extract_rows` call - one product per input item, built from the item's own fields - after a
+    log-normally distributed delay. A share of the calls can instead fail the way the real API does:
+    429s, 5xx errors, empty product lists, malformed payloads (a text answer instead of a function
+    call) and responses truncated at the output token limit. Everything is driven by a seeded random
+    generator, so runs are reproducible.
+
+    Args:
+        model_name (str): The model name, only used in error messages.
+        columns (list[str]): The `extract_rows` product properties, in order.
+        positional (bool, optional): Whether to answer with the positional `rows` contract. Defaults to False.
+        latency_median (float, optional): The median response time in seconds. Defaults to 1.5.
+        latency_sigma (float, optional): The spread of the log-normal latency distribution. Defaults to 0.5.
+        rate_limit_rate (float, optional): Share of calls that fail with a 429. Defaults to 0.
+        server_error_rate (float, optional): Share of calls that fail with a 503. Defaults to 0.
+        empty_rate (float, optional): Share of calls that return no products. Defaults to 0.
+        malformed_rate (float, optional): Share of calls that return text instead of a function call. Defaults to 0.
+        truncated_rate (float, optional): Share of calls that stop at the output token limit. Defaults to 0.
+        seed (int | str | None, optional): Seed for the random generator. Defaults to None.
+
+    Attributes:
+        calls (int): Calls made to the model.
+
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        columns: list[str],
+        positional: bool = False,
+        latency_median: float = 1.5,
+        latency_sigma: float = 0.5,
+        rate_limit_rate: float = 0.0,
+        server_error_rate: float = 0.0,
+        empty_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        truncated_rate: float = 0.0,
+        seed: int | str | None = None,
+    ) -> None:
+        self.model_name = model_name
+        self.columns = columns
+        self.positional = positional
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.empty_rate = empty_rate
+        self.malformed_rate = malformed_rate
+        self.truncated_rate = truncated_rate
+        self._random = random.Random(seed)
+
+        self.calls = 0
+
+    @staticmethod
+    def _get_prompt_text(contents: list) -> str:
+        texts = []
+        for content in contents:
+            parts = content.get('parts', []) if isinstance(content, dict) else content.parts
+            for part in parts:
+                text = part.get('text') if isinstance(part, dict) else getattr(part, 'text', None)
+                if text:
+                    texts.append(text)
+
+        return '\n'.join(texts)
+
+    @staticmethod
+    def parse_items(prompt_text: str) -> list[Any]:
+        """
+        Reads the batch back out of the last code block of the prompt, in any of the prompt input encodings.
+        """
+        blocks = CODE_BLOCK.findall(prompt_text)
+        if not blocks:
+            return []
+
+        block = blocks[-1].strip()
+        try:
+            items = orjson.loads(block)
+            return items if isinstance(items, list) else [items]
+        except orjson.JSONDecodeError:
+            pass
+
+        # the table encoding - a row of field names, then one row of values per item
+        lines = [orjson.loads(line) for line in block.splitlines() if line.strip()]
+        if not lines:
+            return []
+
+        columns, rows = lines[0], lines[1:]
+        return [
+            {column: value for column, value in zip(columns, row) if value is not None}
+            for row in rows
+        ]
+
+    def _make_product(self, item: Any, index: int) -> dict[str, Any]:
+        if not isinstance(item, dict):
+            item = {'name': str(item)}
+
+        name = str(item.get('product_name') or item.get('name') or item.get('title') or f'Item {index + 1}')
+        brand = str(
+            item.get('brand_name') or item.get('brand') or item.get('brand_names') or name.split(' ')[0]
+        )
+        price_match = NUMBER.search(
+            str(item.get('price_text') or item.get('current_price') or item.get('price') or '')
+        )
+        price = float(price_match.group()) if price_match else None
+
+        product = {column: None for column in self.columns}
+        product.update(
+            {
+                'brand_name': brand,
+                'product_name': name,
+                'product_variety': str(item.get('product_variety') or item.get('size') or 'N/A'),
+                'description': str(item.get('description') or item.get('sale_story') or name),
+                'required_purchase_quantity': 1,
+                'price': price,
+                'sale_price': price,
+                'quantity_at_sale_price': 1 if price is not None else None,
+                'deal_type': 'SALE_PRICE' if price is not None else 'OTHER',
+                'requires_store_card': False,
+                'valid_from': str(item.get('valid_from') or date.today().isoformat()),
+                'valid_to': str(
+                    item.get('valid_to') or (date.today() + timedelta(days=7)).isoformat()
+                ),
+                'source_item': index,
+            }
+        )
+
+        return {column: product[column] for column in self.columns}
+
+    def _make_args(self, items: list[Any]) -> dict[str, Any]:
+        products = [self._make_product(item, i) for i, item in enumerate(items)]
+        if not self.positional:
+            return {'products': products}
+
+        rows = []
+        for product in products:
+            rows.append(
+                [
+                    '' if value is None else str(value).lower() if isinstance(value, bool) else str(value)
+                    for value in product.values()
+                ]
+            )
+
+        return {'rows': rows}
+
+    async def generate_content_async(self, contents: list, **kwargs) -> _Response:
+        self.calls += 1
+
+        prompt_text = self._get_prompt_text(contents)
+        await asyncio.sleep(
+            self._random.lognormvariate(math.log(max(self.latency_median, 0.001)), self.latency_sigma)
+        )
+
+        outcome = self._random.random()
+        for rate, failure in (
+            (self.rate_limit_rate, 'rate_limit'),
+            (self.server_error_rate, 'server_error'),
+            (self.empty_rate, 'empty'),
+            (self.malformed_rate, 'malformed'),
+            (self.truncated_rate, 'truncated'),
+        ):
+            if outcome < rate:
+                break
+
+            outcome -= rate
+        else:
+            failure = None
+
+        if failure == 'rate_limit':
+            raise Exception(f'429 Resource has been exhausted for {self.model_name} (fake). Please retry in 2s.')
+
+        if failure == 'server_error':
+            raise FakeServerError(f'503 The service is currently unavailable for {self.model_name} (fake)')
+
+        items = self.parse_items(prompt_text)
+        args = {'products': []} if failure == 'empty' else self._make_args(items)
+        parts = (
+            [_Part(text='Here are the products I found: ...')]
+            if failure == 'malformed'
+            else [_Part(function_call=_FunctionCall('extract_rows', args))]
+        )
+
+        return _Response(
+            [_Candidate(_Content(parts), 'MAX_TOKENS' if failure == 'truncated' else 'STOP')],
+            _UsageMetadata(len(prompt_text) // 4 + 1, len(orjson.dumps(args)) // 4 + 1),
+        )
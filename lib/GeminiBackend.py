@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Protocol
+
+from google.ai import generativelanguage as glm
+from google.cloud import aiplatform_v1beta1 as aiplatform
+from google.oauth2 import service_account
+
+from lib.CredentialPool import PoolMember
+from lib.FakeGeminiModel import FakeGeminiModel
+
+# what a failed call means for the credential pool - see `classify_error`
+RATE_LIMIT = 'rate_limit'
+SERVER_ERROR = 'server_error'
+OTHER_ERROR = 'other'
+
+DEFAULT_VERTEX_REGION = 'us-central1'
+
+
+def classify_error(e: Exception) -> str:
+    """
+    Whether a failed call was rate limited, failed on the server or is anything else - the google clients
+    set an HTTP `code` on their errors, and put it in the message otherwise.
+    """
+    code = getattr(e, 'code', None)
+    if code == 429 or '429' in str(e) or 'resource exhausted' in str(e).lower():
+        return RATE_LIMIT
+
+    if isinstance(code, int):
+        return SERVER_ERROR if code >= 500 else OTHER_ERROR
+
+    if re.search(r'\b5\d\d\b', str(e)) or any(
+        status in str(e).lower() for status in ('internal error', 'unavailable', 'deadline exceeded')
+    ):
+        return SERVER_ERROR
+
+    return OTHER_ERROR
+
+
+class GeminiBackend(Protocol):
+    """
+    Everything the extraction client needs from an API - building one model per pool member and tier,
+    sending a prompt to one of them, and telling the pool what a failure means. The backend is picked
+    once, when the client is created.
+
+    Attributes:
+        name (str): Identifies the backend in cache keys and logs.
+
+    """
+
+    name: str
+
+    def build_model(self, model_name: str, member: PoolMember) -> Any:
+        ...
+
+    async def generate(self, model: Any, prompt_text: str) -> Any:
+        """
+        Sends `prompt_text` to `model` with the `extract_rows` tool, and returns the raw response.
+        """
+        ...
+
+    def classify_error(self, e: Exception) -> str:
+        ...
+
+
+def _set_options(model_options: dict[str, Any]) -> dict[str, Any]:
+    return {key: value for key, value in model_options.items() if value is not None}
+
+
+class AIStudioBackend:
+    """
+    Gemini through Google AI Studio API keys.
+
+    Every key gets its own API client, shared by the models of every tier - `genai.configure` only holds one
+    key for the whole process.
+
+    Args:
+        output_tool_def (dict): The `extract_rows` tool the model has to call.
+        model_options (dict): Temperature, top-k, top-p and max output tokens of the generation config.
+
+    """
+
+    name = 'aistudio'
+
+    def __init__(self, output_tool_def: dict, model_options: dict[str, Any]) -> None:
+        self.tools = [glm.Tool(output_tool_def)]
+        self.generation_config = glm.GenerationConfig(**_set_options(model_options))
+        self.safety_settings = [
+            glm.SafetySetting(
+                category=category,
+                threshold=glm.SafetySetting.HarmBlockThreshold.BLOCK_NONE,
+            )
+            for category in (
+                glm.HarmCategory.HARM_CATEGORY_HARASSMENT,
+                glm.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+                glm.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+                glm.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
+            )
+        ]
+        self._clients: dict[str, glm.GenerativeServiceAsyncClient] = {}
+
+    def build_model(
+        self, model_name: str, member: PoolMember
+    ) -> tuple[glm.GenerativeServiceAsyncClient, str]:
+        if member.name not in self._clients:
+            client_options = {'api_key': member.credentials['api_key']}
+            if member.credentials.get('api_endpoint'):
+                client_options['api_endpoint'] = member.credentials['api_endpoint']
+
+            self._clients[member.name] = glm.GenerativeServiceAsyncClient(
+                client_options=client_options
+            )
+
+        return (
+            self._clients[member.name],
+            model_name if model_name.startswith('models/') else f'models/{model_name}',
+        )
+
+    async def generate(
+        self, model: tuple[glm.GenerativeServiceAsyncClient, str], prompt_text: str
+    ) -> glm.GenerateContentResponse:
+        client, model_name = model
+        return await client.generate_content(
+            request=glm.GenerateContentRequest(
+                model=model_name,
+                contents=[glm.Content(role='user', parts=[glm.Part(text=prompt_text)])],
+                tools=self.tools,
+                generation_config=self.generation_config,
+                safety_settings=self.safety_settings,
+            )
+        )
+
+    def classify_error(self, e: Exception) -> str:
+        return classify_error(e)
+
+
+class VertexBackend:
+    """
+    Gemini through Vertex AI projects.
+
+    Every member gets its own prediction client, with the member's regional endpoint and credentials (a
+    service account `credentials_file`, or the application default credentials), and requests name the
+    member's project and region themselves - `vertexai.init` only holds one project for the whole process.
+
+    Args:
+        output_tool_def (dict): The `extract_rows` tool the model has to call.
+        model_options (dict): Temperature, top-k, top-p and max output tokens of the generation config.
+
+    """
+
+    name = 'vertex'
+
+    def __init__(self, output_tool_def: dict, model_options: dict[str, Any]) -> None:
+        self.tools = [aiplatform.Tool(output_tool_def)]
+        self.generation_config = aiplatform.GenerationConfig(**_set_options(model_options))
+        self._clients: dict[str, aiplatform.PredictionServiceAsyncClient] = {}
+
+    def build_model(
+        self, model_name: str, member: PoolMember
+    ) -> tuple[aiplatform.PredictionServiceAsyncClient, str]:
+        region = member.credentials.get('region') or DEFAULT_VERTEX_REGION
+        if member.name not in self._clients:
+            credentials = None
+            if member.credentials.get('credentials_file'):
+                credentials = service_account.Credentials.from_service_account_file(
+                    member.credentials['credentials_file'],
+                    scopes=['https://www.googleapis.com/auth/cloud-platform'],
+                )
+
+            self._clients[member.name] = aiplatform.PredictionServiceAsyncClient(
+                credentials=credentials,
+                client_options={'api_endpoint': f'{region}-aiplatform.googleapis.com'},
+            )
+
+        return (
+            self._clients[member.name],
+            f'projects/{member.credentials["project_id"]}/locations/{region}/publishers/google/models/{model_name}',
+        )
+
+    async def generate(
+        self, model: tuple[aiplatform.PredictionServiceAsyncClient, str], prompt_text: str
+    ) -> aiplatform.GenerateContentResponse:
+        client, model_name = model
+        return await client.generate_content(
+            request=aiplatform.GenerateContentRequest(
+                model=model_name,
+                contents=[
+                    aiplatform.Content(role='user', parts=[aiplatform.Part(text=prompt_text)])
+                ],
+                tools=self.tools,
+                generation_config=self.generation_config,
+            )
+        )
+
+    def classify_error(self, e: Exception) -> str:
+        return classify_error(e)
+
+
+class FakeBackend:
+    """
+    Offline `FakeGeminiModel`s in place of the API, for load testing.
+
+    Args:
+        output_columns (list[str]): The columns of the `extract_rows` schema.
+        positional (bool, optional): Whether the models answer with the positional contract. Defaults to False.
+        seed (str, optional): Seeds every model's random stream, together with its model and member name.
+        **model_options: Latency and failure rates, passed on to every `FakeGeminiModel`.
+
+    """
+
+    name = 'fake'
+
+    def __init__(
+        self, output_columns: list[str], positional: bool = False, seed: str = '0', **model_options: Any
+    ) -> None:
+        self.output_columns = output_columns
+        self.positional = positional
+        self.seed = seed
+        self.model_options = model_options
+
+    def build_model(self, model_name: str, member: PoolMember) -> FakeGeminiModel:
+        return FakeGeminiModel(
+            model_name,
+            self.output_columns,
+            positional=self.positional,
+            # every model gets its own reproducible stream
+            seed=f'{self.seed}:{model_name}:{member.name}',
+            **self.model_options,
+        )
+
+    async def generate(self, model: FakeGeminiModel, prompt_text: str) -> Any:
+        return await model.generate_content_async(
+            [dict(role='user', parts=[{'text': prompt_text}])]
+        )
+
+    def classify_error(self, e: Exception) -> str:
+        return classify_error(e)
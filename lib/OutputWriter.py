@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor
+from typing import Any
+
+from loguru import logger
+
+from lib.DealDatabase import DealDatabase
+from lib.DealHistory import DealHistory
+
+
+class OutputWriter:
+    """
+    The single writer of the deal database.
+
+    Stores never write the output themselves - they push typed row batches, sheet resets and the manifest
+    written when a store finishes onto a bounded queue, and one writer task applies them in order.
+    Whatever is waiting on the queue when the writer wakes up is committed together in one transaction,
+    so a busy run makes a handful of large commits instead of one per batch. A full queue makes the
+    producing stores wait, which keeps memory bounded when extraction outpaces the disk.
+
+    The writer task is started on the first write, on the running event loop. Commits run on `executor`,
+    so the event loop keeps serving requests while SQLite writes. `flush` waits for every queued
+    operation to be committed, and `close` does the same and stops the task.
+
+    A sheet whose rows fail to commit is marked failed until its next reset - its manifest is not written,
+    so the run is never recorded as complete, and `finish_sheet` raises instead.
+
+    With a `deal_history`, every store that finishes is also recorded as that week's snapshot of the store,
+    once its manifest is committed.
+
+    Args:
+        deal_database (DealDatabase): The database the writer owns.
+        max_queued_batches (int, optional): Queued operations before producers have to wait. Defaults to 64.
+        max_commit_rows (int, optional): Rows after which a group commit is closed. Defaults to 1000.
+        executor (Executor | None, optional): Where commits run. Defaults to the event loop's default
+            executor.
+        deal_history (DealHistory | None, optional): Where finished stores are recorded. Defaults to None.
+
+    Attributes:
+        commits (int): Transactions committed.
+        rows (int): Rows written.
+        failed_rows (int): Rows that could not be written.
+        max_queue_depth (int): The most operations that were waiting at once.
+
+    """
+
+    def __init__(
+        self,
+        deal_database: DealDatabase,
+        max_queued_batches: int = 64,
+        max_commit_rows: int = 1000,
+        executor: Executor | None = None,
+        deal_history: DealHistory | None = None,
+    ) -> None:
+        self.deal_database = deal_database
+        self._max_queued_batches = max(max_queued_batches, 1)
+        self._max_commit_rows = max(max_commit_rows, 1)
+        self._executor = executor
+        self.deal_history = deal_history
+
+        self._queue: asyncio.Queue[tuple[str, str, Any]] | None = None
+        self._task: asyncio.Task | None = None
+        self._failed_sheets: set[str] = set()
+
+        self.commits = 0
+        self.rows = 0
+        self.failed_rows = 0
+        self.max_queue_depth = 0
+
+    def _ensure_started(self) -> asyncio.Queue:
+        if self._task is None or self._task.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(maxsize=self._max_queued_batches)
+
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+        return self._queue
+
+    async def put_rows(self, sheet: str, rows: list[dict[str, Any]]) -> None:
+        if not rows:
+            return
+
+        queue = self._ensure_started()
+        await queue.put(('rows', sheet, list(rows)))
+        self.max_queue_depth = max(self.max_queue_depth, queue.qsize())
+
+    async def reset_sheet(self, sheet: str) -> None:
+        # resets go through the queue too, so they can't overtake rows that were queued before them
+        queue = self._ensure_started()
+        await queue.put(('reset', sheet, None))
+
+    async def finish_sheet(self, sheet: str, publication_ids: list[str] | None = None) -> None:
+        """
+        Writes the manifest of `sheet` once every row queued before it is committed, and waits for it.
+
+        Raises:
+            Exception: When some of the sheet's rows since its last reset could not be written - the
+                manifest is not written then.
+        """
+        queue = self._ensure_started()
+        finished = asyncio.get_running_loop().create_future()
+        await queue.put(('finish', sheet, (list(publication_ids or []), finished)))
+        await finished
+
+    async def flush(self) -> None:
+        if self._queue is not None and self._task is not None:
+            await self._queue.join()
+
+    async def close(self) -> None:
+        await self.flush()
+
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @staticmethod
+    def _count_rows(group: list[tuple[str, str, Any]]) -> int:
+        return sum(len(payload) for kind, _, payload in group if kind == 'rows')
+
+    def _take_group(self, first: tuple[str, str, Any]) -> list[tuple[str, str, Any]]:
+        group = [first]
+        while self._count_rows(group) < self._max_commit_rows:
+            try:
+                group.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        return group
+
+    def _record_history(self, manifests: list[dict[str, Any]]) -> None:
+        for manifest in manifests:
+            try:
+                self.deal_history.add_snapshot(
+                    manifest['sheet'],
+                    manifest['week'],
+                    manifest['content_hash'],
+                    self.deal_database.get_rows(manifest['sheet']),
+                )
+            except Exception as e:
+                logger.warning(f'Unable to record {manifest["sheet"]} in the deal history: {e}')
+
+    def _commit_group(self, group: list[tuple[str, str, Any]]) -> set[str]:
+        # returns the sheets whose manifest was committed
+        manifests = []
+        try:
+            for kind, sheet, payload in group:
+                if kind == 'reset':
+                    self.deal_database.reset_sheet(sheet, commit=False)
+                    self._failed_sheets.discard(sheet)
+                elif kind == 'rows':
+                    self.deal_database.add_rows(sheet, payload, commit=False)
+                elif kind == 'finish' and sheet not in self._failed_sheets:
+                    publication_ids, _ = payload
+                    manifests.append(
+                        self.deal_database.write_manifest(sheet, publication_ids, commit=False)
+                    )
+
+            self.deal_database.commit()
+        except Exception as e:
+            self.deal_database.rollback()
+
+            # every sheet of the group lost its rows, or its reset or manifest
+            self._failed_sheets.update(sheet for _, sheet, _ in group)
+            failed_rows = self._count_rows(group)
+            self.failed_rows += failed_rows
+            logger.error(f'Unable to write {failed_rows} rows to the deal database: {e}')
+            return set()
+
+        self.commits += 1
+        self.rows += self._count_rows(group)
+
+        if self.deal_history is not None:
+            self._record_history(manifests)
+
+        return {manifest['sheet'] for manifest in manifests}
+
+    async def _run(self) -> None:
+        while True:
+            group = self._take_group(await self._queue.get())
+            finished_sheets = set()
+            try:
+                finished_sheets = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._commit_group, group
+                )
+            finally:
+                for kind, sheet, payload in group:
+                    if kind == 'finish' and not payload[1].done():
+                        if sheet in finished_sheets:
+                            payload[1].set_result(None)
+                        else:
+                            payload[1].set_exception(
+                                Exception(
+                                    f'Unable to write every row of {sheet} - its run is not finished'
+                                )
+                            )
+
+                    self._queue.task_done()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'commits': self.commits,
+            'rows': self.rows,
+            'failed_rows': self.failed_rows,
+            'max_queue_depth': self.max_queue_depth,
+        }
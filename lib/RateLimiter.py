@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+
+class RateLimiter:
+    """
+    A process-wide token bucket limiter for requests-per-minute and tokens-per-minute quotas.
+
+    Every caller acquires one request and an estimate of the tokens it is about to send before making
+    a call. Both buckets refill continuously at their per-minute rate and hold at most one minute of
+    quota, so sustained traffic settles right at the ceiling instead of bursting into it.
+
+    When the API answers with a 429 anyway, `penalize` pauses the limiter for the Retry-After period
+    and drains both buckets, so every waiting caller backs off together and traffic ramps back up
+    gradually once the pause is over.
+
+    Args:
+        requests_per_minute (float | None, optional): The request quota. `None` or 0 disables the request bucket.
+        tokens_per_minute (float | None, optional): The token quota. `None` or 0 disables the token bucket.
+
+    Attributes:
+        throttled_seconds (float): Total time callers spent waiting on the limiter.
+        penalties (int): Number of times the limiter was paused because of a rate limit response.
+
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+    ) -> None:
+        self._requests_per_minute = requests_per_minute or None
+        self._tokens_per_minute = tokens_per_minute or None
+
+        self._requests_available = float(self._requests_per_minute or 0)
+        self._tokens_available = float(self._tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+        self.throttled_seconds = 0.0
+        self.penalties = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+
+        if self._requests_per_minute:
+            self._requests_available = min(
+                self._requests_per_minute,
+                self._requests_available + elapsed * self._requests_per_minute / 60,
+            )
+
+        if self._tokens_per_minute:
+            self._tokens_available = min(
+                self._tokens_per_minute,
+                self._tokens_available + elapsed * self._tokens_per_minute / 60,
+            )
+
+    def _seconds_until_available(self, tokens: int) -> float:
+        wait = max(0.0, self._blocked_until - time.monotonic())
+
+        if self._requests_per_minute and self._requests_available < 1:
+            wait = max(
+                wait,
+                (1 - self._requests_available) * 60 / self._requests_per_minute,
+            )
+
+        if self._tokens_per_minute:
+            # a single request larger than the whole bucket only has to wait for a full bucket
+            tokens = min(tokens, self._tokens_per_minute)
+            if self._tokens_available < tokens:
+                wait = max(
+                    wait,
+                    (tokens - self._tokens_available) * 60 / self._tokens_per_minute,
+                )
+
+        return wait
+
+    async def acquire(self, tokens: int = 0) -> None:
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = self._seconds_until_available(tokens)
+                if wait <= 0:
+                    break
+
+                self.throttled_seconds += wait
+                await asyncio.sleep(wait)
+
+            if self._requests_per_minute:
+                self._requests_available -= 1
+
+            if self._tokens_per_minute:
+                self._tokens_available -= min(tokens, self._tokens_per_minute)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """
+        Corrects the token bucket once the real token count of a request is known.
+        """
+        if not self._tokens_per_minute:
+            return
+
+        self._tokens_available = min(
+            self._tokens_per_minute,
+            self._tokens_available + estimated_tokens - actual_tokens,
+        )
+
+    def penalize(self, retry_after: float) -> None:
+        """
+        Pauses all callers for `retry_after` seconds and drains both buckets.
+        """
+        self._refill()
+        self._blocked_until = max(
+            self._blocked_until, time.monotonic() + retry_after
+        )
+        self._requests_available = min(self._requests_available, 0.0)
+        self._tokens_available = min(self._tokens_available, 0.0)
+        self.penalties += 1
+
+    def stats(self) -> dict[str, float]:
+        return {
+            'requests_per_minute': self._requests_per_minute or 0,
+            'tokens_per_minute': self._tokens_per_minute or 0,
+            'throttled_seconds': round(self.throttled_seconds, 1),
+            'penalties': self.penalties,
+        }
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, TypeVar
+
+T = TypeVar('T')
+
+
+class RequestHedger:
+    """
+    Cuts the tail latency of slow calls by racing a duplicate ("hedge") against them.
+
+    The hedger keeps a window of recent call latencies. Once a call has been running longer than the
+    observed percentile latency (p90 by default), a hedge is started and whichever of the two returns a
+    valid response first is used - the other one is cancelled. A failed or invalid response from either
+    call only loses the race, the call fails when both do. Hedges are capped at `max_hedge_percent` of
+    all calls so a generally slow backend can't double the traffic.
+
+    Args:
+        max_hedge_percent (float, optional): The maximum share of calls that may be hedged. Defaults to 5.
+        percentile (float, optional): The latency percentile a call has to exceed to be hedged. Defaults to 0.9.
+        min_samples (int, optional): Calls to observe before hedging starts. Defaults to 20.
+        window (int, optional): How many recent latencies the percentile is computed over. Defaults to 200.
+
+    Attributes:
+        calls (int): Calls that went through the hedger.
+        hedges (int): Calls a hedge was started for.
+        hedge_wins (int): Hedges that returned before the original call.
+
+    """
+
+    def __init__(
+        self,
+        max_hedge_percent: float = 5.0,
+        percentile: float = 0.9,
+        min_samples: int = 20,
+        window: int = 200,
+    ) -> None:
+        self._max_hedge_percent = max_hedge_percent
+        self._percentile = percentile
+        self._min_samples = min_samples
+        self._latencies: deque[float] = deque(maxlen=window)
+
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record_latency(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def hedge_delay(self) -> float | None:
+        if len(self._latencies) < self._min_samples:
+            return None
+
+        latencies = sorted(self._latencies)
+        return latencies[min(math.ceil(len(latencies) * self._percentile), len(latencies)) - 1]
+
+    def can_hedge(self) -> bool:
+        return (self.hedges + 1) * 100 <= self._max_hedge_percent * self.calls
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        hedge_call: Callable[[], Awaitable[T]],
+        is_valid: Callable[[T], bool] = lambda result: result is not None,
+    ) -> T:
+        self.calls += 1
+        started_at = time.perf_counter()
+
+        primary = asyncio.ensure_future(call())
+        delay = self.hedge_delay()
+        if delay is not None and self.can_hedge():
+            try:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+            except asyncio.CancelledError:
+                primary.cancel()
+                raise
+
+            if not done:
+                return await self._race(primary, hedge_call, is_valid, started_at)
+
+        result = await primary
+        self.record_latency(time.perf_counter() - started_at)
+        return result
+
+    async def _race(
+        self,
+        primary: asyncio.Future,
+        hedge_call: Callable[[], Awaitable[T]],
+        is_valid: Callable[[T], bool],
+        started_at: float,
+    ) -> T:
+        self.hedges += 1
+        hedge = asyncio.ensure_future(hedge_call())
+
+        pending = {primary, hedge}
+        fallback: Any = None
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None and is_valid(task.result()):
+                        self.hedge_wins += task is hedge
+                        self.record_latency(time.perf_counter() - started_at)
+                        return task.result()
+
+                    # the original call's outcome is what the caller sees when neither call is usable
+                    if task is primary:
+                        error = task.exception()
+                        fallback = None if error else task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if error is not None:
+            raise error
+
+        return fallback
+
+    def stats(self) -> dict[str, Any]:
+        delay = self.hedge_delay()
+        return {
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'hedge_after_seconds': round(delay, 2) if delay is not None else None,
+        }
@@ -15,11 +15,15 @@ class DollarGeneral(Flipp):
                 continue
 
             self.flyer_ids_to_process.append(flyer['id'])
+            self.is_unchanged_flyer(flyer)
 
         if not self.flyer_ids_to_process:
             raise Exception('Could not locate Weekly Ad flyer')
 
         for flyer_id in self.flyer_ids_to_process:
+            if str(flyer_id) in self.unchanged_publication_ids:
+                continue
+
             self.current_flyer_id = flyer_id
             async for product in self.grab_sales():
                 try:
@@ -39,4 +43,5 @@ class DollarGeneral(Flipp):
         ):
             return None
 
-        self.processing_queue.append(product)
+        sku = product.pop('sku', None)
+        self.queue_item(product, sku)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+from datetime import date
 from typing import AsyncGenerator, Any
 
 import httpx as httpx
@@ -24,6 +25,16 @@ class Flipp(Store, ABC):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+        # the flyer every product was read from, and the flyer and sku of every queued item, for
+        # incremental refreshes - kept out of the items, so they don't reach the prompt or the cache keys
+        self.flyer_id_by_sku: dict[str, int] = {}
+        self.identity_by_item_hash: dict[str, tuple[str | None, str]] = {}
+        self.previous_manifest = (
+            self.output_writer.deal_database.get_manifest(self._store_name, latest=True)
+            if self.incremental_refresh
+            else None
+        )
+
         self.store_code = self.store_config.get('store_code')
         self.access_token = self.store_config.get('access_token')
 
@@ -41,6 +52,40 @@ class Flipp(Store, ABC):
     def store_name(self, value: str):
         self._store_name = value
 
+    @property
+    def publication_ids(self) -> list[str]:
+        return [str(flyer_id) for flyer_id in self.flyer_ids_to_process]
+
+    def item_identity(self, item: dict[str, Any]) -> tuple[str | None, str | None]:
+        return self.identity_by_item_hash.get(self._item_hash(item), (None, None))
+
+    def queue_item(self, item: dict[str, Any], sku: Any = None) -> None:
+        if sku:
+            flyer_id = self.flyer_id_by_sku.get(str(sku))
+            self.identity_by_item_hash[self._item_hash(item)] = (
+                None if flyer_id is None else str(flyer_id),
+                str(sku),
+            )
+
+        self.processing_queue.append(item)
+
+    def is_unchanged_flyer(self, flyer: dict[str, Any]) -> bool:
+        """
+        Whether `flyer` was already extracted by the last finished run - its products are kept from that
+        run instead of being fetched again.
+        """
+        if not self.previous_manifest or str(flyer['id']) not in self.previous_manifest['publication_ids']:
+            return False
+
+        try:
+            if parse(flyer['valid_to']).date() < date.today():
+                return False
+        except (KeyError, TypeError, ValueError):
+            pass
+
+        self.unchanged_publication_ids.add(str(flyer['id']))
+        return True
+
     @property
     def flyer_url(self) -> str:
         return f'https://dam.flippenterprise.net/flyerkit/publications/{self._store_name}?locale=en&access_token={self.access_token}&show_storefronts=true&store_code={self.store_code}'
@@ -107,6 +152,9 @@ class Flipp(Store, ABC):
             except ValueError:
                 pass
 
+            if item.get('sku'):
+                self.flyer_id_by_sku[str(item['sku'])] = self.current_flyer_id
+
             filtered_item = {
                 'sku': item.get('sku'),
                 'item_type': item.get('item_type'),
@@ -141,9 +189,14 @@ class Flipp(Store, ABC):
                 continue
 
             self.flyer_ids_to_process.append(flyer['id'])
+            if self.is_unchanged_flyer(flyer):
+                self.logger.info(f'Flyer {flyer["id"]} is unchanged since the last run')
 
         tasks = []
         for flyer_id in self.flyer_ids_to_process:
+            if str(flyer_id) in self.unchanged_publication_ids:
+                continue
+
             self.current_flyer_id = flyer_id
 
             async for product in self.grab_sales():
@@ -183,4 +236,4 @@ class Flipp(Store, ABC):
             'valid_to': product['valid_to'],
         }
 
-        self.processing_queue.append(cleaned_product)
+        self.queue_item(cleaned_product, product.get('sku'))
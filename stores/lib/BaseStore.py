@@ -1,32 +1,43 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import json
-import os
+from collections import defaultdict
+from datetime import date, datetime
 from pathlib import Path
 from typing import Dict, List
-from zipfile import BadZipFile
 
 import aiometer
-import dateutil.parser
 import orjson
-import pandas as pd
 from httpx import AsyncHTTPTransport
 from loguru import logger
-from more_itertools import chunked
-from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Side
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.dimensions import DimensionHolder, ColumnDimension
 from pydantic import BaseModel
-from openpyxl.utils.dataframe import dataframe_to_rows
 from tqdm.asyncio import tqdm as tqdm_asyncio
 
+from lib.ExtractionCache import ExtractionCache
 from lib.RetryTransport import RetryTransport
 from lib.constants import GLOBAL_COUPON_PROVIDERS
-from stores.lib.constants import HEADERS, FILTER_KEYS
-from utils.call_ai_model_gemini import extract_products_using_gemini
+from stores.lib.constants import (
+    BOOLEAN_HEADERS,
+    DATE_HEADERS,
+    FILTER_KEYS,
+    HEADERS,
+    OUTPUT_COLUMN_ALIASES,
+)
+from utils.call_ai_model_gemini import (
+    PRODUCT_SCHEMA,
+    extract_products_using_gemini,
+    get_extraction_cache,
+    get_extraction_cache_key,
+)
+from utils.batching import BatchPacker
 from utils.config import get_config
+from utils.deal_database import get_output_writer
+from utils.decoding import RowDecoder
+from utils.dedup import get_deduplicator
+from utils.executors import run_in_thread
+from utils.fast_path import FastPathExtractor
 
 
 class Store(BaseModel):
@@ -61,6 +72,36 @@ class Store(BaseModel):
             self.store_config = config[store_name]
 
         self.items_at_once = config['config'].getint('items_at_once', 5)
+        self.batch_packer = BatchPacker(
+            input_token_budget=config['config'].getint('BATCH_INPUT_TOKEN_BUDGET', 4000),
+            output_token_budget=config['config'].getint('BATCH_OUTPUT_TOKEN_BUDGET', 2048),
+            max_items=config['config'].getint('BATCH_MAX_ITEMS', 12),
+            output_schema=config['config'].get('OUTPUT_SCHEMA', 'named'),
+        )
+        self.fast_path = (
+            FastPathExtractor()
+            if config['config'].getboolean('FAST_PATH_ENABLED', True)
+            else None
+        )
+        self.deduplicator = (
+            get_deduplicator()
+            if config['config'].getboolean('CROSS_STORE_DEDUP', True)
+            else None
+        )
+        self._claimed_keys: set[str] = set()
+        self.output_writer = get_output_writer()
+        self.incremental_refresh = config['config'].getboolean('INCREMENTAL_REFRESH', True)
+        self.resume_interrupted = config['config'].getboolean('RESUME_INTERRUPTED_RUNS', True)
+        # publications that are unchanged since the last run and weren't fetched again
+        self.unchanged_publication_ids: set[str] = set()
+        # publications with rows that couldn't be attributed to an item - never recorded as finished
+        self.unattributed_publication_ids: set[str] = set()
+        self.row_decoder = RowDecoder(
+            PRODUCT_SCHEMA['properties'],
+            self.headers,
+            aliases=OUTPUT_COLUMN_ALIASES,
+            date_columns=DATE_HEADERS,
+        )
 
     async def __aenter__(self):
         self.pbar = tqdm_asyncio([], desc=self._store_name)
@@ -79,31 +120,7 @@ class Store(BaseModel):
         )
 
     def check_current_data(self):
-        try:
-            wb = load_workbook(self.excel_file_path)
-        except (BadZipFile, KeyError, FileNotFoundError):
-            return False
-
-        if self._store_name not in wb.sheetnames:
-            return False
-
-        sheet = wb[self._store_name]
-        if sheet.max_row <= 1:
-            return False
-
-        valid_to_col = next((cell.column for cell in sheet[1] if cell.value == 'Valid To'), None)
-        if valid_to_col is None:
-            return False
-
-        for row in sheet.iter_rows(min_row=2):
-            valid_to_cell = next((cell for cell in row if cell.column == valid_to_col and cell.value), None)
-            if valid_to_cell:
-                try:
-                    dateutil.parser.parse(valid_to_cell.value)
-                    return True
-                except ValueError:
-                    continue
-        return False
+        return self.output_writer.deal_database.has_current_data(self._store_name)
 
     @property
     def logger(self):
@@ -121,163 +138,410 @@ class Store(BaseModel):
     def get_title_header(self) -> List[str]:
         return [h.replace('_', ' ').title() for h in self.headers]
 
-    def reset_worksheet(self):
-        if not os.path.exists(self.excel_file_path):
-            wb = Workbook()
-            ws = wb.active
-            ws.title = self._store_name
-        else:
-            try:
-                wb = load_workbook(self.excel_file_path)
-            except (BadZipFile, KeyError):
-                wb = Workbook()
-                ws = wb.active
-                ws.title = self._store_name
+    async def reset_worksheet(self):
+        await self.output_writer.reset_sheet(self._store_name)
 
-            if self._store_name in wb.sheetnames:
-                wb.remove(wb[self._store_name])
+    async def add_rows_to_store_worksheet(self, data: List[Dict]):
+        # rows come out of the `RowDecoder` typed and with every header set
+        await self.output_writer.put_rows(self._store_name, data)
 
-            ws = wb.create_sheet(title=self._store_name)
+    async def add_row_to_store_worksheet(self, data: Dict):
+        row = {
+            col: data.get(col, 'N/A')
+            if col not in BOOLEAN_HEADERS
+            else bool(data.get(col))
+            for col in self.headers
+        }
 
-        ws.append(self.get_title_header())
-        wb.save(self.excel_file_path)
+        await self.output_writer.put_rows(self._store_name, [row])
+
+    def item_identity(self, item: Dict) -> tuple[str | None, str | None]:
+        """
+        The publication and product ids of a queued item, when the store knows them. Items without a
+        product id are identified by their content.
+        """
+        return None, None
+
+    @staticmethod
+    def _item_hash(item) -> str:
+        return hashlib.sha256(ExtractionCache.normalize_user_input(item)).hexdigest()
+
+    def _item_metadata(self, item) -> Dict:
+        publication_id, product_id = self.item_identity(item) if isinstance(item, dict) else (None, None)
+        item_hash = self._item_hash(item)
+        return {
+            'publication_id': None if publication_id is None else str(publication_id),
+            'item_key': f'{publication_id or ""}:{product_id}' if product_id else item_hash,
+            'item_hash': item_hash,
+        }
 
-    def add_rows_to_store_worksheet(self, data: List[Dict]):
+    def _decode_with_metadata(self, items: list, products: list[Dict]) -> list[Dict]:
+        # products are attributed to their item with the `source_item` index of the `extract_rows` schema
+        publication_ids = {
+            self._item_metadata(item)['publication_id'] for item in items
+        }
         rows = []
-        for row in data:
-            rows.append(
-                {
-                    col: row.get(col, 'N/A')
-                    if col not in ['requires_store_card']
-                    else bool(row.get(col))
-                    for col in self.headers
-                }
-            )
+        for product in products:
+            try:
+                item = items[int(float(product.get('source_item')))]
+            except (TypeError, ValueError, IndexError):
+                if len(publication_ids) == 1 and None not in publication_ids:
+                    # every item of the batch is from the same publication, so the row still belongs to it
+                    metadata = {
+                        'publication_id': next(iter(publication_ids)),
+                        'item_key': None,
+                        'item_hash': None,
+                    }
+                    rows.extend({**row, **metadata} for row in self.row_decoder.decode([product]))
+                else:
+                    # without attribution, the next run can't skip these publications and keep this row
+                    self.unattributed_publication_ids.update(publication_ids - {None})
+                    rows.extend(self.row_decoder.decode([product]))
+
+                continue
+
+            metadata = self._item_metadata(item)
+            rows.extend({**row, **metadata} for row in self.row_decoder.decode([product]))
+
+        return rows
+
+    def _carry_over_unchanged(self, items: list) -> tuple[list[Dict], list]:
+        """
+        Splits queued items into the rows of earlier runs that can be kept - items with an unchanged
+        content hash, and everything from publications that weren't fetched again - and the items that
+        are new or changed and have to be extracted. Expired rows are dropped.
+
+        Rows are committed as their batches land, so the rows of a run that timed out or died are its
+        checkpoint: a retried or restarted run resumes with the items that didn't finish.
+        """
+        if not self.incremental_refresh and not self.resume_interrupted:
+            return [], items
+
+        previous_rows = self.output_writer.deal_database.get_previous_rows(
+            self._store_name,
+            finished=self.incremental_refresh,
+            interrupted=self.resume_interrupted,
+        )
+        if not previous_rows:
+            return [], items
+
+        today = date.today()
+        rows_by_key = defaultdict(list)
+        hash_by_key = {}
+        carried_rows = []
+        for row in previous_rows:
+            valid_to = row.get('valid_to')
+            if isinstance(valid_to, date) and valid_to < today:
+                continue
+
+            if row.get('publication_id') in self.unchanged_publication_ids:
+                carried_rows.append(row)
+            elif row.get('item_key'):
+                rows_by_key[row['item_key']].append(row)
+                hash_by_key[row['item_key']] = row['item_hash']
+
+        remaining = []
+        changed = 0
+        for item in items:
+            metadata = self._item_metadata(item)
+            previous_hash = hash_by_key.get(metadata['item_key'])
+            if previous_hash == metadata['item_hash']:
+                carried_rows.extend(rows_by_key[metadata['item_key']])
+                continue
+
+            if previous_hash is not None:
+                changed += 1
+
+            remaining.append(item)
+
+        self.logger.info(
+            f'Keeping {len(carried_rows)} rows from earlier runs - {changed} changed and {len(remaining) - changed} new items to extract'
+        )
+        return carried_rows, remaining
 
-        book = load_workbook(self.excel_file_path)
-        sheet = book[self._store_name]
+    @property
+    def publication_ids(self) -> list[str]:
+        """
+        The flyers or publications the store's rows were built from, recorded in its manifest.
+        """
+        return []
 
-        df = pd.DataFrame(rows)
+    @property
+    def prompt_template(self) -> str:
+        return 'get_individual_products.jinja'
+
+    def _is_empty_product(self, row: Dict) -> bool:
+        # booleans always decode to a value, so they don't count towards a row having data - and neither
+        # does a deal type the decoder couldn't place (placeholders like `COUPON` decode to `OTHER`)
+        return all(
+            row.get(key) in ['N/A', None] or key == 'deal_type' and row.get(key) == 'OTHER'
+            for key in self.headers
+            if not isinstance(row.get(key), bool)
+        )
+
+    @property
+    def dead_letter_file_path(self) -> str:
+        return f'output/dead_letter/{self._store_name}.jsonl'
+
+    def quarantine_items(self, items: list, reason: str):
+        Path(self.dead_letter_file_path).parent.mkdir(parents=True, exist_ok=True)
+
+        quarantined_at = datetime.now().isoformat()
+        with open(self.dead_letter_file_path, 'ab') as f:
+            for item in items:
+                f.write(
+                    orjson.dumps(
+                        {
+                            'store': self._store_name,
+                            'reason': reason,
+                            'quarantined_at': quarantined_at,
+                            'item': item,
+                        },
+                        default=str,
+                    )
+                    + b'\n'
+                )
 
-        for row_obj in dataframe_to_rows(df, index=False, header=False):
-            sheet.append(row_obj)
+    async def process_queue(self):
+        # rows an interrupted attempt queued are part of its checkpoint
+        await self.output_writer.flush()
 
-        book.save(self.excel_file_path)
+        # read before the reset, which clears the last run when it happened this week
+        carried_rows, self.processing_queue = self._carry_over_unchanged(
+            self.processing_queue
+        )
+        if not self.processing_queue and not carried_rows:
+            self.logger.info('No items to process')
+            return
 
-    def add_row_to_store_worksheet(self, data: Dict):
-        row = {
-            col: data.get(col, 'N/A')
-            if col not in ['requires_store_card']
-            else bool(data.get(col))
-            for col in self.headers
-        }
+        await self.reset_worksheet()
+        await self.add_rows_to_store_worksheet(carried_rows)
 
-        if not Path(self.excel_file_path).exists():
-            book = Workbook()
-            sheet = book.active
-            sheet.title = self._store_name
-            sheet.append(self.get_title_header())
-        else:
-            book = load_workbook(self.excel_file_path)
-            sheet = book[self._store_name]
-
-        df = pd.DataFrame([row])
-
-        for row_obj in dataframe_to_rows(df, index=False, header=False):
-            sheet.append(row_obj)
-
-        book.save(self.excel_file_path)
-
-    def clean_worksheet(self):
-        book = load_workbook(self.excel_file_path)
-        sheet = book[self._store_name]
-        dim_holder = DimensionHolder(worksheet=sheet)
-        double = Side(border_style='thin', color='000000')
-
-        for col in range(sheet.min_column, sheet.max_column + 1):
-            dim_holder[get_column_letter(col)] = ColumnDimension(
-                sheet,
-                min=col,
-                max=col,
-                bestFit=True,
-                width=max([len(header) for header in self.headers]) + 5,
+        if self.fast_path:
+            fast_path_items, self.processing_queue = self.fast_path.split(
+                self.processing_queue
             )
+            if fast_path_items:
+                # tagged like every other row, so incremental refresh can carry them over
+                fast_path_rows = []
+                for item, item_rows in fast_path_items:
+                    metadata = self._item_metadata(item)
+                    fast_path_rows.extend(
+                        {**row, **metadata} for row in self.row_decoder.decode(item_rows)
+                    )
 
-        sheet.column_dimensions = dim_holder
+                self.logger.info(
+                    f'Extracted {len(fast_path_rows)} rows without Gemini ({dict(self.fast_path.stats)})'
+                )
+                await self.add_rows_to_store_worksheet(fast_path_rows)
 
-        # format first row
-        for cell in sheet[1]:
-            cell.font = cell.font.copy(
-                bold=True, color='FFFFFF', name='Segoe UI'
+        waiting = []
+        if self.deduplicator:
+            self.processing_queue, waiting, self._claimed_keys = (
+                self.deduplicator.claim(self.prompt_template, self.processing_queue)
             )
-            cell.border = cell.border.copy(
-                left=double, right=double, top=double, bottom=double
-            )
-            cell.alignment = cell.alignment.copy(
-                horizontal='center', vertical='center'
+            if waiting:
+                self.logger.info(
+                    f'{len(waiting)} items are already being extracted for another store'
+                )
+
+        self.logger.info(f'Processing {len(self.processing_queue)} items')
+
+        try:
+            quarantined = await self._extract_items(self.processing_queue)
+        finally:
+            # anything this store claimed but couldn't extract goes back to the stores waiting on it
+            for key in self._claimed_keys:
+                self.deduplicator.fail(key)
+
+            self._claimed_keys = set()
+
+        if waiting:
+            fallback_items = await self._add_shared_rows(waiting)
+            if fallback_items:
+                self.logger.info(
+                    f'Extracting {len(fallback_items)} shared items that could not be extracted elsewhere'
+                )
+                self.deduplicator.fallbacks += len(fallback_items)
+                quarantined += await self._extract_items(fallback_items)
+
+        if quarantined:
+            self.logger.error(
+                f'Unable to process {quarantined} items - see {self.dead_letter_file_path}'
             )
-            cell.fill = cell.fill.copy(fgColor='424242', patternType='solid')
 
-        for row in sheet.iter_rows(min_row=2):
-            for cell in row:
-                if cell.value is None:
-                    cell.value = 'N/A'
+        self.logger.info(
+            f'Finished processing queue (extraction cache: {get_extraction_cache().stats()}, batches: {self.batch_packer.stats()})'
+        )
 
-                if cell.value != 'N/A':
-                    try:
-                        int(cell.value)
-                    except ValueError:
-                        try:
-                            float(cell.value)
-                        except ValueError:
-                            if cell.value.lower() in ['true', 'false']:
-                                cell.value = bool(cell.value)
-
-                            cell.value = cell.value.encode(
-                                'latin1', 'ignore'
-                            ).decode('unicode_escape', 'ignore')
-                        else:
-                            cell.value = float(cell.value)
-                            cell.style = 'Currency'
-                            cell.number_format = '0.00'
-                    else:
-                        cell.value = int(cell.value)
-                        cell.style = 'Comma'
-                        cell.number_format = '#,##0'
-
-                cell.alignment = cell.alignment.copy(
-                    horizontal='center', vertical='center'
+        await self.output_writer.finish_sheet(
+            self._store_name,
+            [
+                publication_id
+                for publication_id in self.publication_ids
+                if str(publication_id) not in self.unattributed_publication_ids
+            ],
+        )
+
+    async def _extract_items(self, items: list) -> int:
+        """
+        Extracts `items` in packed batches and returns how many of them had to be quarantined.
+        """
+        items = await self._add_cached_items(items)
+
+        # Failing batches are split in half and retried until the failure is isolated to single items.
+        # Items that were already retried on their own are quarantined instead of being sent again.
+        batches = self.batch_packer.pack(items)
+        quarantined = 0
+        attempt = 0
+        while batches:
+            failed_batches = await self._extract_batches(batches)
+
+            batches = []
+            for batch in failed_batches:
+                if len(batch) > 1:
+                    middle = len(batch) // 2
+                    batches.extend([batch[:middle], batch[middle:]])
+                elif attempt == 0:
+                    batches.append(batch)
+                else:
+                    self.quarantine_items(batch, reason='no valid products extracted')
+                    quarantined += len(batch)
+
+            if batches:
+                self.logger.info(
+                    f'Retrying {sum(len(batch) for batch in batches)} items in {len(batches)} smaller batches'
                 )
-        book.save(self.excel_file_path)
+                self.timer_cm.shift(5 * len(batches))
 
-    async def process_queue(self, is_reprocess: bool = False):
-        if not self.processing_queue:
-            self.logger.info('No items to process')
-            return
+            attempt += 1
 
-        if not is_reprocess:
-            self.reset_worksheet()
+        return quarantined
 
-        self.logger.info(f'Processing {len(self.processing_queue)} items')
-        # Process the queue asynchronously and write to the Excel sheet
-        reprocess_queue = []
-        chunked_queue = [chunk for chunk in chunked(self.processing_queue, 4)]
-        tasks = []
-
-        for batch in chunked_queue:
-            tasks.append(
-                {
-                    'prompt_jinja_template_path': 'get_individual_products.jinja',
-                    'user_input': batch,
-                    'logger': self.logger,
-                }
+    async def _add_shared_rows(
+        self, waiting: list[tuple[Dict, asyncio.Future]]
+    ) -> list:
+        """
+        Writes the products other stores extracted for the items this store was waiting on, with this
+        store's own validity dates. Returns the items that still have to be extracted here.
+        """
+        rows = []
+        fallback_items = []
+        # `asyncio.wait` never cancels the futures, so a store timing out here doesn't affect the others
+        pending = {future for _, future in waiting}
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=30)
+            if done:
+                self.timer_cm.shift(10)
+
+        for item, future in waiting:
+            products = future.result()
+            if products is None:
+                fallback_items.append(item)
+                continue
+
+            metadata = self._item_metadata(item)
+            rows.extend(
+                {**row, **metadata}
+                for row in self.row_decoder.decode(
+                    self.deduplicator.with_store_dates(item, products)
+                )
+            )
+
+        if rows:
+            self.logger.info(
+                f'Adding {len(rows)} rows shared by other stores to {self._store_name} worksheet'
+            )
+            await self.add_rows_to_store_worksheet(rows)
+
+        return fallback_items
+
+    @staticmethod
+    def _products_by_item(items: list, products: list[Dict]) -> list[list[Dict]] | None:
+        """
+        The products of a batch split up by their `source_item`, each attributed to index 0 as if its item
+        had been extracted on its own - or None when some product isn't attributed to an item.
+        """
+        products_by_item = [[] for _ in items]
+        for product in products:
+            try:
+                index = int(float(product.get('source_item')))
+            except (TypeError, ValueError):
+                return None
+
+            if not 0 <= index < len(items):
+                return None
+
+            products_by_item[index].append({**product, 'source_item': 0})
+
+        return products_by_item
+
+    async def _add_cached_items(self, items: list) -> list:
+        """
+        Writes the rows of the items the extraction cache already holds, and returns the items that still
+        have to be extracted. Entries are per item, so an item is found whichever batch it was packed into.
+        """
+        keys = [
+            await get_extraction_cache_key(self.prompt_template, [item]) for item in items
+        ]
+        cached_products = await run_in_thread(get_extraction_cache().get_many, keys)
+
+        rows = []
+        missing_items = []
+        for item, key in zip(items, keys):
+            products = cached_products.get(key)
+            if products is None:
+                missing_items.append(item)
+                continue
+
+            if self.deduplicator:
+                self.deduplicator.share_products(
+                    self.prompt_template, [item], products, self._claimed_keys
+                )
+
+            rows.extend(self._decode_with_metadata([item], products))
+
+        if len(missing_items) < len(items):
+            self.logger.info(
+                f'Found {len(items) - len(missing_items)} of {len(items)} items in the extraction cache'
             )
 
-        self.pbar.reset(total=len(tasks))
+        if rows:
+            await self.add_rows_to_store_worksheet(rows)
+
+        return missing_items
+
+    async def _cache_items(self, items: list, products: list[Dict]) -> None:
+        products_by_item = self._products_by_item(items, products)
+        if products_by_item is None:
+            return
+
+        # items without products are left out, so they're sent to Gemini again next time
+        await run_in_thread(
+            get_extraction_cache().set_many,
+            {
+                await get_extraction_cache_key(self.prompt_template, [item]): item_products
+                for item, item_products in zip(items, products_by_item)
+                if item_products
+            },
+        )
+
+    async def _extract_batches(self, batches: list[list]) -> list[list]:
+        failed_batches = []
+        tasks = [
+            {
+                'prompt_jinja_template_path': self.prompt_template,
+                'user_input': batch,
+                'logger': self.logger,
+                'store': self._store_name,
+            }
+            for batch in batches
+        ]
+
+        self.pbar.reset(total=len(batches))
         self.pbar.set_description(f'Processing {self._store_name}')
         self.pbar.refresh()
 
-        rows_to_add = []
         self.timer_cm.shift(20 * len(tasks))
         async with aiometer.amap(async_fn=extract_products_using_gemini, args=tasks, max_at_once=self.items_at_once) as results:
             async for result_obj in results:
@@ -300,76 +564,26 @@ class Store(BaseModel):
                         )
                         continue
 
-                if not products:
-                    self.logger.warning(
-                        f'No products found for user input: {user_input} - adding to reprocess queue'
+                rows = self._decode_with_metadata(user_input, products)
+                if not rows or any(self._is_empty_product(row) for row in rows):
+                    self.logger.debug(
+                        f'No valid data found for user input: {user_input} - retrying'
                     )
-                    reprocess_queue.extend(user_input)
+                    self.batch_packer.record(len(user_input), succeeded=False)
+                    failed_batches.append(user_input)
                     continue
-                for i, product in enumerate(products):
-                    if all(
-                        [
-                            product.get(key)
-                            in ['N/A', None, 'COUPON', 'MANUFACTURER_COUPON']
-                            for key in self.headers
-                        ]
-                    ):
-                        self.logger.debug(
-                            f'No valid data found for product: {product} - adding to reprocess queue'
-                        )
-                        reprocess_queue.extend(user_input)
-                        continue
 
-                    brand_names = []
-                    if '|' in (product.get('brand_name') or ''):
-                        brand_names = product['brand_name'].split('|')
-
-                    if brand_names:
-                        for brand_name in brand_names:
-                            product['brand_name'] = brand_name.strip()
-                            rows_to_add.append(product)
-                    else:
-                        rows_to_add.append(product)
-
-                    try:
-                        if len(rows_to_add) >= 100:
-                            self.logger.info(
-                                f'Adding {len(rows_to_add)} rows to {self._store_name} worksheet'
-                            )
-                            self.add_rows_to_store_worksheet(rows_to_add)
-
-                            rows_to_add = []
-
-                    except Exception as e:
-                        self.logger.error(f'Error writing to Excel: {e}')
-                        self.logger.error(
-                            f'Adding product to reprocess queue: {product}'
-                        )
-                        reprocess_queue.extend(user_input)
-
-        if rows_to_add:
-            self.logger.info(
-                f'Adding {len(rows_to_add)} rows to {self._store_name} worksheet'
-            )
-            self.add_rows_to_store_worksheet(rows_to_add)
-
-        if reprocess_queue and not is_reprocess:
-            self.processing_queue = reprocess_queue
-            self.logger.info(f'Reprocessing {len(reprocess_queue)} items')
-            self.timer_cm.shift(20 * len(reprocess_queue))
+                if self.deduplicator:
+                    self.deduplicator.share_products(
+                        self.prompt_template, user_input, products, self._claimed_keys
+                    )
 
-            return await self.process_queue(is_reprocess=True)
-        elif reprocess_queue and is_reprocess:
-            self.logger.error(
-                f'Unable to process {len(reprocess_queue)} items after reprocessing. Please check logs.'
-            )
-            self.timer_cm.shift(5)
-            await asyncio.sleep(2)
+                self.batch_packer.record(len(user_input), succeeded=True)
+                await self._cache_items(user_input, products)
 
-        self.logger.info('Finished processing queue')
+                await self.add_rows_to_store_worksheet(rows)
 
-        # now, we need to clean the worksheet
-        self.clean_worksheet()
+        return failed_batches
 
 
 class CouponBaseStore(Store):
@@ -27,7 +27,6 @@ class BrowserStore(Store):
         raise NotImplementedError
 
     async def __aenter__(self):
-        self.reset_worksheet()
         self._browser: Browser = await launch(
             {
                 'headless': self.headless,
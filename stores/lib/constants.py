@@ -21,6 +21,21 @@ HEADERS = [
     'requires_store_card',
 ]
 
+# `extract_rows` properties that are named differently than their worksheet header
+OUTPUT_COLUMN_ALIASES = {
+    'quantity_percent_off': 'quantity_at_percent_off',
+    'required_purchase_amount': 'required_purchase_price',
+}
+
+DATE_HEADERS = [
+    'valid_from',
+    'valid_to',
+]
+
+BOOLEAN_HEADERS = [
+    'requires_store_card',
+]
+
 FILTER_KEYS = [
     'brand',
     'current_price',
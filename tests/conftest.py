@@ -0,0 +1,104 @@
+import configparser
+from pathlib import Path
+
+import pytest
+
+# The store modules import most of `utils` and `lib` - load them first, in the same order as the app,
+# so a test can import any single module without a circular import
+import stores  # noqa: F401
+import utils.call_ai_model_gemini
+import utils.deal_database
+import utils.dedup
+import utils.executors
+import utils.telemetry
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# the lazily created run-wide objects - every test that uses `config_ini` starts without them
+SINGLETONS = [
+    (utils.call_ai_model_gemini, '_extraction_cache'),
+    (utils.call_ai_model_gemini, '_rate_limiter'),
+    (utils.call_ai_model_gemini, '_extraction_client'),
+    (utils.deal_database, '_deal_database'),
+    (utils.deal_database, '_output_writer'),
+    (utils.deal_database, '_deal_history'),
+    (utils.dedup, '_deduplicator'),
+    (utils.executors, '_thread_pool'),
+    (utils.executors, '_process_pool'),
+    (utils.telemetry, '_telemetry'),
+]
+
+
+@pytest.fixture
+def config_ini(tmp_path, monkeypatch):
+    """
+    Runs the test in an empty directory with the repo's prompt templates, and returns a function that
+    writes its `config.ini` - the `[config]` section from keyword arguments, other sections as dicts.
+    """
+    (tmp_path / 'templates').symlink_to(ROOT / 'templates')
+    monkeypatch.chdir(tmp_path)
+    for module, name in SINGLETONS:
+        monkeypatch.setattr(module, name, None)
+
+    def write(sections: dict[str, dict] | None = None, **options) -> configparser.ConfigParser:
+        config = configparser.ConfigParser()
+        config['config'] = {key: str(value) for key, value in options.items()}
+        for section, values in (sections or {}).items():
+            config[section] = {key: str(value) for key, value in values.items()}
+
+        with open(tmp_path / 'config.ini', 'w') as f:
+            config.write(f)
+
+        return config
+
+    yield write
+
+    utils.executors.shutdown_executors()
+
+
+# extraction runs offline, answering every batch right away
+FAKE_BACKEND = {
+    'EXTRACTION_BACKEND': 'fake',
+    'FAKE_LATENCY_MEDIAN': 0.001,
+    'FAKE_LATENCY_SIGMA': 0,
+    'MODEL_NAME': 'gemini-fast',
+}
+
+
+class _Timer:
+    # stands in for the `async_timeout` context manager the stores push their deadline out with
+    def shift(self, delay: float) -> None:
+        pass
+
+
+@pytest.fixture
+def make_store(config_ini):
+    """
+    Returns a function that builds a `Store` named `name`, with the fake extraction backend. The first
+    call writes `config.ini` with the given `[config]` options, later calls only add their store's section.
+    A test runs its stores and closes their output writer inside one event loop.
+    """
+    from stores.lib.BaseStore import Store
+
+    names = []
+    settings = {}
+
+    def make(name: str = 'examplestore', **options) -> Store:
+        if not names:
+            settings.update(FAKE_BACKEND, **options)
+
+        names.append(name)
+        config_ini(sections={store_name: {} for store_name in names}, **settings)
+
+        store_class = type(
+            f'Store_{name}',
+            (Store,),
+            {
+                '__annotations__': {'_store_name': str, 'processing_queue': list[dict]},
+                '_store_name': name,
+                'processing_queue': [],
+            },
+        )
+        return store_class(cm=_Timer())
+
+    return make
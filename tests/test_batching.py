@@ -0,0 +1,60 @@
+from lib.GeminiBackend import AIStudioBackend, VertexBackend
+from utils.batching import BatchPacker
+from utils.call_ai_model_gemini import OUTPUT_TOOL_DEFS
+
+
+def item(description=''):
+    return {'brand_name': 'Kraft', 'product_name': 'Macaroni & Cheese', 'description': description}
+
+
+def test_packs_up_to_the_item_limit():
+    packer = BatchPacker(input_token_budget=100_000, output_token_budget=100_000, max_items=4)
+
+    assert [len(batch) for batch in packer.pack([item() for _ in range(10)])] == [4, 4, 2]
+
+
+def test_splits_batches_at_the_output_budget():
+    # every named product costs 200 output tokens, so 3 fit into 700
+    packer = BatchPacker(input_token_budget=100_000, output_token_budget=700, max_items=12)
+
+    assert [len(batch) for batch in packer.pack([item() for _ in range(7)])] == [3, 3, 1]
+
+
+def test_splits_batches_at_the_input_budget():
+    items = [item('x' * 400) for _ in range(4)]
+    packer = BatchPacker(
+        input_token_budget=2 * BatchPacker.estimate_input_tokens(items[0]),
+        output_token_budget=100_000,
+    )
+
+    assert [len(batch) for batch in packer.pack(items)] == [2, 2]
+
+
+def test_an_oversized_item_gets_a_batch_of_its_own():
+    packer = BatchPacker(input_token_budget=10, output_token_budget=10)
+
+    assert [len(batch) for batch in packer.pack([item(), item()])] == [1, 1]
+
+
+def test_failures_halve_the_item_limit_and_successes_grow_it_back():
+    packer = BatchPacker(max_items=8)
+
+    packer.record(8, succeeded=False)
+    assert packer.item_limit == 4
+
+    packer.record(1, succeeded=False)
+    assert packer.item_limit == 4
+
+    packer.record(4, succeeded=True)
+    packer.record(5, succeeded=True)
+    assert packer.item_limit == 6
+    assert packer.stats() == {'batches': 4, 'failed_batches': 2, 'item_limit': 6}
+
+
+def test_the_output_budget_is_sent_as_max_output_tokens():
+    model_options = {'temperature': 0.1, 'top_k': None, 'top_p': 0.2, 'max_output_tokens': 2048}
+
+    for backend in (AIStudioBackend, VertexBackend):
+        generation_config = backend(OUTPUT_TOOL_DEFS['named'], model_options).generation_config
+
+        assert generation_config.max_output_tokens == 2048
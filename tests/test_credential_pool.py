@@ -0,0 +1,122 @@
+import asyncio
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+import lib.CredentialPool
+from lib.CredentialPool import CredentialPool, PoolMember
+from tests.test_rate_limiter import FakeClock
+from utils.call_ai_model_gemini import _build_pool_member, get_extraction_client
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(lib.CredentialPool, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(lib.CredentialPool, 'asyncio', SimpleNamespace(sleep=clock.sleep))
+    return clock
+
+
+def schedule(pool, times, **kwargs):
+    async def run():
+        names = []
+        for _ in range(times):
+            member = await pool.acquire(**kwargs)
+            pool.release(member)
+            names.append(member.name)
+
+        return names
+
+    return asyncio.run(run())
+
+
+def test_an_idle_pool_is_walked_in_weighted_round_robin(clock):
+    pool = CredentialPool([PoolMember('a', weight=2), PoolMember('b')])
+
+    assert sorted(schedule(pool, 6)) == ['a'] * 4 + ['b'] * 2
+
+
+def test_a_busy_pool_picks_the_least_loaded_member(clock):
+    a, b = PoolMember('a'), PoolMember('b')
+    pool = CredentialPool([a, b])
+    a.in_flight = 3
+
+    assert schedule(pool, 2) == ['b', 'b']
+
+
+def test_excluded_members_are_only_used_when_nothing_else_is_available(clock):
+    a, b = PoolMember('a'), PoolMember('b')
+    pool = CredentialPool([a, b])
+
+    assert schedule(pool, 2, exclude=a) == ['b', 'b']
+
+    pool.eject(b)
+    assert schedule(pool, 1, exclude=a) == ['a']
+
+
+def test_ejections_back_off_exponentially_until_a_success(clock):
+    member = PoolMember('a')
+    pool = CredentialPool([member], base_ejection_seconds=5, max_ejection_seconds=12)
+
+    assert [pool.eject(member) for _ in range(3)] == [5, 10, 12]
+    assert pool.eject(member, seconds=30) == 30
+
+    pool.release(member, succeeded=True)
+    assert pool.eject(member) == 5
+
+
+def test_callers_wait_for_the_first_member_to_come_back(clock):
+    a, b = PoolMember('a'), PoolMember('b')
+    pool = CredentialPool([a, b])
+    pool.eject(a, seconds=20)
+    pool.eject(b, seconds=8)
+
+    assert schedule(pool, 1) == ['b']
+    assert pool.waited_seconds == pytest.approx(8)
+    assert pool.stats()['b'] == {'weight': 1.0, 'requests': 1, 'failures': 1, 'ejections': 1}
+
+
+def test_an_empty_pool_is_rejected():
+    with pytest.raises(Exception, match='at least one member'):
+        CredentialPool([])
+
+
+@pytest.mark.parametrize(
+    'member_config, name, credentials',
+    [
+        ({'api_key': 'secret-1234'}, 'key-...1234', {'api_key': 'secret-1234'}),
+        (
+            {'project_id': 'deals', 'region': 'us-east1', 'weight': 3},
+            'deals/us-east1',
+            {'project_id': 'deals', 'region': 'us-east1'},
+        ),
+        ({'name': 'backup', 'project_id': 'deals'}, 'backup', {'project_id': 'deals'}),
+    ],
+)
+def test_pool_members_are_built_from_config(member_config, name, credentials):
+    member = _build_pool_member(member_config)
+
+    assert (member.name, member.credentials) == (name, credentials)
+    assert member.weight == member_config.get('weight', 1)
+
+
+def test_members_without_credentials_are_rejected():
+    with pytest.raises(Exception, match='needs an "api_key" or a "project_id"'):
+        _build_pool_member({'name': 'backup'})
+
+
+def test_a_pool_cant_mix_api_keys_and_projects(config_ini):
+    config_ini(GEMINI_POOL=orjson.dumps([{'api_key': 'secret-1234'}, {'project_id': 'deals'}]).decode())
+
+    with pytest.raises(Exception, match='either all use API keys or all use project IDs'):
+        get_extraction_client()
+
+
+def test_the_fake_backend_has_one_member_per_pool_slot(config_ini):
+    config_ini(EXTRACTION_BACKEND='fake', FAKE_POOL_SIZE=3)
+
+    client = get_extraction_client()
+
+    assert [member.name for member in client.pool.members] == ['fake-1', 'fake-2', 'fake-3']
+    assert list(client.tiers[0].models) == ['fake-1', 'fake-2', 'fake-3']
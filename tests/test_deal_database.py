@@ -0,0 +1,105 @@
+import sqlite3
+from datetime import date
+
+import numpy as np
+import pytest
+
+from lib.DealDatabase import DealDatabase
+
+HEADERS = ['product_name', 'sale_price', 'valid_to', 'requires_store_card']
+
+
+def deal_database(path, week='2026-W42', headers=HEADERS):
+    return DealDatabase(
+        path,
+        headers=headers,
+        date_columns=['valid_to'],
+        boolean_columns=['requires_store_card'],
+        week=week,
+    )
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = deal_database(tmp_path / 'deals.sqlite')
+    yield database
+    database.close()
+
+
+def test_rows_come_back_typed_and_in_order(database):
+    database.add_rows(
+        'publix',
+        [
+            {'product_name': 'Mac', 'sale_price': np.float64(1.25), 'valid_to': date(2026, 10, 20), 'requires_store_card': True},
+            {'product_name': 'Cola', 'valid_to': 'N/A', 'requires_store_card': False},
+        ],
+    )
+
+    assert database.get_rows('publix') == [
+        {'product_name': 'Mac', 'sale_price': 1.25, 'valid_to': date(2026, 10, 20), 'requires_store_card': True},
+        {'product_name': 'Cola', 'sale_price': 'N/A', 'valid_to': 'N/A', 'requires_store_card': False},
+    ]
+    assert database.get_rows('kroger') == []
+
+
+def test_resetting_a_sheet_only_clears_its_current_week(tmp_path, database):
+    last_week = deal_database(tmp_path / 'deals.sqlite', week='2026-W41')
+    last_week.add_rows('publix', [{'product_name': 'Soup'}])
+    database.add_rows('publix', [{'product_name': 'Mac'}])
+    database.add_rows('kroger', [{'product_name': 'Cola'}])
+
+    database.reset_sheet('publix')
+
+    assert database.get_rows('publix') == []
+    assert [row['product_name'] for row in database.get_rows('kroger')] == ['Cola']
+    assert [row['product_name'] for row in last_week.get_rows('publix')] == ['Soup']
+    last_week.close()
+
+
+def test_sheet_names_are_listed_in_the_order_they_were_written(database):
+    for sheet in ['publix', 'kroger', 'publix', 'aldi']:
+        database.add_rows(sheet, [{'product_name': 'Mac'}])
+
+    assert database.sheet_names() == ['publix', 'kroger', 'aldi']
+
+
+def test_uncommitted_rows_can_be_rolled_back(database):
+    database.add_rows('publix', [{'product_name': 'Mac'}])
+    database.add_rows('publix', [{'product_name': 'Cola'}], commit=False)
+    database.rollback()
+
+    assert [row['product_name'] for row in database.get_rows('publix')] == ['Mac']
+
+
+def test_matchups_are_replaced_per_sheet(database):
+    database.set_matchups('publix', ['product_name', 'valid_to'], [['Mac', '2026-10-20']])
+    database.set_matchups('publix', ['product_name', 'valid_to'], [['Cola', '2026-10-21'], ['Soup', 'N/A']])
+
+    assert database.get_matchup_columns('publix') == ['product_name', 'valid_to']
+    assert list(database.iter_matchups('publix')) == [['Cola', date(2026, 10, 21)], ['Soup', 'N/A']]
+
+    database.set_matchups('publix', ['product_name'], [])
+    assert database.get_matchup_columns('publix') == []
+    assert list(database.iter_matchups('publix')) == []
+
+
+def test_databases_from_before_a_column_was_added_are_migrated(tmp_path):
+    old = deal_database(tmp_path / 'deals.sqlite', headers=HEADERS[:2])
+    old.add_rows('publix', [{'product_name': 'Mac', 'sale_price': 1.25}])
+    old.close()
+
+    database = deal_database(tmp_path / 'deals.sqlite')
+    assert database.get_rows('publix') == [
+        {'product_name': 'Mac', 'sale_price': 1.25, 'valid_to': None, 'requires_store_card': None}
+    ]
+    database.close()
+
+
+def test_connections_are_reopened_after_close(database):
+    connection = database.connection
+    database.close()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute('SELECT 1')
+
+    assert database.get_rows('publix') == []
@@ -0,0 +1,84 @@
+import pytest
+
+from lib.DealHistory import DealHistory, canonical_product_key
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = DealHistory(tmp_path / 'history.sqlite')
+    yield history
+    history.close()
+
+
+def row(brand='Coca-Cola', name='Classic 12 oz', price=6.99, sale_price=None, deal_type='SALE_PRICE'):
+    return {
+        'brand_name': brand,
+        'product_name': name,
+        'price': price,
+        'sale_price': sale_price,
+        'deal_type': deal_type,
+    }
+
+
+def test_canonical_product_key_ignores_word_order_and_case():
+    assert canonical_product_key('Coca-Cola', 'Classic 12 oz') == canonical_product_key(
+        'Classic', 'Coca Cola 12 OZ'
+    )
+    assert canonical_product_key('N/A', None) == ''
+
+
+def test_unchanged_snapshots_are_skipped_without_holding_the_write_lock(tmp_path):
+    DealHistory(tmp_path / 'history.sqlite').add_snapshot('Publix', '2024-W10', 'hash-1', [row()])
+
+    # a new instance has to look the store's id up again
+    history = DealHistory(tmp_path / 'history.sqlite')
+    assert history.add_snapshot('Publix', '2024-W10', 'hash-1', [row(), row()]) is False
+
+    assert not history.connection.in_transaction
+    assert history.stats()['observations'] == 1
+    history.close()
+
+
+def test_a_changed_snapshot_replaces_the_week(history):
+    history.add_snapshot('Publix', '2024-W10', 'hash-1', [row(sale_price=4.99)])
+    history.add_snapshot('Publix', '2024-W10', 'hash-2', [row(sale_price=3.99), row(name='Zero')])
+
+    assert [entry['sale_price'] for entry in history.price_history('coca cola classic 12 oz')] == [3.99]
+    assert history.stats()['snapshots'] == 1
+    assert history.stats()['observations'] == 2
+
+
+def test_price_queries_span_stores_and_weeks(history):
+    history.add_snapshot('Publix', '2024-W10', 'a', [row(sale_price=4.99)])
+    history.add_snapshot('Kroger', '2024-W10', 'b', [row(brand='Coca Cola', sale_price=3.49)])
+    history.add_snapshot('Publix', '2024-W11', 'c', [row(price=5.99, deal_type='OTHER')])
+    history.add_snapshot('Publix', '2024-W12', 'd', [row(name='Zero')])
+
+    product = 'Classic Coca-Cola 12 oz'
+    assert [(entry['week'], entry['store']) for entry in history.price_history(product)] == [
+        ('2024-W10', 'Kroger'),
+        ('2024-W10', 'Publix'),
+        ('2024-W11', 'Publix'),
+    ]
+    assert history.lowest_price(product) == {'price': 3.49, 'week': '2024-W10', 'store': 'Kroger'}
+
+    frequency = history.deal_frequency(product, weeks=None)
+    assert frequency['weeks_recorded'] == 3
+    assert frequency['weeks_on_sale'] == 2
+    assert frequency['by_store'] == {'Kroger': 0.333, 'Publix': 0.667}
+
+
+def test_a_failed_snapshot_is_rolled_back(history):
+    history.add_snapshot('Publix', '2024-W10', 'hash-1', [row()])
+
+    def rows():
+        yield row(name='Zero')
+        raise ValueError('bad row')
+
+    with pytest.raises(ValueError):
+        history.add_snapshot('Publix', '2024-W10', 'hash-2', rows())
+
+    assert not history.connection.in_transaction
+    assert history.stats()['observations'] == 1
+    assert history.find_products('zero') == []
+    assert history.add_snapshot('Publix', '2024-W10', 'hash-1', [row()]) is False
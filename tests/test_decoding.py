@@ -0,0 +1,97 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from stores.lib.BaseStore import Store
+from stores.lib.constants import DATE_HEADERS, HEADERS, OUTPUT_COLUMN_ALIASES
+from utils.call_ai_model_gemini import PRODUCT_SCHEMA
+from utils.decoding import RowDecoder, function_call_args
+
+
+@pytest.fixture
+def decoder():
+    return RowDecoder(
+        PRODUCT_SCHEMA['properties'],
+        HEADERS,
+        aliases=OUTPUT_COLUMN_ALIASES,
+        date_columns=DATE_HEADERS,
+    )
+
+
+@pytest.mark.parametrize(
+    'value, expected',
+    [
+        ('3.99', 3.99),
+        ('$3.99', 3.99),
+        ('.99', 0.99),
+        ('$.99', 0.99),
+        ('-.5', -0.5),
+        ('1,299.00', 1299.0),
+        ('2 for $5', 2.0),
+        (4, 4.0),
+        ('N/A', 'N/A'),
+        ('', 'N/A'),
+        (None, 'N/A'),
+    ],
+)
+def test_coerces_prices(decoder, value, expected):
+    assert decoder.decode_row({'sale_price': value})['sale_price'] == expected
+
+
+def test_coerces_ints_booleans_dates_and_enums(decoder):
+    row = decoder.decode_row(
+        {
+            'required_purchase_quantity': '2.0',
+            'requires_store_card': 'yes',
+            'valid_from': '2024-03-06T00:00:00',
+            'valid_to': 'March 12, 2024',
+            'deal_type': 'sale price',
+        }
+    )
+
+    assert row['required_purchase_quantity'] == 2
+    assert row['requires_store_card'] is True
+    assert row['valid_from'] == date(2024, 3, 6)
+    assert row['valid_to'] == date(2024, 3, 12)
+    assert row['deal_type'] == 'SALE_PRICE'
+
+
+def test_unknown_deal_types_decode_to_other(decoder):
+    assert decoder.decode_row({'deal_type': 'MANUFACTURER_COUPON'})['deal_type'] == 'OTHER'
+
+
+def test_maps_aliases_onto_headers(decoder):
+    row = decoder.decode_row({'quantity_percent_off': 3, 'required_purchase_amount': '$10'})
+
+    assert row['quantity_at_percent_off'] == 3
+    assert row['required_purchase_price'] == 10.0
+
+
+def test_splits_multi_brand_products(decoder):
+    rows = decoder.decode([{'brand_name': 'Coca-Cola | Pepsi |', 'product_name': 'Soda'}])
+
+    assert [row['brand_name'] for row in rows] == ['Coca-Cola', 'Pepsi']
+    assert all(row['product_name'] == 'Soda' for row in rows)
+
+
+def test_function_call_args_without_to_dict():
+    function_call = SimpleNamespace(args={'rows': [{'brand_name': 'Kraft'}]})
+
+    assert function_call_args(function_call) == {'rows': [{'brand_name': 'Kraft'}]}
+
+
+@pytest.mark.parametrize(
+    'product, empty',
+    [
+        ({}, True),
+        # a placeholder deal type echoed back from the input isn't data
+        ({'deal_type': 'MANUFACTURER_COUPON', 'requires_store_card': 'false'}, True),
+        ({'deal_type': 'SALE_PRICE'}, False),
+        ({'deal_type': 'COUPON', 'brand_name': 'Kraft'}, False),
+    ],
+)
+def test_placeholder_rows_are_empty(decoder, product, empty):
+    store = SimpleNamespace(headers=HEADERS)
+
+    assert Store._is_empty_product(store, decoder.decode_row(product)) is empty
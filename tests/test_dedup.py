@@ -0,0 +1,152 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from stores.lib.BaseStore import Store
+from utils.call_ai_model_gemini import get_extraction_client
+from utils.dedup import ExtractionDeduplicator
+
+TEMPLATE = 'get_individual_products.jinja'
+
+MAC = {'brand_name': 'Kraft', 'product_name': 'Macaroni & Cheese', 'description': 'Select varieties'}
+
+
+def dated(item, valid_from, valid_to):
+    return {**item, 'valid_from': valid_from, 'valid_to': valid_to}
+
+
+def claim(deduplicator, items):
+    async def run():
+        return deduplicator.claim(TEMPLATE, items)
+
+    return asyncio.run(run())
+
+
+def test_keys_ignore_the_store_dates():
+    assert ExtractionDeduplicator.make_key(TEMPLATE, dated(MAC, '2026-10-14', '2026-10-20')) == (
+        ExtractionDeduplicator.make_key(TEMPLATE, dated(MAC, '2026-10-15', '2026-10-21'))
+    )
+    assert ExtractionDeduplicator.make_key(TEMPLATE, MAC) != ExtractionDeduplicator.make_key(
+        TEMPLATE, {**MAC, 'product_name': 'Shells & Cheese'}
+    )
+
+
+def test_the_first_store_claims_and_later_stores_wait_for_its_products():
+    async def run():
+        deduplicator = ExtractionDeduplicator()
+        owned, waiting, owned_keys = deduplicator.claim(TEMPLATE, [MAC])
+        _, shared, _ = deduplicator.claim(TEMPLATE, [MAC])
+
+        deduplicator.share_products(TEMPLATE, owned, [{'brand_name': 'Kraft', 'source_item': 0}], owned_keys)
+        return owned, waiting, owned_keys, [await future for _, future in shared], deduplicator.stats()
+
+    owned, waiting, owned_keys, shared_products, stats = asyncio.run(run())
+
+    assert (owned, waiting, owned_keys) == ([MAC], [], set())
+    assert shared_products == [[{'brand_name': 'Kraft', 'source_item': 0}]]
+    assert stats == {'claimed': 1, 'shared': 1, 'fallbacks': 0}
+
+
+@pytest.mark.parametrize('source_item', [None, 'first', 1])
+def test_unattributable_batches_fail_their_claims(source_item):
+    async def run():
+        deduplicator = ExtractionDeduplicator()
+        owned, _, owned_keys = deduplicator.claim(TEMPLATE, [MAC])
+        _, shared, _ = deduplicator.claim(TEMPLATE, [MAC])
+
+        deduplicator.share_products(TEMPLATE, owned, [{'source_item': source_item}], owned_keys)
+        return [await future for _, future in shared], deduplicator.claim(TEMPLATE, [MAC])[0]
+
+    shared_products, reclaimed = asyncio.run(run())
+
+    assert shared_products == [None]
+    assert reclaimed == [MAC]
+
+
+def test_failed_items_are_claimed_again_by_the_next_store():
+    async def run():
+        deduplicator = ExtractionDeduplicator()
+        _, _, owned_keys = deduplicator.claim(TEMPLATE, [MAC])
+        _, shared, _ = deduplicator.claim(TEMPLATE, [MAC])
+        for key in owned_keys:
+            deduplicator.fail(key)
+
+        return [await future for _, future in shared], deduplicator.claim(TEMPLATE, [MAC])
+
+    shared_products, (owned, waiting, _) = asyncio.run(run())
+
+    assert shared_products == [None]
+    assert (owned, waiting) == ([MAC], [])
+
+
+def test_shared_products_keep_each_stores_dates():
+    products = [{'product_name': 'Macaroni & Cheese', 'valid_from': '2026-10-14', 'valid_to': '2026-10-20'}]
+    item = {**MAC, 'valid_from': '2026-10-15', 'expiration_date': '2026-10-21', 'valid_to': 'N/A'}
+
+    assert ExtractionDeduplicator.with_store_dates(item, products) == [
+        {'product_name': 'Macaroni & Cheese', 'valid_from': '2026-10-15', 'valid_to': '2026-10-21'}
+    ]
+    assert ExtractionDeduplicator.with_store_dates('Macaroni & Cheese', products) == products
+
+
+def process(*stores):
+    async def process_store(store):
+        async with store:
+            await store.process_queue()
+
+    async def run():
+        await asyncio.gather(*(process_store(store) for store in stores))
+        await stores[0].output_writer.close()
+
+    asyncio.run(run())
+
+
+def rows(store):
+    return [
+        (row['product_name'], row['valid_from'], row['valid_to'])
+        for row in store.output_writer.deal_database.get_rows(store._store_name)
+    ]
+
+
+def test_stores_sharing_a_circular_extract_it_once(make_store):
+    first = make_store('first', FAST_PATH_ENABLED=False)
+    second = make_store('second')
+    first.processing_queue = [dated(MAC, '2026-10-14', '2026-10-20')]
+    second.processing_queue = [dated(MAC, '2026-10-15', '2026-10-21')]
+
+    process(first, second)
+
+    assert rows(first) == [('Macaroni & Cheese', date(2026, 10, 14), date(2026, 10, 20))]
+    assert rows(second) == [('Macaroni & Cheese', date(2026, 10, 15), date(2026, 10, 21))]
+    assert first.deduplicator.stats() == {'claimed': 1, 'shared': 1, 'fallbacks': 0}
+    assert sum(model.calls for model in get_extraction_client().tiers[0].models.values()) == 1
+
+
+def test_items_the_claiming_store_cant_extract_fall_back_to_the_waiting_store(make_store, monkeypatch):
+    first = make_store('first', FAST_PATH_ENABLED=False)
+    second = make_store('second')
+    first.processing_queue = [dated(MAC, '2026-10-14', '2026-10-20')]
+    second.processing_queue = [dated(MAC, '2026-10-15', '2026-10-21')]
+
+    claimer = []
+    extract_batches = Store._extract_batches
+
+    async def claimer_fails(self, batches):
+        claimer[:] = claimer or [self._store_name]
+        if self._store_name in claimer:
+            # long enough for the other store to queue the item and wait on it
+            await asyncio.sleep(0.05)
+            return batches
+
+        return await extract_batches(self, batches)
+
+    monkeypatch.setattr(Store, '_extract_batches', claimer_fails)
+
+    process(first, second)
+
+    (failed,) = [store for store in (first, second) if store._store_name in claimer]
+    (fallback,) = [store for store in (first, second) if store is not failed]
+    assert rows(failed) == []
+    assert [name for name, _, _ in rows(fallback)] == ['Macaroni & Cheese']
+    assert first.deduplicator.stats()['fallbacks'] == 1
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import threading
+
+import pandas as pd
+
+from lib.DealDatabase import DealDatabase
+from utils.executors import (
+    get_process_pool,
+    get_thread_pool,
+    run_in_process,
+    run_in_thread,
+    shutdown_executors,
+)
+from utils.matching import match_multiple_columns
+
+
+def test_blocking_work_runs_on_the_thread_pool(config_ini):
+    config_ini(THREAD_POOL_WORKERS=2)
+
+    async def run():
+        return await run_in_thread(lambda name: (name, threading.current_thread().name), name='Mac')
+
+    name, thread_name = asyncio.run(run())
+
+    assert name == 'Mac'
+    assert thread_name.startswith('coupcoup-io')
+    assert get_thread_pool()._max_workers == 2
+
+
+def test_cpu_bound_work_falls_back_to_the_thread_pool_without_processes(config_ini):
+    config_ini(PROCESS_POOL_WORKERS=0)
+
+    async def run():
+        return await run_in_process(threading.current_thread)
+
+    assert get_process_pool() is None
+    assert asyncio.run(run()).name.startswith('coupcoup-io')
+
+
+def test_fuzzy_matching_runs_in_the_process_pool(config_ini):
+    config_ini(PROCESS_POOL_WORKERS=1)
+    columns = ['brand_name', 'product_name']
+    coupons = pd.DataFrame([{'brand_name': 'Kraft', 'product_name': 'Macaroni & Cheese'}])
+    sales = pd.DataFrame([{'brand_name': 'Kraft', 'product_name': 'Macaroni and Cheese'}])
+
+    async def run():
+        pid = await run_in_process(os.getpid)
+        matches = await run_in_process(match_multiple_columns, coupons, sales, columns, columns, threshold=80)
+        return pid, matches
+
+    pid, matches = asyncio.run(run())
+
+    assert pid != os.getpid()
+    assert set(matches['matched_column']) == {'brand_name', 'product_name'}
+
+
+def test_shutdown_lets_the_pools_be_created_again(config_ini):
+    config_ini(PROCESS_POOL_WORKERS=0)
+    thread_pool = get_thread_pool()
+
+    shutdown_executors()
+
+    assert get_thread_pool() is not thread_pool
+
+
+def test_every_thread_gets_its_own_database_connection(tmp_path):
+    database = DealDatabase(tmp_path / 'deals.sqlite', headers=['product_name'])
+    database.add_rows('publix', [{'product_name': 'Mac'}], commit=False)
+
+    def read_from_another_thread():
+        return database.connection, database.get_rows('publix')
+
+    async def run():
+        return await asyncio.get_running_loop().run_in_executor(None, read_from_another_thread)
+
+    connection, rows = asyncio.run(run())
+
+    # the other thread only sees what was committed
+    assert connection is not database.connection
+    assert rows == []
+    assert database.get_rows('publix') == [{'product_name': 'Mac'}]
+    database.close()
@@ -0,0 +1,127 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from lib.ExtractionCache import ExtractionCache
+from stores.lib.BaseStore import Store
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ExtractionCache(tmp_path / 'extraction.sqlite', max_entries=2)
+    yield cache
+    cache.close()
+
+
+def test_hits_and_misses(cache):
+    cache.set('a', [{'brand_name': 'Kraft'}])
+
+    assert cache.get('a') == [{'brand_name': 'Kraft'}]
+    assert cache.get('b') is None
+    assert cache.get_many(['a', 'b', 'a']) == {'a': [{'brand_name': 'Kraft'}]}
+    assert cache.stats() == {
+        'hits': 3,
+        'misses': 2,
+        'hit_rate': 0.6,
+        'writes': 1,
+        'evictions': 0,
+        'bypass': False,
+    }
+
+
+def test_expired_entries_miss_and_are_evicted(tmp_path):
+    cache = ExtractionCache(tmp_path / 'extraction.sqlite', ttl_seconds=0.05)
+    cache.set('a', [])
+    time.sleep(0.1)
+
+    assert cache.get('a') is None
+    assert cache.evict() == 1
+    cache.close()
+
+
+def test_evicts_the_least_recently_used_entries(cache):
+    cache.set_many({'a': [{'row': 1}], 'b': [{'row': 2}]})
+    time.sleep(0.01)
+    cache.get('a')
+    cache.set('c', [{'row': 3}])
+
+    assert cache.evict() == 1
+    assert set(cache.get_many(['a', 'b', 'c'])) == {'a', 'c'}
+
+
+def test_lookups_dont_write_until_a_batch_of_touches_is_pending(cache):
+    cache.set('a', [])
+    changes = cache.connection.total_changes
+
+    cache.get('a')
+    assert cache.connection.total_changes == changes
+
+    cache.TOUCH_BATCH_SIZE = 1
+    cache.get('a')
+    assert cache.connection.total_changes == changes + 1
+
+
+def test_touches_are_saved_on_close(tmp_path):
+    cache = ExtractionCache(tmp_path / 'extraction.sqlite')
+    cache.set('a', [])
+    time.sleep(0.01)
+    cache.get('a')
+    cache.close()
+
+    cache = ExtractionCache(tmp_path / 'extraction.sqlite')
+    created_at, accessed_at = cache.connection.execute(
+        'SELECT created_at, accessed_at FROM extractions'
+    ).fetchone()
+    assert accessed_at > created_at
+    cache.close()
+
+
+def test_can_be_used_from_the_thread_pool(cache):
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda i: cache.set(f'key-{i}', [{'row': i}]), range(20)))
+        found = executor.submit(cache.get_many, [f'key-{i}' for i in range(20)]).result()
+
+    assert len(found) == 20
+
+
+def test_bypass_never_hits_or_writes(tmp_path):
+    cache = ExtractionCache(tmp_path / 'extraction.sqlite', bypass=True)
+    cache.set('a', [])
+
+    assert cache.get_many(['a', 'b']) == {}
+    assert cache.stats()['misses'] == 2
+    assert cache.stats()['writes'] == 0
+    assert not (tmp_path / 'extraction.sqlite').exists()
+
+
+def test_keys_ignore_key_order_and_whitespace():
+    key = ExtractionCache.make_key(
+        'prompt', [{'brand_name': 'Kraft', 'product_name': 'Mac  &  Cheese'}], 'gemini', temperature=0.1
+    )
+
+    assert key == ExtractionCache.make_key(
+        'prompt', [{'product_name': 'Mac & Cheese ', 'brand_name': 'Kraft'}], 'gemini', temperature=0.1
+    )
+    assert key != ExtractionCache.make_key(
+        'prompt', [{'brand_name': 'Kraft', 'product_name': 'Mac & Cheese'}], 'gemini', temperature=0.2
+    )
+
+
+def test_batches_are_split_into_entries_per_item():
+    products = [
+        {'product_name': 'Cola', 'source_item': 1},
+        {'product_name': 'Mac', 'source_item': '0'},
+        {'product_name': 'Zero', 'source_item': 1.0},
+    ]
+
+    assert Store._products_by_item(['mac', 'cola', 'chips'], products) == [
+        [{'product_name': 'Mac', 'source_item': 0}],
+        [{'product_name': 'Cola', 'source_item': 0}, {'product_name': 'Zero', 'source_item': 0}],
+        [],
+    ]
+
+
+@pytest.mark.parametrize('source_item', [None, 'first', 3, -1])
+def test_unattributed_batches_are_not_cached(source_item):
+    assert Store._products_by_item(['mac', 'cola'], [{'source_item': source_item}]) is None
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from loguru import logger
+
+import utils.call_ai_model_gemini
+from tests.conftest import FAKE_BACKEND
+from utils.call_ai_model_gemini import (
+    extract_products_using_gemini,
+    get_extraction_cache_key,
+    get_extraction_client,
+)
+
+
+ITEMS = [
+    {'brand_name': 'Kraft', 'product_name': 'Macaroni & Cheese', 'price_text': '1.25'},
+    {'brand_name': 'Coca-Cola', 'product_name': 'Classic', 'price_text': '6.99'},
+]
+
+
+def extract(items=ITEMS):
+    return asyncio.run(
+        extract_products_using_gemini(
+            {
+                'prompt_jinja_template_path': 'get_individual_products.jinja',
+                'user_input': items,
+                'logger': logger,
+                'store': 'publix',
+            }
+        )
+    )
+
+
+def test_the_client_and_its_prompts_are_built_once(config_ini, monkeypatch):
+    config_ini(**FAKE_BACKEND)
+    renders = []
+    render = utils.call_ai_model_gemini.get_template_with_args
+
+    async def counting_render(*args, **kwargs):
+        renders.append(args)
+        return await render(*args, **kwargs)
+
+    monkeypatch.setattr(utils.call_ai_model_gemini, 'get_template_with_args', counting_render)
+
+    client = get_extraction_client()
+    models = client.tiers[0].models
+    extract()
+    extract()
+
+    assert get_extraction_client() is client
+    assert client.tiers[0].models is models
+    assert renders == [('get_individual_products.jinja',)]
+
+
+def test_cache_keys_follow_the_settings(config_ini):
+    config_ini(**FAKE_BACKEND)
+    key = asyncio.run(get_extraction_cache_key('get_individual_products.jinja', ITEMS))
+
+    assert key == asyncio.run(get_extraction_cache_key('get_individual_products.jinja', ITEMS))
+
+    config_ini(**FAKE_BACKEND, MODEL_TEMP=0.5)
+    utils.call_ai_model_gemini._extraction_client = None
+    assert key != asyncio.run(get_extraction_cache_key('get_individual_products.jinja', ITEMS))
+
+
+def test_extracts_one_product_per_item(config_ini):
+    config_ini(**FAKE_BACKEND)
+
+    products, user_input = extract()
+
+    assert user_input == ITEMS
+    assert [(product['brand_name'], product['source_item']) for product in products] == [
+        ('Kraft', 0),
+        ('Coca-Cola', 1),
+    ]
+
+
+@pytest.mark.parametrize(
+    'options, error',
+    [
+        ({**FAKE_BACKEND, 'OUTPUT_SCHEMA': 'xml'}, 'OUTPUT_SCHEMA'),
+        ({**FAKE_BACKEND, 'PROMPT_INPUT_ENCODING': 'yaml'}, 'PROMPT_INPUT_ENCODING'),
+        ({'EXTRACTION_BACKEND': 'local'}, 'EXTRACTION_BACKEND'),
+        ({}, 'No Google API key or project ID'),
+    ],
+)
+def test_invalid_settings_fail_when_the_client_is_built(config_ini, options, error):
+    config_ini(**options)
+
+    with pytest.raises(Exception, match=error):
+        get_extraction_client()
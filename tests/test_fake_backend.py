@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from lib.CredentialPool import PoolMember
+from lib.FakeGeminiModel import FakeGeminiModel, FakeServerError
+from lib.GeminiBackend import OTHER_ERROR, RATE_LIMIT, SERVER_ERROR, FakeBackend, classify_error
+from utils.call_ai_model_gemini import OUTPUT_COLUMNS, handle_gemini_response
+from utils.prompt_encoding import PROMPT_INPUT_ENCODINGS, encode_user_input
+
+ITEMS = [
+    {'brand_name': 'Kraft', 'product_name': 'Macaroni & Cheese', 'price_text': '$1.25'},
+    {'product_name': 'Coca-Cola Classic', 'size': '12 pk'},
+]
+
+
+def generate(model, items=ITEMS):
+    prompt_text = f'Extract the products.\n{encode_user_input(items)}'
+    return asyncio.run(FakeBackend(OUTPUT_COLUMNS).generate(model, prompt_text))
+
+
+def fake_model(**options):
+    return FakeGeminiModel('gemini-fast', OUTPUT_COLUMNS, latency_median=0.001, latency_sigma=0, **options)
+
+
+@pytest.mark.parametrize('encoding', PROMPT_INPUT_ENCODINGS)
+def test_items_are_read_back_from_every_prompt_encoding(encoding):
+    assert FakeGeminiModel.parse_items(encode_user_input(ITEMS, encoding)) == ITEMS
+
+
+def test_answers_one_product_per_item():
+    products = handle_gemini_response(generate(fake_model()))
+
+    assert [
+        (product['brand_name'], product['product_name'], product['sale_price'], product['source_item'])
+        for product in products
+    ] == [('Kraft', 'Macaroni & Cheese', 1.25, 0), ('Coca-Cola', 'Coca-Cola Classic', None, 1)]
+    assert list(products[0]) == OUTPUT_COLUMNS
+
+
+@pytest.mark.parametrize(
+    'failure, error',
+    [
+        ('rate_limit_rate', 'Resource has been exhausted'),
+        ('server_error_rate', 'service is currently unavailable'),
+        ('malformed_rate', 'Invalid response from Gemini'),
+        ('truncated_rate', 'truncated at the output token limit'),
+    ],
+)
+def test_failing_calls_look_like_the_real_api(failure, error):
+    with pytest.raises(Exception, match=error):
+        handle_gemini_response(generate(fake_model(**{failure: 1})))
+
+
+def test_empty_answers_have_no_products():
+    assert handle_gemini_response(generate(fake_model(empty_rate=1))) == []
+
+
+def test_failures_are_reproducible_with_a_seed():
+    def outcomes(seed):
+        model = fake_model(empty_rate=0.5, seed=seed)
+        return [bool(handle_gemini_response(generate(model))) for _ in range(20)]
+
+    assert outcomes('a') == outcomes('a')
+    assert len(set(outcomes('a'))) == 2
+
+
+def test_every_model_of_the_backend_gets_its_own_stream():
+    backend = FakeBackend(OUTPUT_COLUMNS, seed='1')
+
+    assert backend.build_model('gemini-fast', PoolMember('fake-1')).model_name == 'gemini-fast'
+    assert (
+        backend.build_model('gemini-fast', PoolMember('fake-1'))._random.random()
+        != backend.build_model('gemini-fast', PoolMember('fake-2'))._random.random()
+    )
+
+
+@pytest.mark.parametrize(
+    'error, kind',
+    [
+        (Exception('429 Resource has been exhausted (fake). Please retry in 2s.'), RATE_LIMIT),
+        (FakeServerError('503 The service is currently unavailable'), SERVER_ERROR),
+        (FakeServerError('Bad request', code=400), OTHER_ERROR),
+        (Exception('504 Deadline Exceeded'), SERVER_ERROR),
+        (Exception('Service Unavailable'), SERVER_ERROR),
+        (ValueError('Invalid response from Gemini'), OTHER_ERROR),
+    ],
+)
+def test_errors_are_classified_for_the_credential_pool(error, kind):
+    assert classify_error(error) == kind
@@ -0,0 +1,98 @@
+import pytest
+
+from utils.fast_path import FastPathExtractor
+
+
+def flipp_item(**fields):
+    return {'brand_name': 'Kraft', 'product_name': 'Macaroni & Cheese', **fields}
+
+
+@pytest.mark.parametrize(
+    'item, expected',
+    [
+        (
+            flipp_item(sale_story='2/$5'),
+            {'deal_type': 'SALE_PRICE', 'required_purchase_quantity': 2, 'sale_price': 5.0},
+        ),
+        (
+            flipp_item(sale_story='BOGO'),
+            {'deal_type': 'BUY_X_GET_Y_FREE', 'required_purchase_quantity': 1, 'quantity_get_free': 1},
+        ),
+        (
+            flipp_item(sale_story='Buy 2 Get 1 Free'),
+            {'deal_type': 'BUY_X_GET_Y_FREE', 'required_purchase_quantity': 2, 'quantity_get_free': 1},
+        ),
+        (
+            flipp_item(sale_story='$1.00 off 2'),
+            {'deal_type': 'AMOUNT_OFF', 'sale_amount_off': 1.0, 'required_purchase_quantity': 2},
+        ),
+        (
+            flipp_item(sale_story='50¢ off'),
+            {'deal_type': 'AMOUNT_OFF', 'sale_amount_off': 0.5},
+        ),
+        (
+            flipp_item(sale_story='Save 30%'),
+            {'deal_type': 'PERCENT_OFF', 'sale_percent_off': 30},
+        ),
+        (
+            flipp_item(price_text='3.99', original_price='4.49'),
+            {'deal_type': 'SALE_PRICE', 'sale_price': 3.99, 'price': 4.49},
+        ),
+        (
+            # the shelf price is kept, and the savings are taken off it
+            flipp_item(sale_story='SAVE $2.00', price_text='3.99'),
+            {'deal_type': 'AMOUNT_OFF', 'sale_amount_off': 2.0, 'price': 3.99, 'sale_price': 1.99},
+        ),
+        (
+            {'brand_name': 'Tide', 'product_name': 'Pods', 'sale_amount_off': '3', 'raw_text': '$3 off'},
+            {'deal_type': 'AMOUNT_OFF', 'sale_amount_off': 3.0},
+        ),
+    ],
+)
+def test_extracts_simple_deals(item, expected):
+    rows = FastPathExtractor().extract(item)
+
+    assert rows is not None and len(rows) == 1
+    assert {key: rows[0][key] for key in expected} == expected
+    assert rows[0]['brand_name'] == item['brand_name']
+    assert rows[0]['product_name'] == item['product_name']
+
+
+@pytest.mark.parametrize(
+    'item',
+    [
+        # no currency - as often points or a percentage as dollars
+        flipp_item(sale_story='Save 30'),
+        flipp_item(sale_story='Save 5'),
+        flipp_item(sale_story='5 off'),
+        # the savings can't simply be taken off the shelf price
+        flipp_item(sale_story='$1.00 off 2', price_text='3.99'),
+        flipp_item(sale_story='Save $5.00', price_text='3.99'),
+        # wording that changes the deal
+        flipp_item(sale_story='Buy 2, get 1 free with purchase'),
+        flipp_item(sale_story='$1.00 off select varieties'),
+        flipp_item(sale_story='Mix & Match 2/$5'),
+        # no brand or product
+        {'product_name': 'Macaroni & Cheese', 'sale_story': '2/$5'},
+        {'brand_name': 'N/A', 'product_name': 'Macaroni & Cheese', 'sale_story': '2/$5'},
+        # Kroger coupons only carry free text
+        {'raw_text': 'Save $1.00 on any ONE Kraft Mac & Cheese', 'brand_name': 'Kraft'},
+        'not an item',
+    ],
+)
+def test_leaves_ambiguous_items_to_the_model(item):
+    assert FastPathExtractor().extract(item) is None
+
+
+def test_split_keeps_rows_with_their_items_and_counts_rules():
+    extractor = FastPathExtractor()
+    simple = flipp_item(sale_story='BOGO')
+    ambiguous = flipp_item(sale_story='Save 30')
+
+    extracted, residual = extractor.split([simple, ambiguous])
+
+    assert [item for item, _ in extracted] == [simple]
+    assert extracted[0][1][0]['deal_type'] == 'BUY_X_GET_Y_FREE'
+    assert residual == [ambiguous]
+    assert extractor.stats['buy_x_get_y_free'] == 1
+    assert extractor.stats['no_match'] == 1
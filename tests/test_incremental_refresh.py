@@ -0,0 +1,91 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+from stores.lib.BaseStore import Store
+
+# the run-wide deduplicator would hand every later run the products of the first one
+SINGLE_RUN_PER_WEEK = {'FAST_PATH_ENABLED': False, 'CROSS_STORE_DEDUP': False}
+
+VALID_TO = (date.today() + timedelta(days=3)).isoformat()
+
+
+def item(name, price='1.25', valid_to=VALID_TO):
+    return {'brand_name': 'Kraft', 'product_name': name, 'description': f'{name}, {price}', 'valid_to': valid_to}
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    extracted = []
+    extract_items = Store._extract_items
+
+    async def recording_extract_items(self, items):
+        extracted.extend(queued['product_name'] for queued in items)
+        return await extract_items(self, items)
+
+    monkeypatch.setattr(Store, '_extract_items', recording_extract_items)
+    return extracted
+
+
+def run_weeks(store, *queues):
+    """
+    Processes one queue per week - every run but the last one is moved back to an earlier week.
+    """
+    async def run():
+        async with store:
+            for weeks_ago, queue in reversed(list(enumerate(reversed(queues)))):
+                store.processing_queue = list(queue)
+                await store.process_queue()
+                if weeks_ago:
+                    connection = store.output_writer.deal_database.connection
+                    connection.execute("UPDATE deals SET week = '2000-W01'")
+                    connection.execute("UPDATE manifests SET week = '2000-W01'")
+                    connection.commit()
+
+            await store.output_writer.close()
+
+    asyncio.run(run())
+
+
+def rows(store):
+    return sorted(
+        (row['product_name'], row['description'])
+        for row in store.output_writer.deal_database.get_rows(store._store_name)
+    )
+
+
+def test_only_new_and_changed_items_are_extracted_again(make_store, extracted):
+    store = make_store(**SINGLE_RUN_PER_WEEK)
+
+    run_weeks(
+        store,
+        [item('Mac'), item('Cola'), item('Soup')],
+        [item('Mac'), item('Cola', price='0.99'), item('Salsa')],
+    )
+
+    # items that are no longer queued are dropped
+    assert extracted == ['Mac', 'Cola', 'Soup', 'Cola', 'Salsa']
+    assert rows(store) == [
+        ('Cola', 'Cola, 0.99'),
+        ('Mac', 'Mac, 1.25'),
+        ('Salsa', 'Salsa, 1.25'),
+    ]
+
+
+def test_expired_rows_are_extracted_again(make_store, extracted):
+    store = make_store(**SINGLE_RUN_PER_WEEK)
+    expired = item('Mac', valid_to=(date.today() - timedelta(days=1)).isoformat())
+
+    run_weeks(store, [expired], [expired])
+
+    assert extracted == ['Mac', 'Mac']
+
+
+def test_everything_is_extracted_again_without_incremental_refresh(make_store, extracted):
+    store = make_store(**SINGLE_RUN_PER_WEEK, INCREMENTAL_REFRESH=False)
+
+    run_weeks(store, [item('Mac'), item('Cola')], [item('Mac'), item('Cola')])
+
+    assert extracted == ['Mac', 'Cola', 'Mac', 'Cola']
+    assert rows(store) == [('Cola', 'Cola, 1.25'), ('Mac', 'Mac, 1.25')]
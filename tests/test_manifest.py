@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+
+import pytest
+
+from lib.DealDatabase import DealDatabase
+
+HEADERS = ['product_name', 'valid_from', 'valid_to']
+
+
+def deal_database(path, week='2026-W42'):
+    return DealDatabase(path, headers=HEADERS, date_columns=['valid_from', 'valid_to'], week=week)
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = deal_database(tmp_path / 'deals.sqlite')
+    yield database
+    database.close()
+
+
+def test_the_manifest_summarizes_the_finished_sheet(database):
+    database.add_rows(
+        'publix',
+        [
+            {'product_name': 'Mac', 'valid_from': date(2026, 10, 14), 'valid_to': date(2026, 10, 20)},
+            {'product_name': 'Cola', 'valid_from': date(2026, 10, 15), 'valid_to': 'N/A'},
+        ],
+    )
+
+    manifest = database.write_manifest('publix', [456, '123', 123])
+
+    assert manifest == database.get_manifest('publix')
+    assert {key: manifest[key] for key in manifest if key not in ('content_hash', 'finished_at')} == {
+        'sheet': 'publix',
+        'week': '2026-W42',
+        'row_count': 2,
+        'valid_from_min': '2026-10-14',
+        'valid_from_max': '2026-10-15',
+        'valid_to_min': '2026-10-20',
+        'valid_to_max': '2026-10-20',
+        'publication_ids': ['123', '456'],
+    }
+
+
+def test_the_content_hash_changes_with_the_rows(database):
+    database.add_rows('publix', [{'product_name': 'Mac'}])
+    content_hash = database.write_manifest('publix')['content_hash']
+    assert database.write_manifest('publix')['content_hash'] == content_hash
+
+    database.add_rows('publix', [{'product_name': 'Cola'}])
+    assert database.write_manifest('publix')['content_hash'] != content_hash
+
+
+def test_resetting_a_sheet_removes_its_manifest(database):
+    database.add_rows('publix', [{'product_name': 'Mac'}])
+    database.write_manifest('publix')
+
+    database.reset_sheet('publix')
+
+    assert database.get_manifest('publix') is None
+
+
+def test_the_latest_manifest_can_be_from_an_earlier_week(tmp_path, database):
+    last_week = deal_database(tmp_path / 'deals.sqlite', week='2026-W41')
+    last_week.write_manifest('publix', [1])
+    next_week = deal_database(tmp_path / 'deals.sqlite', week='2026-W43')
+    next_week.write_manifest('publix', [3])
+
+    assert database.get_manifest('publix') is None
+    assert database.get_manifest('publix', latest=True)['publication_ids'] == ['1']
+    last_week.close()
+    next_week.close()
+
+
+@pytest.mark.parametrize(
+    'valid_to, finished, current',
+    [
+        (date.today() + timedelta(days=3), True, True),
+        (date.today(), True, True),
+        (date.today() - timedelta(days=1), True, False),
+        (date.today() + timedelta(days=3), False, False),
+        (None, True, False),
+    ],
+)
+def test_current_data_is_read_from_the_manifest(database, valid_to, finished, current):
+    if valid_to is not None:
+        database.add_rows('publix', [{'product_name': 'Mac', 'valid_to': valid_to}])
+
+    if finished:
+        database.write_manifest('publix')
+
+    assert database.has_current_data('publix') is current
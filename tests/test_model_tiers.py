@@ -0,0 +1,83 @@
+import asyncio
+
+import orjson
+import pytest
+from loguru import logger
+
+from tests.conftest import FAKE_BACKEND
+from utils.call_ai_model_gemini import (
+    OUTPUT_COLUMNS,
+    extract_products_using_gemini,
+    get_extraction_client,
+)
+
+TIERS = {**FAKE_BACKEND, 'MODEL_TIERS': orjson.dumps(['gemini-fast', 'gemini-pro']).decode()}
+
+ITEMS = [{'brand_name': 'Kraft', 'product_name': 'Macaroni & Cheese', 'price_text': '1.25'}]
+
+
+def extract():
+    products, _ = asyncio.run(
+        extract_products_using_gemini(
+            {
+                'prompt_jinja_template_path': 'get_individual_products.jinja',
+                'user_input': ITEMS,
+                'logger': logger,
+                'store': 'publix',
+            }
+        )
+    )
+    return products
+
+
+def product(filled: int, **fields):
+    return {**{column: 'x' for column in OUTPUT_COLUMNS[:filled]}, **fields}
+
+
+@pytest.mark.parametrize(
+    'products, acceptable',
+    [
+        ([], False),
+        ([product(len(OUTPUT_COLUMNS))], True),
+        ([product(len(OUTPUT_COLUMNS), product_name='')], True),
+        ([product(len(OUTPUT_COLUMNS)), {'description': 'x'}], False),
+        ([product(len(OUTPUT_COLUMNS) // 4)], False),
+    ],
+)
+def test_unusable_responses_are_not_acceptable(config_ini, products, acceptable):
+    config_ini(**TIERS)
+
+    assert get_extraction_client().is_acceptable(products) is acceptable
+
+
+def test_batches_stay_on_the_first_tier_when_it_answers(config_ini):
+    config_ini(**TIERS)
+    client = get_extraction_client()
+
+    assert [product['brand_name'] for product in extract()] == ['Kraft']
+    assert client.tier_stats()['gemini-fast']['successes'] == 1
+    assert client.tier_stats()['gemini-pro']['calls'] == 0
+
+
+def test_unusable_answers_escalate_to_the_next_tier(config_ini):
+    config_ini(**TIERS)
+    client = get_extraction_client()
+    for model in client.tiers[0].models.values():
+        model.empty_rate = 1
+
+    assert [product['brand_name'] for product in extract()] == ['Kraft']
+    assert client.tier_stats()['gemini-fast']['escalations'] == 1
+    assert client.tier_stats()['gemini-pro']['successes'] == 1
+
+
+def test_the_last_tier_is_not_counted_as_an_escalation(config_ini):
+    config_ini(**TIERS)
+    client = get_extraction_client()
+    for tier in client.tiers:
+        for model in tier.models.values():
+            model.empty_rate = 1
+
+    assert extract() == []
+    assert client.tier_stats()['gemini-fast']['escalations'] == 1
+    assert client.tier_stats()['gemini-pro']['calls'] == 1
+    assert client.tier_stats()['gemini-pro']['escalations'] == 0
@@ -0,0 +1,72 @@
+from datetime import date
+
+import pandas as pd
+
+from stores.lib.constants import HEADERS
+from utils.normalization import column_style, deals_frame, frame_rows, to_python
+
+
+def values(**row):
+    return [row.get(header, 'N/A') for header in HEADERS]
+
+
+ROWS = [
+    values(
+        brand_name=' Kraft ',
+        product_name='Mac',
+        price='1.25',
+        required_purchase_quantity=2,
+        sale_percent_off='12.5',
+        valid_to='2026-10-20',
+        requires_store_card='Yes',
+    ),
+    values(brand_name='null', price='free', required_purchase_quantity='N/A', valid_to='soon', requires_store_card=False),
+]
+
+
+def test_columns_are_typed_from_the_schema():
+    frame = deals_frame(ROWS)
+
+    assert str(frame['brand_name'].dtype) == 'string'
+    assert str(frame['price'].dtype) == 'Float64'
+    assert str(frame['required_purchase_quantity'].dtype) == 'Int64'
+    # an integer column that holds fractions stays a float
+    assert str(frame['sale_percent_off'].dtype) == 'Float64'
+    assert str(frame['requires_store_card'].dtype) == 'boolean'
+    assert pd.api.types.is_datetime64_any_dtype(frame['valid_to'])
+
+
+def test_placeholders_and_unparseable_values_become_missing():
+    frame = deals_frame(ROWS)
+
+    assert frame['brand_name'].tolist() == ['Kraft', pd.NA]
+    assert frame['price'].isna().tolist() == [False, True]
+    assert frame['valid_to'].isna().tolist() == [False, True]
+    assert frame['requires_store_card'].tolist() == [True, False]
+
+
+def test_rows_come_back_as_plain_python_values():
+    first, second = list(frame_rows(deals_frame(ROWS)))
+    row = dict(zip(HEADERS, first))
+
+    assert (row['brand_name'], row['price'], row['required_purchase_quantity']) == ('Kraft', 1.25, 2)
+    assert type(row['required_purchase_quantity']) is int
+    assert row['valid_to'] == date(2026, 10, 20)
+    assert row['requires_store_card'] is True
+    assert dict(zip(HEADERS, second))['price'] is None
+
+
+def test_to_python_keeps_the_table_shape():
+    frame = to_python(deals_frame(ROWS))
+
+    assert frame['valid_to'].tolist() == [date(2026, 10, 20), None]
+    assert frame['brand_name'].tolist() == ['Kraft', None]
+
+
+def test_export_styles_follow_the_column_types():
+    frame = deals_frame(ROWS)
+
+    assert [
+        column_style(frame[column])
+        for column in ['brand_name', 'required_purchase_quantity', 'price', 'valid_to', 'requires_store_card']
+    ] == ['text', 'integer', 'currency', 'date', 'text']
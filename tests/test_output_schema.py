@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+
+from loguru import logger
+
+import utils.call_ai_model_gemini
+
+from stores.lib.constants import DATE_HEADERS, HEADERS, OUTPUT_COLUMN_ALIASES
+from tests.conftest import FAKE_BACKEND
+from utils.call_ai_model_gemini import (
+    OUTPUT_COLUMNS,
+    OUTPUT_TOOL_DEFS,
+    expand_positional_rows,
+    extract_products_using_gemini,
+    PRODUCT_SCHEMA,
+    handle_gemini_response,
+)
+from utils.decoding import RowDecoder
+
+ITEMS = [
+    {'brand_name': 'Kraft', 'product_name': 'Macaroni & Cheese', 'price_text': '1.25'},
+    {'brand_name': 'Coca-Cola', 'product_name': 'Classic', 'price_text': '6.99'},
+]
+
+
+def extract():
+    decoder = RowDecoder(
+        PRODUCT_SCHEMA['properties'], HEADERS, aliases=OUTPUT_COLUMN_ALIASES, date_columns=DATE_HEADERS
+    )
+    products, _ = asyncio.run(
+        extract_products_using_gemini(
+            {
+                'prompt_jinja_template_path': 'get_individual_products.jinja',
+                'user_input': ITEMS,
+                'logger': logger,
+                'store': 'publix',
+            }
+        )
+    )
+    return decoder.decode(products)
+
+
+def test_positional_rows_follow_the_output_columns():
+    row = [f'value {i}' for i in range(len(OUTPUT_COLUMNS))]
+
+    assert expand_positional_rows([row]) == [dict(zip(OUTPUT_COLUMNS, row))]
+    # a short row only sets its leading columns
+    assert expand_positional_rows([['Kraft']]) == [{OUTPUT_COLUMNS[0]: 'Kraft'}]
+
+
+def test_the_positional_contract_lists_every_column_in_order():
+    rows = OUTPUT_TOOL_DEFS['positional']['function_declarations'][0]['parameters']['properties']['rows']
+
+    assert rows['items']['description'].endswith(', '.join(OUTPUT_COLUMNS))
+    for i, column in enumerate(OUTPUT_COLUMNS, 1):
+        assert f'{i}. `{column}`' in rows['description']
+
+
+def test_both_contracts_decode_to_the_same_rows(config_ini):
+    config_ini(**FAKE_BACKEND)
+    named = extract()
+
+    config_ini(**FAKE_BACKEND, OUTPUT_SCHEMA='positional')
+    utils.call_ai_model_gemini._extraction_client = None
+
+    assert extract() == named
+    assert [product['sale_price'] for product in named] == [1.25, 6.99]
+
+
+def test_responses_are_read_from_either_contract():
+    def response(**args):
+        part = SimpleNamespace(function_call=SimpleNamespace(args=args))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+    assert handle_gemini_response(response(rows=[['Kraft']])) == [{OUTPUT_COLUMNS[0]: 'Kraft'}]
+    assert handle_gemini_response(response(products=[{'brand_name': 'Kraft'}])) == [{'brand_name': 'Kraft'}]
+    assert handle_gemini_response(response(rows=None)) == []
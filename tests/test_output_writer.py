@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+from lib.DealDatabase import DealDatabase
+from lib.DealHistory import DealHistory
+from lib.OutputWriter import OutputWriter
+
+
+class FlakyDealDatabase(DealDatabase):
+    # fails every batch that contains a row named "Poison"
+    def add_rows(self, sheet, rows, commit=True):
+        super().add_rows(sheet, rows, commit=commit)
+        if any(row.get('product_name') == 'Poison' for row in rows):
+            raise Exception('disk I/O error')
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = FlakyDealDatabase(
+        tmp_path / 'deals.sqlite', headers=['product_name', 'valid_to'], date_columns=['valid_to']
+    )
+    yield database
+    database.close()
+
+
+def names(database, sheet):
+    return [row['product_name'] for row in database.get_rows(sheet)]
+
+
+def test_queued_batches_are_committed_together_in_order(database):
+    writer = OutputWriter(database, max_commit_rows=100)
+
+    async def run():
+        await writer.put_rows('publix', [{'product_name': 'Mac'}])
+        await writer.put_rows('publix', [{'product_name': 'Cola'}, {'product_name': 'Soup'}])
+        await writer.reset_sheet('kroger')
+        await writer.put_rows('kroger', [{'product_name': 'Chips'}])
+        await writer.put_rows('kroger', [])
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert names(database, 'publix') == ['Mac', 'Cola', 'Soup']
+    assert names(database, 'kroger') == ['Chips']
+    assert writer.stats() == {'commits': 1, 'rows': 4, 'failed_rows': 0, 'max_queue_depth': 4}
+
+
+def test_group_commits_are_closed_at_the_row_limit(database):
+    writer = OutputWriter(database, max_commit_rows=2)
+
+    async def run():
+        for name in ['Mac', 'Cola', 'Soup', 'Chips', 'Salsa']:
+            await writer.put_rows('publix', [{'product_name': name}])
+
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert names(database, 'publix') == ['Mac', 'Cola', 'Soup', 'Chips', 'Salsa']
+    assert writer.commits == 3
+
+
+def test_a_reset_cant_overtake_rows_queued_before_it(database):
+    writer = OutputWriter(database)
+
+    async def run():
+        await writer.put_rows('publix', [{'product_name': 'Mac'}])
+        await writer.reset_sheet('publix')
+        await writer.put_rows('publix', [{'product_name': 'Cola'}])
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert names(database, 'publix') == ['Cola']
+
+
+def test_finishing_a_sheet_writes_its_manifest(database):
+    writer = OutputWriter(database)
+
+    async def run():
+        await writer.put_rows('publix', [{'product_name': 'Mac', 'valid_to': '2026-10-20'}])
+        await writer.finish_sheet('publix', [123])
+        await writer.close()
+
+    asyncio.run(run())
+
+    manifest = database.get_manifest('publix')
+    assert (manifest['row_count'], manifest['valid_to_max'], manifest['publication_ids']) == (
+        1,
+        '2026-10-20',
+        ['123'],
+    )
+
+
+def test_a_sheet_with_failed_rows_is_never_finished(database):
+    writer = OutputWriter(database, max_commit_rows=1)
+
+    async def run():
+        await writer.put_rows('publix', [{'product_name': 'Mac'}])
+        await writer.flush()
+        await writer.put_rows('publix', [{'product_name': 'Poison'}])
+        await writer.flush()
+        await writer.put_rows('kroger', [{'product_name': 'Cola'}])
+        with pytest.raises(Exception, match='Unable to write every row of publix'):
+            await writer.finish_sheet('publix')
+
+        await writer.finish_sheet('kroger')
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert names(database, 'publix') == ['Mac']
+    assert database.get_manifest('publix') is None
+    assert database.get_manifest('kroger')['row_count'] == 1
+    assert (writer.rows, writer.failed_rows) == (2, 1)
+
+
+def test_a_reset_clears_the_failure(database):
+    writer = OutputWriter(database, max_commit_rows=1)
+
+    async def run():
+        await writer.put_rows('publix', [{'product_name': 'Poison'}])
+        await writer.flush()
+        await writer.reset_sheet('publix')
+        await writer.put_rows('publix', [{'product_name': 'Mac'}])
+        await writer.finish_sheet('publix')
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert database.get_manifest('publix')['row_count'] == 1
+
+
+def test_full_queues_make_producers_wait(database):
+    writer = OutputWriter(database, max_queued_batches=2, max_commit_rows=1)
+
+    async def run():
+        await asyncio.gather(
+            *(writer.put_rows('publix', [{'product_name': f'Item {i}'}]) for i in range(10))
+        )
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert len(names(database, 'publix')) == 10
+    assert writer.max_queue_depth <= 2
+
+
+def test_finished_sheets_are_recorded_in_the_deal_history(tmp_path, database):
+    deal_history = DealHistory(tmp_path / 'history.sqlite')
+    writer = OutputWriter(database, deal_history=deal_history)
+
+    async def run():
+        await writer.put_rows('publix', [{'product_name': 'Mac'}])
+        await writer.finish_sheet('publix')
+        await writer.close()
+
+    asyncio.run(run())
+
+    assert deal_history.connection.execute('SELECT COUNT(*) FROM snapshots').fetchone() == (1,)
+    deal_history.close()
@@ -0,0 +1,83 @@
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pytest
+
+from lib.DealDatabase import DealDatabase
+from stores.lib.constants import BOOLEAN_HEADERS, DATE_HEADERS, HEADERS
+from utils.parquet_export import export_parquet
+
+
+def deal_database(path, week='2026-W42'):
+    return DealDatabase(
+        path, headers=HEADERS, date_columns=DATE_HEADERS, boolean_columns=BOOLEAN_HEADERS, week=week
+    )
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = deal_database(tmp_path / 'deals.sqlite')
+    database.add_rows(
+        'publix',
+        [
+            {'brand_name': 'Kraft', 'product_name': 'Mac', 'sale_price': 1.25, 'valid_to': date(2026, 10, 20)},
+            {'brand_name': 'Coca-Cola', 'product_name': 'Cola', 'required_purchase_quantity': 2},
+        ],
+    )
+    database.add_rows('newspaper-coupons', [{'brand_name': 'Kraft', 'sale_amount_off': 0.5}])
+    database.set_matchups(
+        'publix',
+        ['brand_name', 'sale_price', 'similarity_score', 'matched_row_index'],
+        [['Kraft', 1.25, 95.0, '0, 0'], ['Kraft', 'N/A', 95.0, '0, 0']],
+    )
+    yield database
+    database.close()
+
+
+def read(tmp_path, dataset):
+    return ds.dataset(tmp_path / 'parquet' / dataset, format='parquet', partitioning='hive').to_table()
+
+
+def test_sheets_are_written_to_typed_datasets_partitioned_by_store_and_week(tmp_path, database):
+    counts = export_parquet(['publix', 'newspaper-coupons'], database, tmp_path / 'parquet')
+
+    assert counts == {'sales': 2, 'coupons': 1, 'matchups': 2}
+
+    sales = read(tmp_path, 'sales')
+    assert sales.schema.field('sale_price').type == pa.float64()
+    assert sales.schema.field('required_purchase_quantity').type == pa.int64()
+    assert sales.schema.field('valid_to').type == pa.date32()
+    assert sales.schema.field('requires_store_card').type == pa.bool_()
+    assert sales.column('sale_price').to_pylist() == [1.25, None]
+    assert sales.column('valid_to').to_pylist() == [date(2026, 10, 20), None]
+    assert set(sales.column('store').to_pylist()) == {'publix'}
+    assert set(sales.column('week').to_pylist()) == {'2026-W42'}
+
+    assert read(tmp_path, 'coupons').column('sale_amount_off').to_pylist() == [0.5]
+    matchups = read(tmp_path, 'matchups')
+    assert matchups.column('similarity_score').type == pa.float64()
+    assert matchups.column('sale_price').to_pylist() == [1.25, None]
+
+
+def test_columns_keep_their_type_without_any_values(tmp_path, database):
+    export_parquet(['newspaper-coupons'], database, tmp_path / 'parquet')
+
+    assert read(tmp_path, 'coupons').schema.field('valid_from').type == pa.date32()
+
+
+def test_a_rerun_replaces_its_week_and_keeps_earlier_weeks(tmp_path, database):
+    last_week = deal_database(tmp_path / 'deals.sqlite', week='2026-W41')
+    last_week.add_rows('publix', [{'product_name': 'Soup'}])
+    export_parquet(['publix'], last_week, tmp_path / 'parquet')
+    export_parquet(['publix'], database, tmp_path / 'parquet')
+
+    database.reset_sheet('publix')
+    database.set_matchups('publix', [], [])
+    database.add_rows('publix', [{'product_name': 'Chips'}])
+    export_parquet(['publix'], database, tmp_path / 'parquet')
+
+    sales = read(tmp_path, 'sales').to_pydict()
+    assert sorted(zip(sales['week'], sales['product_name'])) == [('2026-W41', 'Soup'), ('2026-W42', 'Chips')]
+    assert not (tmp_path / 'parquet' / 'matchups' / 'store=publix' / 'week=2026-W42').exists()
+    last_week.close()
@@ -0,0 +1,54 @@
+import orjson
+import pytest
+
+from utils.prompt_encoding import encode_user_input, measure_encodings
+
+ITEMS = [
+    {'brand_name': 'Kraft', 'product_name': 'Mac & Cheese', 'price_text': '', 'tags': []},
+    {'brand_name': 'N/A', 'product_name': 'Cola', 'price_text': '6.99', 'tags': ['bogo']},
+    {},
+]
+
+
+def fenced(text):
+    return text.split('```')[1].split('\n', 1)[1]
+
+
+def test_json_is_the_default_and_keeps_every_field():
+    encoded = encode_user_input(ITEMS)
+
+    assert encoded.startswith('```json\n')
+    assert '\n  ' in encoded
+    assert orjson.loads(fenced(encoded)) == ITEMS
+
+
+def test_compact_drops_empty_fields_but_keeps_item_positions():
+    assert orjson.loads(fenced(encode_user_input(ITEMS, 'compact'))) == [
+        {'brand_name': 'Kraft', 'product_name': 'Mac & Cheese'},
+        {'product_name': 'Cola', 'price_text': '6.99', 'tags': ['bogo']},
+        {},
+    ]
+
+
+def test_table_has_a_header_row_and_one_row_per_item():
+    rows = [orjson.loads(line) for line in fenced(encode_user_input(ITEMS, 'table')).splitlines()]
+
+    assert rows == [
+        ['brand_name', 'product_name', 'price_text', 'tags'],
+        ['Kraft', 'Mac & Cheese', None, None],
+        [None, 'Cola', '6.99', ['bogo']],
+        [None, None, None, None],
+    ]
+
+
+def test_unknown_encodings_are_rejected():
+    with pytest.raises(ValueError, match="Unknown prompt input encoding 'yaml'"):
+        encode_user_input(ITEMS, 'yaml')
+
+
+def test_measure_encodings_reports_tokens_per_item():
+    tokens = measure_encodings(ITEMS, count_tokens=len)
+
+    assert set(tokens) == {'json', 'compact', 'table'}
+    assert tokens['compact'] < tokens['json']
+    assert tokens['json'] == round(len(encode_user_input(ITEMS)) / len(ITEMS), 1)
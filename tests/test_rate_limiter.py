@@ -0,0 +1,95 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import lib.RateLimiter
+from lib.RateLimiter import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(lib.RateLimiter, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(
+        lib.RateLimiter, 'asyncio', SimpleNamespace(sleep=clock.sleep, Lock=asyncio.Lock)
+    )
+    return clock
+
+
+def acquire(limiter, times=1, tokens=0):
+    async def run():
+        for _ in range(times):
+            await limiter.acquire(tokens)
+
+    asyncio.run(run())
+
+
+def test_requests_wait_once_the_minute_is_used_up(clock):
+    limiter = RateLimiter(requests_per_minute=60)
+
+    acquire(limiter, times=60)
+    assert limiter.throttled_seconds == 0
+
+    acquire(limiter)
+    assert limiter.throttled_seconds == pytest.approx(1.0)
+
+
+def test_tokens_wait_for_the_bucket_to_refill(clock):
+    limiter = RateLimiter(tokens_per_minute=1000)
+
+    acquire(limiter, tokens=800)
+    acquire(limiter, tokens=400)
+
+    # 200 missing tokens at 1000 per minute
+    assert limiter.throttled_seconds == pytest.approx(12.0)
+
+
+def test_a_request_larger_than_the_bucket_only_waits_for_a_full_bucket(clock):
+    limiter = RateLimiter(tokens_per_minute=1000)
+
+    acquire(limiter, tokens=5000)
+    assert limiter.throttled_seconds == 0
+
+    acquire(limiter, tokens=5000)
+    assert limiter.throttled_seconds == pytest.approx(60.0)
+
+
+def test_penalize_pauses_every_caller_and_drains_the_buckets(clock):
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=100_000)
+
+    limiter.penalize(30)
+    acquire(limiter, tokens=100)
+
+    assert limiter.throttled_seconds >= 30
+    assert limiter.stats()['penalties'] == 1
+
+
+def test_record_usage_refunds_overestimated_tokens(clock):
+    limiter = RateLimiter(tokens_per_minute=1000)
+
+    acquire(limiter, tokens=1000)
+    limiter.record_usage(estimated_tokens=1000, actual_tokens=400)
+    acquire(limiter, tokens=600)
+
+    assert limiter.throttled_seconds == 0
+
+
+def test_no_quota_never_waits(clock):
+    limiter = RateLimiter()
+
+    acquire(limiter, times=1000, tokens=10**6)
+    limiter.record_usage(0, 10**6)
+
+    assert limiter.throttled_seconds == 0
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from lib.RequestHedger import RequestHedger
+
+
+def hedger(max_hedge_percent=100, latency=0.01):
+    hedger = RequestHedger(max_hedge_percent, min_samples=1)
+    hedger.record_latency(latency)
+    return hedger
+
+
+def answer(result, after=0.0, cancelled=None):
+    async def call():
+        try:
+            await asyncio.sleep(after)
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(result)
+            raise
+
+        if isinstance(result, Exception):
+            raise result
+
+        return result
+
+    return call
+
+
+def run(hedger, call, hedge_call):
+    return asyncio.run(hedger.run(call, hedge_call))
+
+
+def test_fast_calls_are_not_hedged():
+    request_hedger = hedger(latency=1)
+    hedge_calls = []
+
+    async def hedge_call():
+        hedge_calls.append(True)
+
+    assert run(request_hedger, answer('primary'), hedge_call) == 'primary'
+    assert hedge_calls == []
+    assert request_hedger.stats() == {'hedges': 0, 'hedge_wins': 0, 'hedge_after_seconds': 1}
+
+
+def test_no_hedging_until_enough_latencies_are_seen():
+    request_hedger = RequestHedger(100, min_samples=2)
+    request_hedger.record_latency(0.01)
+
+    assert run(request_hedger, answer('primary', after=0.05), answer('hedge')) == 'primary'
+    assert request_hedger.hedges == 0
+
+
+def test_a_slow_call_loses_to_its_hedge_and_is_cancelled():
+    request_hedger = hedger()
+    cancelled = []
+
+    assert run(request_hedger, answer('primary', after=5, cancelled=cancelled), answer('hedge')) == 'hedge'
+    assert cancelled == ['primary']
+    assert (request_hedger.hedges, request_hedger.hedge_wins) == (1, 1)
+
+
+def test_an_invalid_hedge_only_loses_the_race():
+    request_hedger = hedger()
+
+    assert run(request_hedger, answer('primary', after=0.05), answer(None)) == 'primary'
+    assert (request_hedger.hedges, request_hedger.hedge_wins) == (1, 0)
+
+
+def test_the_original_error_is_raised_when_both_calls_fail():
+    request_hedger = hedger()
+
+    with pytest.raises(ValueError, match='primary'):
+        run(request_hedger, answer(ValueError('primary'), after=0.05), answer(ValueError('hedge')))
+
+
+def test_hedges_are_capped_at_a_share_of_the_calls():
+    request_hedger = RequestHedger(50, min_samples=1)
+    for _ in range(50):
+        request_hedger.record_latency(0.01)
+
+    results = [run(request_hedger, answer('primary', after=0.2), answer('hedge')) for _ in range(4)]
+
+    assert results == ['primary', 'hedge', 'primary', 'hedge']
+    assert request_hedger.hedges == 2
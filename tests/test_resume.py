@@ -0,0 +1,114 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+from lib.DealDatabase import DealDatabase
+from stores.lib.BaseStore import Store
+
+# the run-wide deduplicator would hand the restarted run the products of the interrupted one
+RESTARTED_RUN = {'FAST_PATH_ENABLED': False, 'CROSS_STORE_DEDUP': False}
+
+VALID_TO = (date.today() + timedelta(days=3)).isoformat()
+
+QUEUE = [
+    {'brand_name': 'Kraft', 'product_name': name, 'description': name, 'valid_to': VALID_TO}
+    for name in ['Mac', 'Cola', 'Soup']
+]
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    extracted = []
+    extract_items = Store._extract_items
+
+    async def recording_extract_items(self, items):
+        extracted.append([queued['product_name'] for queued in items])
+        return await extract_items(self, items)
+
+    monkeypatch.setattr(Store, '_extract_items', recording_extract_items)
+    return extracted
+
+
+def crash_after(monkeypatch, done: int):
+    extract_items = Store._extract_items
+
+    async def crashing_extract_items(self, items):
+        await extract_items(self, items[:done])
+        raise RuntimeError('the run was killed')
+
+    monkeypatch.setattr(Store, '_extract_items', crashing_extract_items)
+    return extract_items
+
+
+def run_twice(store, monkeypatch, extract_items):
+    async def run():
+        async with store:
+            store.processing_queue = list(QUEUE)
+            with pytest.raises(RuntimeError):
+                await store.process_queue()
+
+            interrupted_manifest = store.output_writer.deal_database.get_manifest(store._store_name)
+
+            monkeypatch.setattr(Store, '_extract_items', extract_items)
+            store.processing_queue = list(QUEUE)
+            await store.process_queue()
+            await store.output_writer.close()
+
+        return interrupted_manifest
+
+    return asyncio.run(run())
+
+
+def names(store):
+    return sorted(row['product_name'] for row in store.output_writer.deal_database.get_rows(store._store_name))
+
+
+def test_a_restarted_run_resumes_with_the_items_that_didnt_finish(make_store, extracted, monkeypatch):
+    store = make_store(**RESTARTED_RUN, BATCH_MAX_ITEMS=1)
+
+    interrupted_manifest = run_twice(store, monkeypatch, crash_after(monkeypatch, done=2))
+
+    assert interrupted_manifest is None
+    assert extracted == [['Mac', 'Cola'], ['Soup']]
+    assert names(store) == ['Cola', 'Mac', 'Soup']
+    assert store.output_writer.deal_database.get_manifest(store._store_name)['row_count'] == 3
+
+
+def test_interrupted_runs_are_started_over_without_resume(make_store, extracted, monkeypatch):
+    store = make_store(**RESTARTED_RUN, RESUME_INTERRUPTED_RUNS=False)
+
+    run_twice(store, monkeypatch, crash_after(monkeypatch, done=2))
+
+    assert extracted == [['Mac', 'Cola'], ['Mac', 'Cola', 'Soup']]
+    assert names(store) == ['Cola', 'Mac', 'Soup']
+
+
+def test_the_interrupted_run_wins_over_the_last_finished_run(tmp_path):
+    def deal_database(week):
+        return DealDatabase(tmp_path / 'deals.sqlite', headers=['product_name', 'price'], week=week)
+
+    last_week = deal_database('2026-W41')
+    last_week.add_rows(
+        'publix',
+        [
+            {'product_name': 'Mac', 'price': 1.25, 'item_key': 'mac'},
+            {'product_name': 'Cola', 'price': 6.99, 'item_key': 'cola'},
+        ],
+    )
+    last_week.write_manifest('publix')
+    this_week = deal_database('2026-W42')
+    this_week.add_rows('publix', [{'product_name': 'Mac', 'price': 0.99, 'item_key': 'mac'}])
+
+    def previous(**kwargs):
+        return [(row['product_name'], row['price']) for row in this_week.get_previous_rows('publix', **kwargs)]
+
+    assert previous() == [('Mac', 0.99), ('Cola', 6.99)]
+    assert previous(interrupted=False) == [('Mac', 1.25), ('Cola', 6.99)]
+    assert previous(finished=False) == [('Mac', 0.99)]
+
+    # once this week's run finished, it is the last finished run
+    this_week.write_manifest('publix')
+    assert previous() == [('Mac', 0.99)]
+    last_week.close()
+    this_week.close()
@@ -0,0 +1,71 @@
+import csv
+from datetime import date, datetime
+
+from openpyxl import Workbook, load_workbook
+
+from utils.spreadsheets import (
+    MATCHUP_STYLE_COUNT,
+    register_named_styles,
+    write_csv,
+    write_formatted_rows,
+    write_grouped_rows_with_colors,
+)
+
+
+def export(tmp_path, write):
+    wb = Workbook(write_only=True)
+    styles = register_named_styles(wb)
+    write(wb.create_sheet('sheet'), styles)
+    wb.save(tmp_path / 'stores.xlsx')
+    return load_workbook(tmp_path / 'stores.xlsx')['sheet']
+
+
+def test_deal_rows_are_streamed_with_one_style_per_column(tmp_path):
+    rows = (row for row in [['Mac', 1.25, date(2026, 10, 20)], ['Cola', None, None]])
+
+    sheet = export(
+        tmp_path,
+        lambda sheet, styles: write_formatted_rows(
+            sheet,
+            styles,
+            ['product_name', 'sale_price', 'valid_to'],
+            ['Product Name', 'Sale Price', 'Valid To'],
+            ['text', 'currency', 'date'],
+            rows,
+        ),
+    )
+
+    # dates are read back as datetimes
+    assert [[cell.value for cell in row] for row in sheet.iter_rows()] == [
+        ['Product Name', 'Sale Price', 'Valid To'],
+        ['Mac', 1.25, datetime(2026, 10, 20)],
+        ['Cola', 'N/A', 'N/A'],
+    ]
+    assert [cell.style for cell in sheet[1]] == ['Deal Header'] * 3
+    assert [cell.style for cell in sheet[2]] == ['Deal Text', 'Deal Currency', 'Deal Date']
+    assert sheet['B2'].number_format == '0.00'
+    assert sheet['B3'].style == 'Deal Text'
+    assert sheet.column_dimensions['A'].width == len('product_name') + 5
+
+
+def test_matchup_groups_share_a_color_from_a_fixed_pool(tmp_path):
+    groups = MATCHUP_STYLE_COUNT + 1
+    rows = [['product_name', 'matched_row_index']]
+    for group in range(groups):
+        rows.extend([[f'Coupon {group}', f'{group}, 0'], [f'Sale {group}', f'{group}, 0']])
+
+    sheet = export(tmp_path, lambda sheet, styles: write_grouped_rows_with_colors(iter(rows), sheet, styles))
+
+    group_styles = [sheet.cell(row=2 + 2 * group, column=1).style for group in range(groups)]
+    assert sheet['A1'].value == 'product_name'
+    assert all(sheet.cell(row=3 + 2 * group, column=2).style == group_styles[group] for group in range(groups))
+    assert len(set(group_styles)) == MATCHUP_STYLE_COUNT
+    assert group_styles[-1] == group_styles[0]
+    assert len(sheet.parent.named_styles) == len(Workbook().named_styles) + 5 + MATCHUP_STYLE_COUNT
+
+
+def test_csvs_are_written_from_any_iterable(tmp_path):
+    write_csv(tmp_path / 'publix.csv', ['product_name', 'sale_price'], (row for row in [['Mac', 1.25], ['Cola', None]]))
+
+    with open(tmp_path / 'publix.csv', newline='', encoding='utf-8') as f:
+        assert list(csv.reader(f)) == [['product_name', 'sale_price'], ['Mac', '1.25'], ['Cola', '']]
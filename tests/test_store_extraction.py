@@ -0,0 +1,70 @@
+import asyncio
+
+import orjson
+
+from stores.lib.BaseStore import Store
+
+
+def item(name, **fields):
+    return {'brand_name': 'Kraft', 'product_name': name, 'description': f'{name}, select varieties', **fields}
+
+
+def test_failing_batches_are_bisected_until_the_poisoned_item_is_quarantined(make_store, monkeypatch):
+    store = make_store(BATCH_MAX_ITEMS=4)
+    sent = []
+    extract_batches = Store._extract_batches
+
+    async def poisoned_extract_batches(self, batches):
+        sent.append([[batch_item['product_name'] for batch_item in batch] for batch in batches])
+        failed = [batch for batch in batches if any(i['product_name'] == 'Poison' for i in batch)]
+        await extract_batches(self, [batch for batch in batches if batch not in failed])
+        return failed
+
+    monkeypatch.setattr(Store, '_extract_batches', poisoned_extract_batches)
+
+    async def run():
+        async with store:
+            quarantined = await store._extract_items(
+                [item('Mac'), item('Cheese'), item('Poison'), item('Soup')]
+            )
+            await store.output_writer.close()
+            return quarantined
+
+    assert asyncio.run(run()) == 1
+    assert sent == [
+        [['Mac', 'Cheese', 'Poison', 'Soup']],
+        [['Mac', 'Cheese'], ['Poison', 'Soup']],
+        [['Poison'], ['Soup']],
+    ]
+
+    dead_letters = [
+        orjson.loads(line) for line in open(store.dead_letter_file_path, 'rb').read().splitlines()
+    ]
+    assert [(entry['store'], entry['item']['product_name']) for entry in dead_letters] == [
+        ('examplestore', 'Poison')
+    ]
+    assert sorted(row['product_name'] for row in store.output_writer.deal_database.get_rows('examplestore')) == [
+        'Cheese',
+        'Mac',
+        'Soup',
+    ]
+
+
+def test_a_single_failing_item_gets_one_retry_before_it_is_quarantined(make_store, monkeypatch):
+    store = make_store()
+    sent = []
+
+    async def failing_extract_batches(self, batches):
+        sent.append(len(batches))
+        return batches
+
+    monkeypatch.setattr(Store, '_extract_batches', failing_extract_batches)
+
+    async def run():
+        async with store:
+            quarantined = await store._extract_items([item('Poison')])
+            await store.output_writer.close()
+            return quarantined
+
+    assert asyncio.run(run()) == 1
+    assert sent == [1, 1]
@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+import orjson
+from loguru import logger
+
+from tests.conftest import FAKE_BACKEND
+from utils.call_ai_model_gemini import extract_products_using_gemini
+from utils.telemetry import CallMetrics, Telemetry, get_telemetry
+
+
+def metrics(prompt_tokens=0, candidate_tokens=0, retries=0, queue_seconds=0.0):
+    call_metrics = CallMetrics()
+    call_metrics.record_usage(
+        SimpleNamespace(
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens, candidates_token_count=candidate_tokens
+            )
+        )
+    )
+    call_metrics.retries = retries
+    call_metrics.queue_seconds = queue_seconds
+    return call_metrics
+
+
+def record(telemetry, store='publix', model='gemini-fast', seconds=1.0, rows=2, outcome='ok', **kwargs):
+    telemetry.record(
+        store=store,
+        template='get_individual_products.jinja',
+        model=model,
+        wall_seconds=seconds,
+        metrics=metrics(**kwargs),
+        rows=rows,
+        outcome=outcome,
+    )
+
+
+def test_calls_are_aggregated_overall_and_per_group():
+    telemetry = Telemetry(input_cost_per_million=1, output_cost_per_million=4)
+    record(telemetry, seconds=0.4, prompt_tokens=1_000, candidate_tokens=500, queue_seconds=0.2)
+    record(telemetry, seconds=3, prompt_tokens=3_000, candidate_tokens=500, retries=2)
+    record(telemetry, store='kroger', model='gemini-pro', seconds=100, rows=0, outcome='error')
+
+    summary = telemetry.summary()
+    total = summary['total']
+    assert (total['calls'], total['rows'], total['retries']) == (3, 4, 2)
+    assert total['outcomes'] == {'ok': 2, 'error': 1}
+    assert total['tokens'] == {'prompt': 4_000, 'candidates': 1_000, 'prompt_per_row': 1_000.0}
+    assert total['cost'] == 0.008
+    assert total['queue_seconds'] == {'total': 0.2, 'mean': 0.07}
+    assert total['wall_seconds']['max'] == 100
+    assert total['wall_seconds']['histogram'] == {
+        '<=0.5s': 1, '<=1s': 0, '<=2s': 0, '<=4s': 1, '<=8s': 0, '<=16s': 0, '<=32s': 0, '<=64s': 0, '>64s': 1
+    }
+
+    assert list(summary['by_store']) == ['kroger', 'publix']
+    assert summary['by_store']['publix']['calls'] == 2
+    assert summary['by_model']['gemini-pro']['outcomes'] == {'error': 1}
+    assert summary['by_template']['get_individual_products.jinja']['calls'] == 3
+
+
+def test_an_empty_run_summarizes_to_zeros():
+    total = Telemetry().summary()['total']
+
+    assert total['calls'] == 0
+    assert total['wall_seconds']['p90'] == 0
+    assert total['queue_seconds']['mean'] == 0
+    assert total['tokens']['prompt_per_row'] == 0
+
+
+def test_the_summary_is_written_as_json(tmp_path):
+    telemetry = Telemetry()
+    record(telemetry)
+
+    summary = telemetry.write_summary(tmp_path / 'output' / 'telemetry.json')
+
+    assert orjson.loads((tmp_path / 'output' / 'telemetry.json').read_bytes()) == summary
+
+
+def test_every_extraction_call_is_recorded(config_ini):
+    config_ini(**FAKE_BACKEND, COST_PER_MILLION_INPUT_TOKENS=1)
+
+    asyncio.run(
+        extract_products_using_gemini(
+            {
+                'prompt_jinja_template_path': 'get_individual_products.jinja',
+                'user_input': [{'brand_name': 'Kraft', 'product_name': 'Macaroni & Cheese'}],
+                'logger': logger,
+                'store': 'publix',
+            }
+        )
+    )
+
+    summary = get_telemetry().summary()
+    assert summary['by_store']['publix']['outcomes'] == {'ok': 1}
+    assert summary['by_model']['gemini-fast']['rows'] == 1
+    assert summary['total']['tokens']['prompt'] > 0
+    assert summary['total']['cost'] > 0
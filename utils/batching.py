@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from typing import Any
+
+import orjson
+
+from utils.text import estimate_tokens
+
+# Every product the model returns repeats all `extract_rows` keys (or, for the positional schema, one
+# placeholder per column), so the output cost of an item is dominated by this fixed overhead plus
+# whatever free text (descriptions) it copies over.
+OUTPUT_TOKENS_PER_PRODUCT = {
+    'named': 200,
+    'positional': 80,
+}
+
+
+class BatchPacker:
+    """
+    Packs queued items into extraction batches by estimated token cost instead of a fixed item count.
+
+    Each batch is filled until the next item would exceed the input or output token budget, or the
+    current item limit is reached. The item limit adapts to the responses that come back: a batch that
+    returns nothing (empty, truncated at the output limit or unparsable) halves it, while a run of
+    successful batches grows it again one item at a time, up to `max_items`.
+
+    Args:
+        input_token_budget (int, optional): Estimated input tokens allowed per batch. Defaults to 4000.
+        output_token_budget (int, optional): Estimated output tokens allowed per batch. Defaults to 2048.
+        max_items (int, optional): Hard upper bound on items per batch. Defaults to 12.
+        output_schema (str, optional): The `extract_rows` output contract in use, `named` or `positional`.
+            Defaults to `named`.
+
+    """
+
+    def __init__(
+        self,
+        input_token_budget: int = 4000,
+        output_token_budget: int = 2048,
+        max_items: int = 12,
+        output_schema: str = 'named',
+    ) -> None:
+        self.input_token_budget = input_token_budget
+        self.output_token_budget = output_token_budget
+        self.max_items = max(1, max_items)
+        self.item_limit = self.max_items
+        self.output_tokens_per_product = OUTPUT_TOKENS_PER_PRODUCT.get(
+            output_schema, OUTPUT_TOKENS_PER_PRODUCT['named']
+        )
+
+        self.batches = 0
+        self.failed_batches = 0
+
+    @staticmethod
+    def estimate_input_tokens(item: Any) -> int:
+        return estimate_tokens(orjson.dumps(item, default=str).decode('utf-8'))
+
+    def estimate_output_tokens(self, item: Any) -> int:
+        if not isinstance(item, dict):
+            return self.output_tokens_per_product
+
+        description = item.get('description') or ''
+        return self.output_tokens_per_product + estimate_tokens(str(description))
+
+    def pack(self, items: list[Any]) -> list[list[Any]]:
+        batches = []
+        batch = []
+        batch_input_tokens = 0
+        batch_output_tokens = 0
+
+        for item in items:
+            input_tokens = self.estimate_input_tokens(item)
+            output_tokens = self.estimate_output_tokens(item)
+
+            if batch and (
+                len(batch) >= self.item_limit
+                or batch_input_tokens + input_tokens > self.input_token_budget
+                or batch_output_tokens + output_tokens > self.output_token_budget
+            ):
+                batches.append(batch)
+                batch = []
+                batch_input_tokens = 0
+                batch_output_tokens = 0
+
+            batch.append(item)
+            batch_input_tokens += input_tokens
+            batch_output_tokens += output_tokens
+
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    def record(self, batch_size: int, succeeded: bool) -> None:
+        self.batches += 1
+
+        if not succeeded:
+            self.failed_batches += 1
+            if batch_size > 1:
+                self.item_limit = max(1, min(self.item_limit, batch_size) // 2)
+            return
+
+        if batch_size >= self.item_limit and self.item_limit < self.max_items:
+            self.item_limit += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'batches': self.batches,
+            'failed_batches': self.failed_batches,
+            'item_limit': self.item_limit,
+        }
@@ -1,30 +1,50 @@
 from __future__ import annotations
 
 import asyncio
+import random
+import re
+import time
+from configparser import SectionProxy
 from json import JSONDecodeError
-from typing import Any, Tuple, TypedDict
+from typing import Any, Awaitable, Callable, NotRequired, Tuple, TypedDict
 
 import loguru
 import orjson
-from google.generativeai import GenerativeModel as AIStudioGenerativeModel
-from google.ai.generativelanguage_v1 import Content as AIStudioContent
-from google.generativeai import GenerationConfig as AIStudioGenerationConfig
-from google.generativeai.types import Tool as AIStudioTool
-from vertexai.generative_models import (
-    GenerativeModel,
-    GenerationConfig,
-    Tool,
-    Content,
+from lib.CredentialPool import CredentialPool, PoolMember
+from lib.ExtractionCache import ExtractionCache
+from lib.GeminiBackend import (
+    RATE_LIMIT,
+    SERVER_ERROR,
+    AIStudioBackend,
+    FakeBackend,
+    GeminiBackend,
+    VertexBackend,
 )
+from lib.RateLimiter import RateLimiter
+from lib.RequestHedger import RequestHedger
 from utils.config import get_config
+from utils.decoding import function_call_args
 from utils.jinja import get_template_with_args
+from utils.prompt_encoding import (
+    PROMPT_INPUT_ENCODINGS,
+    encode_user_input,
+    measure_encodings,
+)
+from utils.telemetry import CallMetrics, get_telemetry
+from utils.text import estimate_tokens
 
 MAX_RETRIES = 3
+MAX_RATE_LIMIT_BACKOFF = 60
+
+_extraction_cache: ExtractionCache | None = None
+_rate_limiter: RateLimiter | None = None
+_extraction_client: GeminiExtractionClient | None = None
 
 class GeminiCallInput(TypedDict):
     prompt_jinja_template_path: str
     user_input: Any
     logger: loguru.Logger
+    store: NotRequired[str]
 
 
 tool_def = {
@@ -64,6 +84,7 @@ tool_def = {
                                 'valid_from',
                                 'valid_to',
                                 'required_purchase_amount',
+                                'source_item',
                             ],
                             'properties': {
                                 'brand_name': {
@@ -177,6 +198,56 @@ tool_def = {
                                     'nullable': False,
                                     'description': 'The date the deal is valid to. Please use the format `YYYY-MM-DD`',
                                 },
+                                'source_item': {
+                                    'type_': 'NUMBER',
+                                    'format': 'int32',
+                                    'nullable': False,
+                                    'description': 'The 0-based position of the input item this product was extracted from - every product extracted from the same item has the same value',
+                                },
+                            },
+                        },
+                    },
+                },
+            },
+        )
+    ]
+}
+
+PRODUCT_SCHEMA = tool_def['function_declarations'][0]['parameters'][
+    'properties'
+]['products']['items']
+OUTPUT_COLUMNS = list(PRODUCT_SCHEMA['properties'])
+
+# The positional contract asks for one array of values per product, in `OUTPUT_COLUMNS` order, instead of
+# repeating every property name for every product - most of the output tokens of the named contract.
+positional_tool_def = {
+    'function_declarations': [
+        dict(
+            name='extract_rows',
+            description='Provides the list of products that were extracted from the messages, one row of values per product',
+            parameters={
+                'type_': 'OBJECT',
+                'description': 'Root object that contains the rows of products that were extracted from the messages',
+                'required': [
+                    'rows',
+                ],
+                'properties': {
+                    'rows': {
+                        'description': (
+                            'One row per product. Every row is an array with exactly one value per column, in this order:\n'
+                            + '\n'.join(
+                                f'{i}. `{column}` ({PRODUCT_SCHEMA["properties"][column]["type_"].lower()}): '
+                                f'{PRODUCT_SCHEMA["properties"][column]["description"]}'
+                                for i, column in enumerate(OUTPUT_COLUMNS, 1)
+                            )
+                            + '\nUse an empty string for any value that does not apply. Numbers are written without currency symbols, booleans as `true` or `false`.'
+                        ),
+                        'type_': 'ARRAY',
+                        'items': {
+                            'type_': 'ARRAY',
+                            'description': f'The values of one product, in the order: {", ".join(OUTPUT_COLUMNS)}',
+                            'items': {
+                                'type_': 'STRING',
                             },
                         },
                     },
@@ -186,43 +257,167 @@ tool_def = {
     ]
 }
 
+OUTPUT_TOOL_DEFS = {
+    'named': tool_def,
+    'positional': positional_tool_def,
+}
+
+
+def expand_positional_rows(rows) -> list[dict[str, Any]]:
+    # the values are still strings here - they are typed by the `RowDecoder` like any other product
+    return [dict(zip(OUTPUT_COLUMNS, row)) for row in rows]
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+
+    if _rate_limiter is None:
+        default_section = get_config()['config']
+        _rate_limiter = RateLimiter(
+            requests_per_minute=default_section.getfloat('REQUESTS_PER_MINUTE', 0),
+            tokens_per_minute=default_section.getfloat('TOKENS_PER_MINUTE', 0),
+        )
+
+    return _rate_limiter
+
+
+def _get_retry_after(e: Exception, retry: int) -> float:
+    response = getattr(e, 'response', None)
+    retry_after_header = (
+        str(getattr(response, 'headers', {}).get('Retry-After', '')).strip()
+    )
+    if retry_after_header.isdigit():
+        return min(float(retry_after_header), MAX_RATE_LIMIT_BACKOFF)
+
+    # the google clients surface the server's RetryInfo in the error message
+    match = re.search(
+        r'retry in (\d+(?:\.\d+)?)\s*s', str(e), re.IGNORECASE
+    ) or re.search(r'retry_delay\s*\{\s*seconds:\s*(\d+)', str(e))
+    if match:
+        return min(float(match.group(1)), MAX_RATE_LIMIT_BACKOFF)
+
+    backoff = 5 * (2**retry)
+    return min(backoff + random.uniform(0, backoff * 0.1), MAX_RATE_LIMIT_BACKOFF)
+
+
+def _handle_rate_limit(
+    pool: CredentialPool, member: PoolMember, e: Exception, retry: int, logger
+):
+    retry_after = _get_retry_after(e, retry)
+    pool.eject(member, retry_after)
+
+    if pool.available_members():
+        logger.warning(
+            f'Gemini returned a 429 error for {member.name}. Ejecting it from the pool for {retry_after:.1f} seconds.'
+        )
+        return
+
+    logger.warning(
+        f'Gemini returned a 429 error. Pausing all Gemini calls for {retry_after:.1f} seconds.'
+    )
+    get_rate_limiter().penalize(retry_after)
+
+
+def _record_token_usage(content, estimated_tokens: int):
+    usage_metadata = getattr(content, 'usage_metadata', None)
+    prompt_token_count = getattr(usage_metadata, 'prompt_token_count', None)
+    if prompt_token_count:
+        get_rate_limiter().record_usage(estimated_tokens, prompt_token_count)
+
+
+async def _generate_with_hedging(
+    generate: Callable[[Any], Awaitable[Any]],
+    backend: GeminiBackend,
+    member: PoolMember,
+    pool: CredentialPool,
+    models: dict[str, Any],
+    hedger: RequestHedger | None,
+    estimated_tokens: int,
+    logger,
+):
+    if hedger is None:
+        return await generate(models[member.name])
+
+    async def hedge():
+        await get_rate_limiter().acquire(estimated_tokens)
+        hedge_member = await pool.acquire(exclude=member)
+        logger.debug(
+            f'Gemini call on {member.name} is slower than usual, hedging it on {hedge_member.name}'
+        )
+
+        try:
+            content = await generate(models[hedge_member.name])
+        except asyncio.CancelledError:
+            pool.release(hedge_member)
+            raise
+        except Exception as e:
+            pool.release(hedge_member, succeeded=False)
+            error = backend.classify_error(e)
+            if error == RATE_LIMIT:
+                pool.eject(hedge_member, _get_retry_after(e, 0))
+            elif error == SERVER_ERROR:
+                pool.eject(hedge_member)
+
+            raise e
+
+        pool.release(hedge_member)
+        _record_token_usage(content, estimated_tokens)
+        return content
+
+    return await hedger.run(
+        lambda: generate(models[member.name]),
+        hedge,
+        is_valid=lambda content: content is not None and bool(content.candidates),
+    )
+
 
-async def make_aistudio_gemini_call(
-    history: list[AIStudioContent],
+async def make_gemini_call(
+    backend: GeminiBackend,
+    prompt_text: str,
     logger,
-    model_name: str = 'gemini-1.0-pro-001',
-    **model_options,
+    pool: CredentialPool,
+    models: dict[str, Any],
+    estimated_tokens: int = 0,
+    hedger: RequestHedger | None = None,
+    metrics: CallMetrics | None = None,
 ):
-    # Initialize Gemini model
-    model = AIStudioGenerativeModel(model_name, tools=tool_def)
+    rate_limiter = get_rate_limiter()
+    metrics = metrics or CallMetrics()
 
     retry = 0
     content = None
     while retry < MAX_RETRIES:
+        queued_at = time.perf_counter()
+        await rate_limiter.acquire(estimated_tokens)
+        member = await pool.acquire()
+        metrics.queue_seconds += time.perf_counter() - queued_at
         try:
-            content = await model.generate_content_async(
-                contents=history,
-                tools=[AIStudioTool(**tool_def)],
-                generation_config=AIStudioGenerationConfig(**model_options),
-                safety_settings={
-                    'HARASSMENT': 'block_none',
-                    'HATE_SPEECH': 'block_none',
-                    'DANGEROUS': 'block_none',
-                    'SEXUAL': 'block_none',
-                },
+            content = await _generate_with_hedging(
+                lambda model: backend.generate(model, prompt_text),
+                backend,
+                member,
+                pool,
+                models,
+                hedger,
+                estimated_tokens,
+                logger,
             )
         except Exception as e:
-            if '429' in str(e):
-                logger.warning(
-                    f'Gemini returned a 429 error. Waiting 60 seconds before retrying.'
-                )
-                await asyncio.sleep(60)
+            pool.release(member, succeeded=False)
 
+            error = backend.classify_error(e)
+            if error == RATE_LIMIT:
+                _handle_rate_limit(pool, member, e, retry, logger)
             elif retry == MAX_RETRIES - 1:
                 logger.warning(
                     f'Gemini returned an invalid response on last retry. Error: {e}'
                 )
                 raise e
+            elif error == SERVER_ERROR:
+                ejected_for = pool.eject(member)
+                logger.warning(
+                    f'Gemini returned a server error for {member.name} (retry {retry}). Ejecting it from the pool for {ejected_for:.1f} seconds. Error: {e}'
+                )
             else:
                 logger.warning(
                     f'Gemini returned an invalid response (retry {retry}). Error: {e}'
@@ -230,55 +425,337 @@ async def make_aistudio_gemini_call(
                 await asyncio.sleep(3)
 
             retry += 1
+            metrics.retries += 1
             continue
 
+        pool.release(member)
+        _record_token_usage(content, estimated_tokens)
+        metrics.record_usage(content)
         break
 
     return content
 
 
-async def make_vertex_gemini_call(
-    history: list[Content],
-    logger,
-    model_name: str = 'gemini-1.0-pro-001',
-    **model_options,
-):
-    # Initialize Gemini model
-    model = GenerativeModel(model_name)
+class ModelTier:
+    def __init__(
+        self,
+        model_name: str,
+        models: dict[str, Any],
+        hedger: RequestHedger | None = None,
+    ) -> None:
+        self.model_name = model_name
+        self.models = models
+        self.hedger = hedger
+
+        self.calls = 0
+        self.successes = 0
+        self.escalations = 0
+        self.seconds = 0.0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'successes': self.successes,
+            'escalations': self.escalations,
+            'success_rate': round(self.successes / self.calls, 3) if self.calls else 0.0,
+            'avg_seconds': round(self.seconds / self.calls, 2) if self.calls else 0.0,
+            **(self.hedger.stats() if self.hedger else {}),
+        }
+
+
+class GeminiExtractionClient:
+    """
+    A long-lived extraction client, created once per run.
+
+    Parses the model settings from `config.ini` and builds the models, the compiled `extract_rows` tool
+    and the generation config up front, and renders each prompt template only once - so extracting a
+    batch only has to serialize the batch itself.
+
+    Batches are routed through `MODEL_TIERS` in order, starting with the fastest model. A batch is only
+    escalated to the next tier when its response is unusable: no products, a product without a brand or
+    product name, or less than `ESCALATION_MIN_COVERAGE` of the output columns filled in on average.
+
+    Every tier has one model per member of the credential pool (`GEMINI_POOL`, or the single configured
+    key or project), and each call goes to whichever member the pool schedules. The models, the calls and
+    the meaning of their errors come from one `GeminiBackend` - AI Studio, Vertex, or with
+    `EXTRACTION_BACKEND: fake` offline `FakeGeminiModel`s - picked when the client is created. With
+    `HEDGE_REQUESTS`, calls that run past the tier's observed p90 latency are duplicated on another member.
+
+    Args:
+        default_section (SectionProxy): The `[config]` section of `config.ini`.
+
+    """
+
+    def __init__(self, default_section: SectionProxy) -> None:
+        self.model_name = default_section.get('MODEL_NAME', 'gemini-1.0-pro-001')
+        model_names = orjson.loads(default_section.get('MODEL_TIERS', '[]')) or [
+            self.model_name
+        ]
+        self.escalation_min_coverage = default_section.getfloat(
+            'ESCALATION_MIN_COVERAGE', 0.3
+        )
+        self.model_options = {
+            'temperature': float(default_section.get('MODEL_TEMP', 1.0)),
+            'top_k': int(default_section.get('MODEL_TOP_K', 0)) or None,
+            'top_p': min(float(default_section.get('MODEL_TOP_P', 0)), 2) or None,
+            # the budget batches are packed against is also the model's hard limit
+            'max_output_tokens': default_section.getint('BATCH_OUTPUT_TOKEN_BUDGET', 2048),
+        }
+
+        self.output_schema = default_section.get('OUTPUT_SCHEMA', 'named')
+        if self.output_schema not in OUTPUT_TOOL_DEFS:
+            raise Exception(
+                f"Unknown OUTPUT_SCHEMA '{self.output_schema}' in config.ini - must be one of {', '.join(OUTPUT_TOOL_DEFS)}"
+            )
+
+        self.backend, members = _build_backend(
+            default_section, OUTPUT_TOOL_DEFS[self.output_schema], self.model_options
+        )
+        self.pool = CredentialPool(
+            members,
+            base_ejection_seconds=default_section.getfloat('POOL_EJECTION_SECONDS', 5),
+            max_ejection_seconds=MAX_RATE_LIMIT_BACKOFF,
+        )
+
+        hedge_requests = default_section.getboolean('HEDGE_REQUESTS', False)
+        hedge_max_percent = default_section.getfloat('HEDGE_MAX_PERCENT', 5)
+        hedge_percentile = default_section.getfloat('HEDGE_PERCENTILE', 0.9)
+
+        self.tiers = [
+            ModelTier(
+                model_name,
+                {
+                    member.name: self.backend.build_model(model_name, member)
+                    for member in self.pool.members
+                },
+                hedger=RequestHedger(hedge_max_percent, hedge_percentile)
+                if hedge_requests
+                else None,
+            )
+            for model_name in model_names
+        ]
+
+        self.input_encoding = default_section.get('PROMPT_INPUT_ENCODING', 'json')
+        if self.input_encoding not in PROMPT_INPUT_ENCODINGS:
+            raise Exception(
+                f"Unknown PROMPT_INPUT_ENCODING '{self.input_encoding}' in config.ini - must be one of {', '.join(PROMPT_INPUT_ENCODINGS)}"
+            )
+
+        self.measure_input_encodings = default_section.getboolean(
+            'MEASURE_PROMPT_ENCODINGS', False
+        )
+        self._encoding_tokens: dict[str, float] = {
+            encoding: 0.0 for encoding in PROMPT_INPUT_ENCODINGS
+        }
+        self._measured_items = 0
+
+        self._prompts: dict[tuple[str, bytes], str] = {}
+
+    async def get_prompt(
+        self, prompt_jinja_template_path: str, **template_arguments
+    ) -> str:
+        prompt_key = (
+            prompt_jinja_template_path,
+            orjson.dumps(template_arguments, option=orjson.OPT_SORT_KEYS, default=str),
+        )
+
+        if prompt_key not in self._prompts:
+            self._prompts[prompt_key] = await get_template_with_args(
+                prompt_jinja_template_path, **template_arguments
+            )
+
+        return self._prompts[prompt_key]
+
+    def get_cache_key(self, prompt_str: str, user_input: Any) -> str:
+        return ExtractionCache.make_key(
+            prompt_str,
+            user_input,
+            '|'.join(tier.model_name for tier in self.tiers),
+            input_encoding=self.input_encoding,
+            output_schema=self.output_schema,
+            backend=self.backend.name,
+            **self.model_options,
+        )
+
+    def serialize_user_input(self, user_input: Any, logger) -> str:
+        if self.measure_input_encodings:
+            tokens_per_item = measure_encodings(user_input)
+            item_count = len(user_input) if isinstance(user_input, list) else 1
+            for encoding, tokens in tokens_per_item.items():
+                self._encoding_tokens[encoding] += tokens * item_count
+
+            self._measured_items += item_count
+            logger.debug(f'Prompt input tokens per item: {tokens_per_item}')
+
+        return encode_user_input(user_input, self.input_encoding)
+
+    def encoding_stats(self) -> dict[str, float]:
+        if not self._measured_items:
+            return {}
+
+        return {
+            encoding: round(tokens / self._measured_items, 1)
+            for encoding, tokens in self._encoding_tokens.items()
+        }
+
+    def is_acceptable(self, products: list[dict[str, Any]]) -> bool:
+        if not products:
+            return False
+
+        if any(
+            not product.get('brand_name') and not product.get('product_name')
+            for product in products
+        ):
+            return False
+
+        coverage = sum(
+            sum(product.get(column) not in (None, '', 'N/A') for column in OUTPUT_COLUMNS)
+            / len(OUTPUT_COLUMNS)
+            for product in products
+        ) / len(products)
+        return coverage >= self.escalation_min_coverage
+
+    def record_tier_result(
+        self, tier: int, products: list[dict[str, Any]], seconds: float
+    ) -> bool:
+        model_tier = self.tiers[tier]
+        model_tier.calls += 1
+        model_tier.seconds += seconds
+
+        if self.is_acceptable(products):
+            model_tier.successes += 1
+            return True
+
+        if tier < len(self.tiers) - 1:
+            model_tier.escalations += 1
+
+        return False
+
+    def tier_stats(self) -> dict[str, dict[str, Any]]:
+        return {tier.model_name: tier.stats() for tier in self.tiers}
+
+    async def generate(
+        self,
+        prompt_str: str,
+        user_input_text: str,
+        logger,
+        tier: int = 0,
+        metrics: CallMetrics | None = None,
+    ):
+        prompt_text = f'{prompt_str}\n{user_input_text}'
 
-    retry = 0
-    content = None
-    while retry < MAX_RETRIES:
         try:
-            content = await model.generate_content_async(
-                contents=history,
-                generation_config=GenerationConfig(**model_options),
-                tools=[Tool.from_dict(tool_def)],
+            return await make_gemini_call(
+                self.backend,
+                prompt_text,
+                logger=logger,
+                pool=self.pool,
+                models=self.tiers[tier].models,
+                estimated_tokens=estimate_tokens(prompt_text),
+                hedger=self.tiers[tier].hedger,
+                metrics=metrics,
             )
         except Exception as e:
-            if '429' in str(e):
-                logger.warning(
-                    f'Gemini returned a 429 error. Waiting 60 seconds before retrying.'
-                )
-                await asyncio.sleep(60)
+            logger.error(e)
+            return None
+
+
+def _build_pool_member(member_config: dict[str, Any]) -> PoolMember:
+    credentials = {
+        key: value
+        for key, value in member_config.items()
+        if key not in ('name', 'weight')
+    }
+
+    if 'api_key' in credentials:
+        name = f'key-...{str(credentials["api_key"])[-4:]}'
+    elif 'project_id' in credentials:
+        name = f'{credentials["project_id"]}/{credentials.get("region") or "default"}'
+    else:
+        raise Exception(
+            'Every GEMINI_POOL member in config.ini needs an "api_key" or a "project_id"'
+        )
 
-            elif retry == MAX_RETRIES - 1:
-                logger.warning(
-                    f'Gemini returned an invalid response on last retry. Error: {e}'
-                )
-                raise e
-            else:
-                logger.warning(
-                    f'Gemini returned an invalid response (retry {retry}). Error: {e}'
-                )
-                await asyncio.sleep(3)
+    return PoolMember(
+        member_config.get('name') or name,
+        weight=member_config.get('weight', 1),
+        **credentials,
+    )
 
-            retry += 1
-            continue
 
-        break
+def _build_backend(
+    default_section: SectionProxy, output_tool_def: dict, model_options: dict[str, Any]
+) -> tuple[GeminiBackend, list[PoolMember]]:
+    """
+    Picks the backend the config asks for, with the members of its credential pool.
+    """
+    extraction_backend = default_section.get('EXTRACTION_BACKEND', 'gemini').lower()
+    if extraction_backend not in ('gemini', 'fake'):
+        raise Exception(
+            f"Unknown EXTRACTION_BACKEND '{extraction_backend}' in config.ini - must be one of gemini, fake"
+        )
+
+    if extraction_backend == 'fake':
+        backend = FakeBackend(
+            OUTPUT_COLUMNS,
+            positional=output_tool_def is positional_tool_def,
+            seed=default_section.get('FAKE_SEED', '0'),
+            latency_median=default_section.getfloat('FAKE_LATENCY_MEDIAN', 1.5),
+            latency_sigma=default_section.getfloat('FAKE_LATENCY_SIGMA', 0.5),
+            rate_limit_rate=default_section.getfloat('FAKE_RATE_LIMIT_RATE', 0),
+            server_error_rate=default_section.getfloat('FAKE_SERVER_ERROR_RATE', 0),
+            empty_rate=default_section.getfloat('FAKE_EMPTY_RATE', 0),
+            malformed_rate=default_section.getfloat('FAKE_MALFORMED_RATE', 0),
+            truncated_rate=default_section.getfloat('FAKE_TRUNCATED_RATE', 0),
+        )
+        members = [
+            PoolMember(f'fake-{i + 1}')
+            for i in range(max(default_section.getint('FAKE_POOL_SIZE', 1), 1))
+        ]
+        return backend, members
+
+    pool_config = orjson.loads(default_section.get('GEMINI_POOL', '[]'))
+    if pool_config:
+        members = [_build_pool_member(member) for member in pool_config]
+        backends = {
+            'aistudio' if 'api_key' in member.credentials else 'vertex'
+            for member in members
+        }
+        if len(backends) > 1:
+            raise Exception(
+                'GEMINI_POOL members in config.ini must either all use API keys or all use project IDs'
+            )
+
+        backend_name = backends.pop()
+    elif 'GOOGLE_API_KEY' in default_section:
+        backend_name = 'aistudio'
+        members = [PoolMember('default', api_key=default_section['GOOGLE_API_KEY'])]
+    elif 'GOOGLE_PROJECT_ID' in default_section:
+        backend_name = 'vertex'
+        members = [
+            PoolMember(
+                'default',
+                project_id=default_section['GOOGLE_PROJECT_ID'],
+                region=default_section.get('GOOGLE_REGION'),
+                credentials_file=default_section.get('GOOGLE_CREDENTIALS_FILE'),
+            )
+        ]
+    else:
+        raise Exception('No Google API key or project ID found in config.ini')
+
+    if backend_name == 'aistudio':
+        return AIStudioBackend(output_tool_def, model_options), members
+
+    return VertexBackend(output_tool_def, model_options), members
 
-    return content
+
+def get_extraction_client() -> GeminiExtractionClient:
+    global _extraction_client
+
+    if _extraction_client is None:
+        _extraction_client = GeminiExtractionClient(get_config()['config'])
+
+    return _extraction_client
 
 
 async def extract_products_using_gemini(
@@ -289,58 +766,95 @@ async def extract_products_using_gemini(
     user_input = args['user_input']
     logger = args['logger']
 
-    config = get_config()
-    default_section = config['config']
-
-    (
-        model_name,
-        model_temp,
-        model_top_k,
-        model_top_p,
-        prompt_str,
-        prompt_input,
-    ) = await setup_gemini_prompt(
-        default_section=default_section,
-        template_arguments=template_arguments,
-        prompt_jinja_template_path=prompt_jinja_template_path,
-        user_input_text=user_input,
+    client = get_extraction_client()
+    prompt_str = await client.get_prompt(
+        prompt_jinja_template_path, **template_arguments
     )
 
-    gemini_response = None
-    if 'GOOGLE_API_KEY' in default_section:
-        gemini_response = await handle_ai_studio_generate(
-            logger=logger,
-            model_name=model_name,
-            model_temp=model_temp,
-            model_top_k=model_top_k,
-            model_top_p=model_top_p,
-            prompt_str=prompt_str,
-            user_input_text=prompt_input,
-        )
+    prompt_input = client.serialize_user_input(user_input, logger)
 
-    elif 'GOOGLE_PROJECT_ID' in default_section:
-        gemini_response = await handle_vertex_ai_generate(
-            logger=logger,
-            model_name=model_name,
-            model_temp=model_temp,
-            model_top_k=model_top_k,
-            model_top_p=model_top_p,
-            prompt_str=prompt_str,
-            user_input_text=prompt_input,
+    telemetry = get_telemetry()
+
+    items = []
+    for tier in range(len(client.tiers)):
+        metrics = CallMetrics()
+        started_at = time.perf_counter()
+        gemini_response = await client.generate(
+            prompt_str, prompt_input, logger, tier=tier, metrics=metrics
         )
 
-    try:
+        outcome = 'ok'
+        try:
+            items = (
+                handle_gemini_response(gemini_response)
+                if gemini_response is not None
+                else []
+            )
+        except Exception as e:
+            logger.error(e)
+            items = []
+            outcome = 'error'
+
         if gemini_response is None:
-            return [], user_input
+            outcome = 'error'
+
+        wall_seconds = time.perf_counter() - started_at
+        accepted = client.record_tier_result(tier, items, wall_seconds)
+        if outcome == 'ok' and not accepted:
+            outcome = 'empty' if not items else 'low_quality'
+
+        telemetry.record(
+            store=args.get('store') or 'unknown',
+            template=prompt_jinja_template_path,
+            model=client.tiers[tier].model_name,
+            wall_seconds=wall_seconds,
+            metrics=metrics,
+            rows=len(items),
+            outcome=outcome,
+        )
+
+        if accepted:
+            break
 
-        items = handle_gemini_response(gemini_response)
-    except Exception as e:
-        logger.error(e)
-        return [], user_input
+        if tier < len(client.tiers) - 1:
+            logger.debug(
+                f'Escalating batch from {client.tiers[tier].model_name} to {client.tiers[tier + 1].model_name}'
+            )
 
     return items, user_input
 
 
+def get_extraction_cache() -> ExtractionCache:
+    global _extraction_cache
+
+    if _extraction_cache is None:
+        default_section = get_config()['config']
+        _extraction_cache = ExtractionCache(
+            path=default_section.get('CACHE_PATH', ExtractionCache.DEFAULT_PATH),
+            ttl_seconds=default_section.getfloat('CACHE_TTL_HOURS', 24 * 7) * 60 * 60,
+            max_entries=default_section.getint(
+                'CACHE_MAX_ENTRIES', ExtractionCache.DEFAULT_MAX_ENTRIES
+            ),
+            bypass=default_section.getboolean('CACHE_BYPASS', False),
+        )
+        _extraction_cache.evict()
+
+    return _extraction_cache
+
+
+async def get_extraction_cache_key(
+    prompt_jinja_template_path: str,
+    user_input: Any,
+    **template_arguments,
+) -> str:
+    client = get_extraction_client()
+    prompt_str = await client.get_prompt(
+        prompt_jinja_template_path, **template_arguments
+    )
+
+    return client.get_cache_key(prompt_str, user_input)
+
+
 def handle_gemini_response(gemini_response):
     if (
         gemini_response is None
@@ -353,122 +867,17 @@ def handle_gemini_response(gemini_response):
     ):
         raise KeyError('Invalid response from Gemini')
 
+    finish_reason = getattr(gemini_response.candidates[0], 'finish_reason', None)
+    if getattr(finish_reason, 'name', str(finish_reason)) == 'MAX_TOKENS':
+        raise ValueError('Gemini response was truncated at the output token limit')
+
     function_call = (
         gemini_response.candidates[0].content.parts[0].function_call
     )
 
-    arguments = function_call.args
-
-    if arguments is None or 'products' not in arguments:
-        return []
-
-    try:
-        items = [dict(x) for x in arguments['products']]
-    except Exception as e:
-        raise e
-
-    return items
-
-
-async def handle_vertex_ai_generate(
-    logger,
-    model_name,
-    model_temp,
-    model_top_k,
-    model_top_p,
-    prompt_str,
-    user_input_text,
-):
-    history = [
-        Content.from_dict(
-            {
-                'role': 'user',
-                'parts': [{'text': f'{prompt_str}\n{user_input_text}'}],
-            }
-        )
-    ]
-
-    try:
-        gemini_response = await make_vertex_gemini_call(
-            history,
-            model_name=model_name,
-            logger=logger,
-            temperature=model_temp,
-            top_k=model_top_k,
-            top_p=model_top_p,
-        )
-    except Exception as e:
-        logger.error(e)
-        return None
-
-    return gemini_response
+    arguments = function_call_args(function_call)
 
+    if 'rows' in arguments:
+        return expand_positional_rows(arguments['rows'] or [])
 
-async def handle_ai_studio_generate(
-    logger,
-    model_name,
-    model_temp,
-    model_top_k,
-    model_top_p,
-    prompt_str,
-    user_input_text,
-):
-    history = [
-        dict(
-            role='user',
-            parts=[{'text': f'{prompt_str}\n{user_input_text}'}],
-        )
-    ]
-
-    try:
-        # noinspection PyTypeChecker
-        gemini_response = await make_aistudio_gemini_call(
-            history,
-            model_name=model_name,
-            logger=logger,
-            temperature=model_temp,
-            top_k=model_top_k,
-            top_p=model_top_p,
-        )
-    except Exception as e:
-        logger.error(e)
-        return None
-
-    return gemini_response
-
-
-async def setup_gemini_prompt(
-    default_section,
-    template_arguments,
-    prompt_jinja_template_path,
-    user_input_text,
-):
-    if (
-        'GOOGLE_API_KEY' not in default_section
-        and 'GOOGLE_PROJECT_ID' not in default_section
-    ):
-        raise Exception('No Google API key or project ID found in config.ini')
-
-    user_input_text = (
-        str(user_input_text)
-        if not isinstance(user_input_text, str)
-        else f'```json\n{orjson.dumps(user_input_text, option=orjson.OPT_INDENT_2 + orjson.OPT_SORT_KEYS).decode("latin-1")}```'
-    )
-
-    prompt_str = await get_template_with_args(
-        prompt_jinja_template_path, **template_arguments
-    )
-
-    model_name = default_section.get('MODEL_NAME', 'gemini-1.0-pro-001')
-    model_temp = float(default_section.get('MODEL_TEMP', 1.0))
-    model_top_k = int(default_section.get('MODEL_TOP_K', 0)) or None
-    model_top_p = min(float(default_section.get('MODEL_TOP_P', 0)), 2) or None
-
-    return (
-        model_name,
-        model_temp,
-        model_top_k,
-        model_top_p,
-        prompt_str,
-        user_input_text,
-    )
+    return list(arguments.get('products') or [])
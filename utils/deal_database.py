@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from lib.DealDatabase import DealDatabase
+from lib.DealHistory import DealHistory
+from lib.OutputWriter import OutputWriter
+from stores.lib.constants import BOOLEAN_HEADERS, DATE_HEADERS, HEADERS
+from utils.config import get_config
+from utils.executors import get_thread_pool
+
+_deal_database: DealDatabase | None = None
+_output_writer: OutputWriter | None = None
+_deal_history: DealHistory | None = None
+
+
+def get_deal_database() -> DealDatabase:
+    global _deal_database
+
+    if _deal_database is None:
+        default_section = get_config()['config']
+        _deal_database = DealDatabase(
+            path=default_section.get('DEAL_DATABASE_PATH', DealDatabase.DEFAULT_PATH),
+            headers=HEADERS,
+            date_columns=DATE_HEADERS,
+            boolean_columns=BOOLEAN_HEADERS,
+        )
+
+    return _deal_database
+
+
+def get_deal_history() -> DealHistory | None:
+    global _deal_history
+
+    default_section = get_config()['config']
+    if _deal_history is None and default_section.getboolean('DEAL_HISTORY', True):
+        _deal_history = DealHistory(
+            default_section.get('DEAL_HISTORY_PATH', DealHistory.DEFAULT_PATH)
+        )
+
+    return _deal_history
+
+
+def get_output_writer() -> OutputWriter:
+    global _output_writer
+
+    if _output_writer is None:
+        default_section = get_config()['config']
+        _output_writer = OutputWriter(
+            get_deal_database(),
+            max_queued_batches=default_section.getint('OUTPUT_QUEUE_SIZE', 64),
+            max_commit_rows=default_section.getint('OUTPUT_COMMIT_ROWS', 1000),
+            executor=get_thread_pool(),
+            deal_history=get_deal_history(),
+        )
+
+    return _output_writer
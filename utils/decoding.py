@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import re
+from datetime import date, datetime
+from typing import Any, Callable, Iterable
+
+import dateutil.parser
+
+EMPTY_STRINGS = frozenset(['', 'n/a', 'na', 'none', 'null', 'unknown'])
+TRUE_STRINGS = frozenset(['true', 'yes', 'y', '1'])
+
+# ".99" and "$.99" are common ways to write prices
+NUMBER = re.compile(r'-?(?:\d+(?:\.\d*)?|\.\d+)')
+
+
+def function_call_args(function_call) -> dict[str, Any]:
+    """
+    Converts the arguments of a Gemini function call into plain Python values in one go, instead of
+    walking the proto `MapComposite` / `RepeatedComposite` wrappers item by item.
+    """
+    try:
+        # proto-plus messages expose `to_dict` as a classmethod, the Vertex wrappers as a method - both
+        # accept being called this way
+        payload = type(function_call).to_dict(function_call)
+    except (AttributeError, TypeError):
+        return _to_python(function_call.args)
+
+    return payload.get('args') or {}
+
+
+def _to_python(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+
+    if hasattr(value, 'items'):
+        return {k: _to_python(v) for k, v in value.items()}
+
+    return [_to_python(v) for v in value]
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or (
+        isinstance(value, str) and value.strip().lower() in EMPTY_STRINGS
+    )
+
+
+def _coerce_string(value: Any) -> Any:
+    if _is_empty(value):
+        return None
+
+    # the model sometimes double-escapes non-ascii characters (`é`)
+    return str(value).strip().encode('latin1', 'ignore').decode('unicode_escape', 'ignore')
+
+
+def _coerce_float(value: Any) -> Any:
+    if _is_empty(value) or isinstance(value, bool):
+        return None
+
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    match = NUMBER.search(str(value).replace(',', ''))
+    return float(match.group()) if match else _coerce_string(value)
+
+
+def _coerce_int(value: Any) -> Any:
+    number = _coerce_float(value)
+    if isinstance(number, float) and number.is_integer():
+        return int(number)
+
+    return number
+
+
+def _coerce_boolean(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+
+    return not _is_empty(value) and str(value).strip().lower() in TRUE_STRINGS
+
+
+def _coerce_date(value: Any) -> Any:
+    if _is_empty(value):
+        return None
+
+    if isinstance(value, datetime):
+        return value.date()
+
+    if isinstance(value, date):
+        return value
+
+    text = str(value).strip()
+    try:
+        return date.fromisoformat(text[:10])
+    except ValueError:
+        pass
+
+    try:
+        return dateutil.parser.parse(text).date()
+    except (ValueError, OverflowError):
+        return _coerce_string(value)
+
+
+def _compile_coercer(schema: dict[str, Any]) -> Callable[[Any], Any]:
+    value_type = schema.get('type_')
+    if value_type == 'BOOLEAN':
+        return _coerce_boolean
+
+    if value_type == 'NUMBER':
+        return _coerce_int if schema.get('format', '').startswith('int') else _coerce_float
+
+    if 'enum' in schema:
+        allowed = frozenset(schema['enum'])
+        fallback = 'OTHER' if 'OTHER' in allowed else None
+
+        def coerce_enum(value: Any) -> Any:
+            value = _coerce_string(value)
+            if value is None:
+                return None
+
+            value = value.upper().replace(' ', '_')
+            return value if value in allowed else fallback
+
+        return coerce_enum
+
+    return _coerce_string
+
+
+class RowDecoder:
+    """
+    Turns extracted products into worksheet rows in a single pass per batch.
+
+    The coercion for every column is compiled once from the `extract_rows` schema, so decoding a batch is
+    one loop over its products: values are converted to real numbers, booleans and dates, enums are
+    validated, schema property names are mapped onto the worksheet headers, multi-brand products
+    (`Coca-Cola | Pepsi`) are split into one row per brand, and empty values become `N/A`.
+
+    Args:
+        properties (dict): The `properties` of the product schema the model fills in.
+        columns (list[str]): The worksheet headers, in order.
+        aliases (dict[str, str], optional): Schema property names that map to a differently named header.
+        date_columns (Iterable[str], optional): Headers that hold dates.
+
+    """
+
+    def __init__(
+        self,
+        properties: dict[str, dict[str, Any]],
+        columns: list[str],
+        aliases: dict[str, str] | None = None,
+        date_columns: Iterable[str] = (),
+    ) -> None:
+        self.columns = list(columns)
+        schema_by_column = {
+            (aliases or {}).get(name, name): schema
+            for name, schema in properties.items()
+        }
+        date_columns = set(date_columns)
+
+        self._sources: dict[str, tuple[str, ...]] = {
+            column: (column,)
+            + tuple(name for name, alias in (aliases or {}).items() if alias == column)
+            for column in self.columns
+        }
+        self._coercers: list[tuple[str, Callable[[Any], Any]]] = [
+            (
+                column,
+                _coerce_date
+                if column in date_columns
+                else _compile_coercer(schema_by_column.get(column, {})),
+            )
+            for column in self.columns
+        ]
+
+    def decode_row(self, product: dict[str, Any]) -> dict[str, Any]:
+        row = {}
+        for column, coerce in self._coercers:
+            value = None
+            for source in self._sources[column]:
+                value = product.get(source)
+                if value is not None:
+                    break
+
+            value = coerce(value)
+            row[column] = 'N/A' if value is None else value
+
+        return row
+
+    def decode(self, products: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        rows = []
+        for product in products:
+            row = self.decode_row(product)
+
+            brand_name = row.get('brand_name')
+            if isinstance(brand_name, str) and '|' in brand_name:
+                rows.extend(
+                    {**row, 'brand_name': brand.strip()}
+                    for brand in brand_name.split('|')
+                    if brand.strip()
+                )
+                continue
+
+            rows.append(row)
+
+        return rows
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from collections import defaultdict
+from typing import Any
+
+from lib.ExtractionCache import ExtractionCache
+
+# Fields that differ between banners running the same circular - they are not sent through the dedup key,
+# and every store keeps its own values when shared products are fanned back out
+STORE_DATE_FIELDS = {
+    'valid_from': 'valid_from',
+    'valid_to': 'valid_to',
+    'expiration_date': 'valid_to',
+}
+
+_deduplicator: ExtractionDeduplicator | None = None
+
+
+class ExtractionDeduplicator:
+    """
+    Run-wide deduplication of queued items across every store in the process.
+
+    Banners that share a national circular queue largely identical items. The first store to queue an
+    item claims it and extracts it as usual; every other store that queues the same item (ignoring its
+    validity dates) waits for that extraction instead and writes the shared products with its own dates.
+    Products are attributed to their input item with the `source_item` index of the `extract_rows`
+    schema. When a batch can't be attributed, or the claiming store fails to extract an item, the
+    waiting stores fall back to extracting it themselves.
+    """
+
+    def __init__(self) -> None:
+        self._results: dict[str, asyncio.Future] = {}
+
+        self.claimed = 0
+        self.shared = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def make_key(template: str, item: Any) -> str:
+        if isinstance(item, dict):
+            item = {k: v for k, v in item.items() if k not in STORE_DATE_FIELDS}
+
+        digest = hashlib.sha256(template.encode('utf-8'))
+        digest.update(ExtractionCache.normalize_user_input(item))
+        return digest.hexdigest()
+
+    def claim(
+        self, template: str, items: list[Any]
+    ) -> tuple[list[Any], list[tuple[Any, asyncio.Future]], set[str]]:
+        """
+        Splits `items` into the ones this store has to extract, the ones it can wait on, and the keys of
+        the claimed items that the store has to `resolve` or `fail`.
+        """
+        owned = []
+        waiting = []
+        owned_keys = set()
+        for item in items:
+            key = self.make_key(template, item)
+            future = self._results.get(key)
+            if future is not None:
+                waiting.append((item, future))
+                self.shared += 1
+                continue
+
+            self._results[key] = asyncio.get_running_loop().create_future()
+            owned.append(item)
+            owned_keys.add(key)
+            self.claimed += 1
+
+        return owned, waiting, owned_keys
+
+    def resolve(self, key: str, products: list[dict[str, Any]]) -> None:
+        future = self._results.get(key)
+        if future is not None and not future.done():
+            future.set_result(products)
+
+    def fail(self, key: str) -> None:
+        # the next store to queue the item claims it again
+        future = self._results.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def share_products(
+        self,
+        template: str,
+        items: list[Any],
+        products: list[dict[str, Any]],
+        owned_keys: set[str],
+    ) -> None:
+        """
+        Resolves the claimed items of an extracted batch with the products attributed to each of them.
+        """
+        products_by_item = defaultdict(list)
+        attributable = True
+        for product in products:
+            try:
+                index = int(float(product.get('source_item')))
+            except (TypeError, ValueError):
+                attributable = False
+                break
+
+            if not 0 <= index < len(items):
+                attributable = False
+                break
+
+            products_by_item[index].append(product)
+
+        for index, item in enumerate(items):
+            key = self.make_key(template, item)
+            if key not in owned_keys:
+                continue
+
+            owned_keys.discard(key)
+            if attributable:
+                self.resolve(key, products_by_item[index])
+            else:
+                self.fail(key)
+
+    @staticmethod
+    def with_store_dates(item: Any, products: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        if not isinstance(item, dict):
+            return products
+
+        dates = {
+            field: item[key]
+            for key, field in STORE_DATE_FIELDS.items()
+            if item.get(key) not in (None, '', 'N/A')
+        }
+        return [{**product, **dates} for product in products]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'claimed': self.claimed,
+            'shared': self.shared,
+            'fallbacks': self.fallbacks,
+        }
+
+
+def get_deduplicator() -> ExtractionDeduplicator:
+    global _deduplicator
+
+    if _deduplicator is None:
+        _deduplicator = ExtractionDeduplicator()
+
+    return _deduplicator
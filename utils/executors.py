@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from utils.config import get_config
+
+T = TypeVar('T')
+
+_thread_pool: ThreadPoolExecutor | None = None
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """
+    The pool for blocking I/O - synchronous HTTP clients, SQLite and workbook files.
+    """
+    global _thread_pool
+
+    if _thread_pool is None:
+        default_section = get_config()['config']
+        _thread_pool = ThreadPoolExecutor(
+            max_workers=default_section.getint(
+                'THREAD_POOL_WORKERS', min(32, (os.cpu_count() or 1) + 4)
+            ),
+            thread_name_prefix='coupcoup-io',
+        )
+
+    return _thread_pool
+
+
+def get_process_pool() -> ProcessPoolExecutor | None:
+    """
+    The pool for CPU-bound work - HTML parsing and fuzzy matching. `None` when `PROCESS_POOL_WORKERS` is 0,
+    in which case that work runs on the thread pool instead.
+    """
+    global _process_pool
+
+    if _process_pool is None:
+        default_section = get_config()['config']
+        max_workers = default_section.getint('PROCESS_POOL_WORKERS', os.cpu_count() or 1)
+        if max_workers <= 0:
+            return None
+
+        # `spawn` - forking a process that runs an event loop and a thread pool isn't safe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+
+    return _process_pool
+
+
+async def run_in_thread(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await asyncio.get_running_loop().run_in_executor(
+        get_thread_pool(), functools.partial(fn, *args, **kwargs)
+    )
+
+
+async def run_in_process(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Runs `fn` in the process pool. `fn` has to be a module-level function, and its arguments and result
+    have to be picklable.
+    """
+    executor = get_process_pool() or get_thread_pool()
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(fn, *args, **kwargs)
+    )
+
+
+def shutdown_executors() -> None:
+    global _thread_pool, _process_pool
+
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=True, cancel_futures=True)
+        _thread_pool = None
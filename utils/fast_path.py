@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import re
+from collections import Counter
+from typing import Any, Callable
+
+from stores.lib.constants import HEADERS
+
+PRICE = r'\$?\s*(\d+(?:\.\d{1,2})?)'
+# an amount with its currency - "$1.50", "$.99" or "50¢"; bare numbers are as often points or percentages
+AMOUNT = r'(?:\$\s*(\d+(?:\.\d{1,2})?|\.\d{1,2})|(\d{1,2})\s*¢)'
+
+# Wording that changes the meaning of an otherwise simple deal - these items always go to Gemini
+AMBIGUOUS_TEXT = re.compile(
+    r'\b(mix\s*(?:&|and)\s*match|when you buy|with purchase|spend|excludes?|select(?:ed)?|assorted|'
+    r'varieties|or more|per\s*(?:lb|pound|oz|kg))\b|\bor\b|[,|]',
+    re.IGNORECASE,
+)
+STORE_CARD_TEXT = re.compile(
+    r'\b(card|digital|rewards|loyalty|members?|clip)\b', re.IGNORECASE
+)
+
+
+def _number(value: Any) -> float | None:
+    if value is None or isinstance(value, bool):
+        return None
+
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    match = re.fullmatch(r'\s*\$?\s*(\d+(?:\.\d+)?)\s*', str(value))
+    return float(match.group(1)) if match else None
+
+
+def _multi_price(text: str, item: dict) -> dict | None:
+    # "2/$5", "2 for $5"
+    match = re.fullmatch(rf'\s*(\d+)\s*(?:/|for)\s*{PRICE}\s*', text, re.IGNORECASE)
+    if not match or int(match.group(1)) < 2:
+        return None
+
+    quantity = int(match.group(1))
+    return {
+        'deal_type': 'SALE_PRICE',
+        'required_purchase_quantity': quantity,
+        'quantity_at_sale_price': quantity,
+        'sale_price': float(match.group(2)),
+    }
+
+
+def _buy_x_get_y_free(text: str, item: dict) -> dict | None:
+    # "BOGO", "Buy 1 Get 1 Free", "Buy One Get One Free"
+    if re.fullmatch(r'\s*(bogo(?: free)?|buy one,? get one free)\s*!?\s*', text, re.IGNORECASE):
+        return {
+            'deal_type': 'BUY_X_GET_Y_FREE',
+            'required_purchase_quantity': 1,
+            'quantity_get_free': 1,
+        }
+
+    match = re.fullmatch(r'\s*buy\s*(\d+),?\s*get\s*(\d+)\s*free\s*!?\s*', text, re.IGNORECASE)
+    if not match:
+        return None
+
+    return {
+        'deal_type': 'BUY_X_GET_Y_FREE',
+        'required_purchase_quantity': int(match.group(1)),
+        'quantity_get_free': int(match.group(2)),
+    }
+
+
+def _amount_off(text: str, item: dict) -> dict | None:
+    # "$1.00 off 2", "Save $1.50", "$2 off", "50¢ off"
+    match = re.fullmatch(
+        rf'\s*(?:save\s*)?{AMOUNT}\s*(?:off)?\s*(?:(\d+))?\s*!?\s*', text, re.IGNORECASE
+    )
+    if not match or 'off' not in text.lower() and 'save' not in text.lower():
+        return None
+
+    amount_off = float(match.group(1)) if match.group(1) else int(match.group(2)) / 100
+    quantity = int(match.group(3) or 1)
+    fields = {
+        'deal_type': 'AMOUNT_OFF',
+        'sale_amount_off': amount_off,
+        'required_purchase_quantity': quantity,
+        'quantity_at_amount_off': quantity,
+    }
+
+    # Flipp items carry the shelf price next to the savings - keep it, or leave the item to the model
+    # when the amount can't simply be taken off it
+    price = _number(item.get('price_text'))
+    if price is not None:
+        if quantity != 1 or amount_off >= price:
+            return None
+
+        fields.update({'price': price, 'sale_price': round(price - amount_off, 2)})
+
+    return fields
+
+
+def _percent_off(text: str, item: dict) -> dict | None:
+    # "Save 30%", "30% off"
+    match = re.fullmatch(
+        r'\s*(?:save\s*)?(\d{1,2}|100)\s*%\s*(?:off)?\s*!?\s*', text, re.IGNORECASE
+    )
+    if not match:
+        return None
+
+    return {
+        'deal_type': 'PERCENT_OFF',
+        'sale_percent_off': int(match.group(1)),
+        'required_purchase_quantity': 1,
+        'quantity_at_percent_off': 1,
+    }
+
+
+def _coupon_amount_off(text: str, item: dict) -> dict | None:
+    # Coupon sources that already split out the amount off and the quantity - the text, if any, has to agree.
+    # Kroger coupons only have a free-text description and no product name, so they always go to Gemini
+    amount_off = _number(item.get('sale_amount_off'))
+    quantity = _number(item.get('required_purchase_quantity')) or 1
+    if not amount_off or text and not re.search(
+        rf'\${amount_off:g}(?:\.00?)?\b|\${amount_off:.2f}', text
+    ):
+        return None
+
+    return {
+        'deal_type': 'AMOUNT_OFF',
+        'sale_amount_off': amount_off,
+        'required_purchase_quantity': int(quantity),
+        'quantity_at_amount_off': int(quantity),
+    }
+
+
+def _sale_price(text: str, item: dict) -> dict | None:
+    # A plain price with no deal wording at all
+    price = _number(item.get('price_text'))
+    if price is None or text:
+        return None
+
+    return {
+        'deal_type': 'SALE_PRICE',
+        'required_purchase_quantity': 1,
+        'quantity_at_sale_price': 1,
+        'sale_price': price,
+        'price': _number(item.get('original_price')) or price,
+    }
+
+
+# Rules that parse the deal text itself
+TEXT_RULES: dict[str, Callable[[str, dict], dict | None]] = {
+    'multi_price': _multi_price,
+    'buy_x_get_y_free': _buy_x_get_y_free,
+    'amount_off': _amount_off,
+    'percent_off': _percent_off,
+}
+
+# Rules that rely on fields the source already structured - only tried when no text rule matches
+FIELD_RULES: dict[str, Callable[[str, dict], dict | None]] = {
+    'coupon_amount_off': _coupon_amount_off,
+    'sale_price': _sale_price,
+}
+
+
+class FastPathExtractor:
+    """
+    Deterministically extracts simple deals ("2/$5", "BOGO", "$1.00 off 2", "Save 30%", plain prices)
+    straight into `HEADERS` rows, so only ambiguous items have to go through Gemini.
+
+    An item is only handled here when it names exactly one brand and a product, its deal text matches
+    exactly one rule in full, and none of the wording that usually changes a deal's meaning is present.
+    Everything else is left for the model.
+    """
+
+    def __init__(self) -> None:
+        self.stats: Counter[str] = Counter()
+
+    @staticmethod
+    def _get_deal_text(item: dict) -> str:
+        if item.get('raw_text'):
+            return str(item['raw_text']).strip()
+
+        # Flipp items carry the deal in the sale story, and multi-buys in the price text ("2/$5")
+        parts = [item.get('sale_story'), item.get('pre_price_text') or item.get('pre_price')]
+        if _number(item.get('price_text')) is None:
+            parts.append(item.get('price_text'))
+
+        return ' '.join(str(part).strip() for part in parts if part).strip()
+
+    def extract(self, item: Any) -> list[dict] | None:
+        if not isinstance(item, dict):
+            return None
+
+        brand_name = (item.get('brand_name') or item.get('brand_names') or item.get('brand') or '').strip()
+        product_name = (item.get('product_name') or item.get('name') or '').strip()
+        if not brand_name or not product_name or brand_name == 'N/A' or product_name == 'N/A':
+            self.stats['missing_brand_or_product'] += 1
+            return None
+
+        deal_text = self._get_deal_text(item)
+        if AMBIGUOUS_TEXT.search(f'{brand_name} {deal_text}'):
+            self.stats['ambiguous'] += 1
+            return None
+
+        matches = []
+        for rules in (TEXT_RULES, FIELD_RULES):
+            matches = [
+                (rule_name, fields)
+                for rule_name, rule in rules.items()
+                if (fields := rule(deal_text, item)) is not None
+            ]
+            if matches:
+                break
+
+        if len(matches) != 1:
+            self.stats['no_match' if not matches else 'ambiguous'] += 1
+            return None
+
+        rule_name, fields = matches[0]
+        self.stats[rule_name] += 1
+
+        row = {header: 'N/A' for header in HEADERS}
+        row.update(
+            {
+                'brand_name': brand_name,
+                'product_name': product_name,
+                'description': item.get('description') or deal_text or 'N/A',
+                'valid_from': item.get('valid_from') or 'N/A',
+                'valid_to': item.get('valid_to') or item.get('expiration_date') or 'N/A',
+                'requires_store_card': bool(
+                    STORE_CARD_TEXT.search(f'{deal_text} {item.get("description") or ""}')
+                ),
+            }
+        )
+        row.update(fields)
+
+        return [row]
+
+    def split(self, items: list[Any]) -> tuple[list[tuple[Any, list[dict]]], list[Any]]:
+        """
+        Splits queued items into the items extracted by the rules, each with its rows, and the residual
+        items that still need Gemini.
+        """
+        extracted_items = []
+        residual = []
+        for item in items:
+            extracted = self.extract(item)
+            if extracted is None:
+                residual.append(item)
+                continue
+
+            extracted_items.append((item, extracted))
+
+        return extracted_items, residual
@@ -17,6 +17,7 @@ from rapidfuzz import fuzz
 from utils.constants import modal_html, extra_script
 from stores.lib.constants import POSSIBLE_STORE_COLORS
 from utils.config import get_config
+from utils.executors import run_in_thread
 
 
 def geocode_zip(openrouteservice_api_key: str, **kwargs):
@@ -108,10 +109,11 @@ async def determine_store_paths():
         )
         return
 
-    begin_long, begin_lat = geocode_zip(**directions_config)
+    # the openrouteservice client is synchronous, so its calls run in the thread pool
+    begin_long, begin_lat = await run_in_thread(geocode_zip, **directions_config)
     api_key = directions_config['openrouteservice_api_key']
 
-    locations_by_store = get_locations_by_store(
+    locations_by_store = await get_locations_by_store(
         api_key=api_key,
         begin_lat=begin_lat,
         begin_long=begin_long,
@@ -127,7 +129,8 @@ async def determine_store_paths():
     ]
 
     # plot the route
-    route = directions.directions(
+    route = await run_in_thread(
+        directions.directions,
         client=openrouteservice.Client(key=api_key),
         coordinates=all_locations,
         profile='driving-car',
@@ -288,7 +291,7 @@ def add_markers_to_map(
     return m
 
 
-def get_locations_by_store(
+async def get_locations_by_store(
     api_key: str,
     begin_lat: float,
     begin_long: float,
@@ -296,10 +299,14 @@ def get_locations_by_store(
 ):
     locations_by_store = defaultdict(list)
     for store_name in included_stores:
-        # search for local locations of store
-        locations = get_store_locations(
-            api_key, store_name, begin_lat, begin_long
-        )
+        # search for local locations of store - one lookup at a time, to stay within the ORS rate limit
+        try:
+            locations = await run_in_thread(
+                get_store_locations, api_key, store_name, begin_lat, begin_long
+            )
+        except Exception as e:
+            logger.error(f'Unable to look up locations for store {store_name}: {e}')
+            continue
 
         if not locations:
             logger.error(f'No locations found for store: {store_name}')
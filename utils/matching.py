@@ -72,9 +72,11 @@ def match_multiple_columns(
         row1 = df1.loc[idx1].to_dict()
         row2 = df2.loc[idx2].to_dict()
 
-        # compare the brand names
-        brand_score = fuzz.token_sort_ratio(
-            row1['brand_name'], row2['brand_name']
+        # compare the brand names - rows without a brand on either side aren't told apart by it
+        brand_score = (
+            100
+            if pd.isnull(row1['brand_name']) and pd.isnull(row2['brand_name'])
+            else fuzz.token_sort_ratio(row1['brand_name'], row2['brand_name'])
         )
         if brand_score < 40:
             continue
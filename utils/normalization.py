@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from stores.lib.constants import (
+    BOOLEAN_HEADERS,
+    DATE_HEADERS,
+    HEADERS,
+    OUTPUT_COLUMN_ALIASES,
+)
+from utils.call_ai_model_gemini import PRODUCT_SCHEMA
+from utils.decoding import EMPTY_STRINGS, TRUE_STRINGS
+
+
+def _column_types() -> dict[str, str]:
+    schema_by_header = {
+        OUTPUT_COLUMN_ALIASES.get(name, name): schema
+        for name, schema in PRODUCT_SCHEMA['properties'].items()
+    }
+
+    column_types = {}
+    for header in HEADERS:
+        schema = schema_by_header.get(header, {})
+        if header in DATE_HEADERS:
+            column_types[header] = 'date'
+        elif header in BOOLEAN_HEADERS or schema.get('type_') == 'BOOLEAN':
+            column_types[header] = 'boolean'
+        elif schema.get('type_') == 'NUMBER':
+            column_types[header] = (
+                'integer' if schema.get('format', '').startswith('int') else 'float'
+            )
+        else:
+            column_types[header] = 'string'
+
+    return column_types
+
+
+# the type of every deal column, from the `extract_rows` schema
+COLUMN_TYPES = _column_types()
+
+
+def _missing(values: pd.Series) -> pd.Series:
+    return values.isna() | values.astype('string').str.strip().str.lower().isin(EMPTY_STRINGS)
+
+
+def normalize_deals(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Types a store's full table in one columnar pass over the `HEADERS` schema. Numbers become nullable
+    `Int64`/`Float64` columns (`Float64` when an integer column holds fractions), booleans `boolean`,
+    dates `datetime64` and text `string` - every `N/A` sentinel becomes a real missing value.
+    """
+    frame = frame.copy()
+    for column, column_type in COLUMN_TYPES.items():
+        if column not in frame:
+            continue
+
+        values = frame[column]
+        missing = _missing(values)
+
+        if column_type == 'boolean':
+            frame[column] = (
+                values.astype('string').str.strip().str.lower().isin(TRUE_STRINGS).astype('boolean')
+            )
+        elif column_type == 'date':
+            frame[column] = pd.to_datetime(
+                values.astype('string').mask(missing), errors='coerce', format='ISO8601'
+            ).dt.normalize()
+        elif column_type in ('integer', 'float'):
+            numbers = pd.to_numeric(values.mask(missing), errors='coerce').astype('Float64')
+            if column_type == 'integer' and (numbers.dropna() % 1 == 0).all():
+                numbers = numbers.astype('Int64')
+
+            frame[column] = numbers
+        else:
+            frame[column] = values.astype('string').str.strip().mask(missing)
+
+    return frame
+
+
+def deals_frame(values: Iterable[Iterable]) -> pd.DataFrame:
+    return normalize_deals(pd.DataFrame(list(values), columns=HEADERS))
+
+
+def to_python(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    The same table with plain Python values in `object` columns and `None` for missing values - for code
+    that compares values one at a time, like the fuzzy matching.
+    """
+    frame = frame.astype(object)
+    for column, column_type in COLUMN_TYPES.items():
+        if column_type == 'date' and column in frame:
+            frame[column] = [
+                value.date() if isinstance(value, pd.Timestamp) else value
+                for value in frame[column]
+            ]
+
+    return frame.where(frame.notna(), None)
+
+
+def _python_value(value: Any) -> Any:
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+
+    if isinstance(value, pd.Timestamp):
+        return value.date()
+
+    if isinstance(value, np.generic):
+        value = value.item()
+
+    if isinstance(value, float) and np.isnan(value):
+        return None
+
+    return value
+
+
+def frame_rows(frame: pd.DataFrame) -> Iterator[list[Any]]:
+    for row in frame.itertuples(index=False, name=None):
+        yield [_python_value(value) for value in row]
+
+
+def column_style(values: pd.Series) -> str:
+    """
+    The export style of a normalized column - number formats are applied per column, not per cell.
+    """
+    if pd.api.types.is_bool_dtype(values):
+        return 'text'
+
+    if pd.api.types.is_integer_dtype(values):
+        return 'integer'
+
+    if pd.api.types.is_float_dtype(values):
+        return 'currency'
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 'date'
+
+    return 'text'
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from lib.DealDatabase import DealDatabase
+from lib.constants import GLOBAL_COUPON_PROVIDERS
+from utils.normalization import COLUMN_TYPES, normalize_deals
+
+DEFAULT_PATH = 'output/parquet'
+
+# the columns `match_multiple_columns` adds to the rows of a match
+MATCHUP_COLUMN_TYPES = {
+    'matched_column': 'string',
+    'matched_value': 'string',
+    'similarity_score': 'float',
+    'matched_row_index': 'string',
+}
+
+
+def _arrow_type(column_type: str):
+    return {
+        'integer': pa.int64(),
+        'float': pa.float64(),
+        'boolean': pa.bool_(),
+        'date': pa.date32(),
+    }.get(column_type, pa.string())
+
+
+def _arrow_table(frame: pd.DataFrame, column_types: dict[str, str]):
+    """
+    The normalized `frame` as an Arrow table with a fixed schema - every column keeps its type even when a
+    store has no values for it, so the partitions of a dataset always agree.
+    """
+    fields = []
+    arrays = []
+    for column in frame.columns:
+        column_type = column_types.get(column, 'string')
+        values = frame[column]
+        if column_type == 'integer' and pd.api.types.is_float_dtype(values):
+            # `normalize_deals` keeps an integer column with fractions as floats - don't truncate them
+            column_type = 'float'
+
+        if column_type == 'date':
+            array = pa.array(values, from_pandas=True).cast(pa.date32())
+        elif column_type == 'string':
+            array = pa.array(values.astype('string'), type=pa.string(), from_pandas=True)
+        else:
+            array = pa.array(values, type=_arrow_type(column_type), from_pandas=True)
+
+        fields.append(pa.field(column, _arrow_type(column_type)))
+        arrays.append(array)
+
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def _write_partition(
+    root: Path, dataset: str, sheet: str, week: str, table, compression: str
+) -> None:
+    # hive-style partitions, so readers get `store` and `week` columns and can filter on them
+    partition = root / dataset / f'store={sheet}' / f'week={week}'
+    if partition.exists():
+        shutil.rmtree(partition)
+
+    # an empty table leaves no partition behind, rather than the one of an earlier run this week
+    if table is None or not table.num_rows:
+        return
+
+    partition.mkdir(parents=True)
+    pq.write_table(table, partition / 'part-0.parquet', compression=compression)
+
+
+def export_parquet(
+    sheet_names: list[str],
+    deal_database: DealDatabase,
+    path: str | Path = DEFAULT_PATH,
+    compression: str = 'zstd',
+) -> dict[str, Any]:
+    """
+    Writes the current week of every sheet as typed Parquet datasets - `sales`, `coupons` and `matchups`,
+    each partitioned by store and week under `path` - next to the CSV export. Columns follow the
+    `HEADERS` schema, with missing values as nulls instead of `N/A`. Partitions of earlier weeks are kept,
+    so a dataset grows into the history of every run.
+    """
+    root = Path(path)
+    week = deal_database.week
+    counts = {'sales': 0, 'coupons': 0, 'matchups': 0}
+    for sheet_name in sheet_names:
+        dataset = (
+            'coupons'
+            if sheet_name.endswith((*GLOBAL_COUPON_PROVIDERS, '-coupons'))
+            else 'sales'
+        )
+        frame = normalize_deals(
+            pd.DataFrame(deal_database.get_values(sheet_name), columns=deal_database.headers)
+        )
+        _write_partition(
+            root, dataset, sheet_name, week, _arrow_table(frame, COLUMN_TYPES), compression
+        )
+        counts[dataset] += len(frame)
+
+        matchup_columns = deal_database.get_matchup_columns(sheet_name)
+        matchups = None
+        if matchup_columns:
+            matchups = normalize_deals(
+                pd.DataFrame(list(deal_database.iter_matchups(sheet_name)), columns=matchup_columns)
+            )
+            counts['matchups'] += len(matchups)
+
+        _write_partition(
+            root,
+            'matchups',
+            sheet_name,
+            week,
+            None
+            if matchups is None
+            else _arrow_table(matchups, {**COLUMN_TYPES, **MATCHUP_COLUMN_TYPES}),
+            compression,
+        )
+
+    return counts
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+import orjson
+
+from utils.text import estimate_tokens
+
+EMPTY_VALUES = ('', 'N/A', None)
+
+
+def _is_empty(value: Any) -> bool:
+    if isinstance(value, (list, dict)):
+        return not value
+
+    return value in EMPTY_VALUES
+
+
+def _drop_empty(value: Any) -> Any:
+    # only fields are dropped - list elements are kept, so positions (like `source_item`) still line up
+    if isinstance(value, dict):
+        return {
+            k: _drop_empty(v) for k, v in value.items() if not _is_empty(v)
+        }
+
+    if isinstance(value, list):
+        return [_drop_empty(v) for v in value]
+
+    return value
+
+
+def _as_items(user_input: Any) -> list:
+    return user_input if isinstance(user_input, list) else [user_input]
+
+
+def encode_json(user_input: Any) -> str:
+    return f'```json\n{orjson.dumps(user_input, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS, default=str).decode("utf-8")}```'
+
+
+def encode_compact(user_input: Any) -> str:
+    return f'```json\n{orjson.dumps(_drop_empty(user_input), default=str).decode("utf-8")}\n```'
+
+
+def encode_table(user_input: Any) -> str:
+    items = [_drop_empty(item) for item in _as_items(user_input)]
+
+    # keep the columns in the order they first appear, and only the ones that are set on some item
+    columns = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+
+        for key in item:
+            if key not in columns:
+                columns.append(key)
+
+    lines = [orjson.dumps(columns)]
+    for item in items:
+        if not isinstance(item, dict):
+            lines.append(orjson.dumps([item], default=str))
+            continue
+
+        lines.append(
+            orjson.dumps([item.get(column) for column in columns], default=str)
+        )
+
+    table = b'\n'.join(lines).decode('utf-8')
+    return (
+        'The items are given as a table: the first row lists the field names, and every following row is '
+        f'one item with its values in the same order (null when the item has no value).\n```\n{table}\n```'
+    )
+
+
+PROMPT_INPUT_ENCODINGS: dict[str, Callable[[Any], str]] = {
+    'json': encode_json,
+    'compact': encode_compact,
+    'table': encode_table,
+}
+
+
+def encode_user_input(user_input: Any, encoding: str = 'json') -> str:
+    if encoding not in PROMPT_INPUT_ENCODINGS:
+        raise ValueError(
+            f"Unknown prompt input encoding '{encoding}' - must be one of {', '.join(PROMPT_INPUT_ENCODINGS)}"
+        )
+
+    return PROMPT_INPUT_ENCODINGS[encoding](user_input)
+
+
+def measure_encodings(
+    user_input: Any,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> dict[str, float]:
+    """
+    Reports the tokens per item each encoding would spend on `user_input`.
+
+    `count_tokens` defaults to the character-based estimate, and can be swapped for a model's real
+    token counter when exact numbers are needed.
+    """
+    item_count = max(len(_as_items(user_input)), 1)
+    return {
+        encoding: round(count_tokens(encode(user_input)) / item_count, 1)
+        for encoding, encode in PROMPT_INPUT_ENCODINGS.items()
+    }
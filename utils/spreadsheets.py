@@ -1,40 +1,126 @@
-from openpyxl.cell import Cell
-from openpyxl.styles import PatternFill, Font
+import csv
+from typing import Any, Iterable
+
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
 
 from utils.random_utils import random_hex_color_code
 
+# matchup groups cycle through this many colors, so the workbook holds a fixed number of styles
+MATCHUP_STYLE_COUNT = 32
+
+
+def register_named_styles(wb) -> dict[str, Any]:
+    """
+    Adds the fixed pool of named styles the export uses to `wb`. Every cell refers to one of them by name,
+    instead of carrying its own copy of a font, fill, border and alignment.
+    """
+    centered = Alignment(horizontal='center', vertical='center')
+    thin = Side(border_style='thin', color='000000')
+
+    styles = {
+        'header': NamedStyle(
+            name='Deal Header',
+            font=Font(bold=True, color='FFFFFF', name='Segoe UI'),
+            border=Border(left=thin, right=thin, top=thin, bottom=thin),
+            alignment=centered,
+            fill=PatternFill(fgColor='424242', patternType='solid'),
+        ),
+        'text': NamedStyle(name='Deal Text', alignment=centered),
+        'integer': NamedStyle(name='Deal Integer', alignment=centered, number_format='#,##0'),
+        'currency': NamedStyle(name='Deal Currency', alignment=centered, number_format='0.00'),
+        'date': NamedStyle(name='Deal Date', alignment=centered, number_format='yyyy-mm-dd'),
+    }
+    for style in styles.values():
+        wb.add_named_style(style)
+
+    colors = set()
+    while len(colors) < MATCHUP_STYLE_COUNT:
+        colors.add(random_hex_color_code())
+
+    styles['matchups'] = []
+    for i, (fill_color, font_color) in enumerate(sorted(colors)):
+        style = NamedStyle(
+            name=f'Matchup {i + 1}',
+            fill=PatternFill('solid', fgColor=fill_color),
+            font=Font(color=font_color),
+        )
+        wb.add_named_style(style)
+        styles['matchups'].append(style)
+
+    return styles
+
+
+def write_formatted_rows(
+    sheet,
+    styles: dict[str, Any],
+    headers: list[str],
+    title_header: list[str],
+    column_styles: list[str],
+    rows: Iterable[Iterable],
+):
+    """
+    Streams a deal sheet into a write-only worksheet - a styled header row, then one style per column, with
+    missing values written as `N/A`.
+    """
+    width = max([len(header) for header in headers]) + 5
+    for col in range(1, len(title_header) + 1):
+        sheet.column_dimensions[get_column_letter(col)].width = width
 
-def write_grouped_rows_with_colors(rows, sheet):
-    rows_to_colors = {}
+    header_row = []
+    for title in title_header:
+        cell = WriteOnlyCell(sheet, value=title)
+        cell.style = styles['header'].name
+        header_row.append(cell)
+
+    sheet.append(header_row)
+
+    style_names = [styles[style].name for style in column_styles]
+    text_style = styles['text'].name
+    for row in rows:
+        cells = []
+        for value, style_name in zip(row, style_names):
+            if value is None:
+                cell = WriteOnlyCell(sheet, value='N/A')
+                cell.style = text_style
+            else:
+                cell = WriteOnlyCell(sheet, value=value)
+                cell.style = style_name
+
+            cells.append(cell)
+
+        sheet.append(cells)
+
+
+def write_grouped_rows_with_colors(rows: Iterable[list], sheet, styles: dict[str, Any]):
+    """
+    Streams matchups into a write-only worksheet. The first row is the header, and rows of the same match
+    (the same last column) share a color.
+    """
+    rows_to_styles = {}
     for r_idx, row in enumerate(rows, 1):
         if r_idx == 1:
             sheet.append(row)
             continue
 
-        for c_idx, value in enumerate(row, 1):
-            if isinstance(value, Cell):
-                value = value.value
-
-            cell = sheet.cell(row=r_idx, column=c_idx, value=value)
-
-            matching_row_index = row[-1]
-            if matching_row_index not in rows_to_colors:
-                random_color_code, font_color = random_hex_color_code()
-                while random_color_code in rows_to_colors.values():
-                    random_color_code, font_color = random_hex_color_code()
+        matching_row_index = row[-1]
+        if matching_row_index not in rows_to_styles:
+            rows_to_styles[matching_row_index] = styles['matchups'][
+                len(rows_to_styles) % len(styles['matchups'])
+            ].name
 
-                rows_to_colors[matching_row_index] = {
-                    'fill': PatternFill('solid', fgColor=random_color_code),
-                    'font': Font(color=font_color),
-                }
+        cells = []
+        for value in row:
+            cell = WriteOnlyCell(sheet, value='N/A' if value is None else value)
+            cell.style = rows_to_styles[matching_row_index]
+            cells.append(cell)
 
-            cell.fill = rows_to_colors[matching_row_index]['fill']
-            cell.font = rows_to_colors[matching_row_index]['font']
+        sheet.append(cells)
 
 
-def clean_workbook(wb):
-    # remove empty sheets
-    for sheet_name in wb.sheetnames:
-        sheet = wb[sheet_name]
-        if len(list(sheet.values)) <= 1:
-            del wb[sheet_name]
+def write_csv(path, columns: list[str], rows: Iterable[Iterable]):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import bisect
+import math
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from utils.config import get_config
+
+LATENCY_BUCKETS = [0.5, 1, 2, 4, 8, 16, 32, 64]
+
+_telemetry: Telemetry | None = None
+
+
+class CallMetrics:
+    """
+    What happened inside one extraction call - filled in by the `make_*_gemini_call` functions.
+    """
+
+    def __init__(self) -> None:
+        self.queue_seconds = 0.0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.candidate_tokens = 0
+
+    def record_usage(self, content) -> None:
+        usage_metadata = getattr(content, 'usage_metadata', None)
+        self.prompt_tokens += getattr(usage_metadata, 'prompt_token_count', 0) or 0
+        self.candidate_tokens += getattr(usage_metadata, 'candidates_token_count', 0) or 0
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    return values[min(math.ceil(len(values) * percentile), len(values)) - 1]
+
+
+class _CallGroup:
+    def __init__(self) -> None:
+        self.outcomes: Counter[str] = Counter()
+        self.wall_seconds: list[float] = []
+        self.queue_seconds = 0.0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.candidate_tokens = 0
+        self.rows = 0
+
+    def add(self, wall_seconds: float, metrics: CallMetrics, rows: int, outcome: str) -> None:
+        self.outcomes[outcome] += 1
+        self.wall_seconds.append(wall_seconds)
+        self.queue_seconds += metrics.queue_seconds
+        self.retries += metrics.retries
+        self.prompt_tokens += metrics.prompt_tokens
+        self.candidate_tokens += metrics.candidate_tokens
+        self.rows += rows
+
+    def summary(self, input_cost: float, output_cost: float) -> dict[str, Any]:
+        calls = len(self.wall_seconds)
+        histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        for seconds in self.wall_seconds:
+            histogram[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+        return {
+            'calls': calls,
+            'outcomes': dict(self.outcomes),
+            'rows': self.rows,
+            'retries': self.retries,
+            'wall_seconds': {
+                'total': round(sum(self.wall_seconds), 2),
+                'p50': round(_percentile(self.wall_seconds, 0.5), 2),
+                'p90': round(_percentile(self.wall_seconds, 0.9), 2),
+                'p99': round(_percentile(self.wall_seconds, 0.99), 2),
+                'max': round(max(self.wall_seconds, default=0.0), 2),
+                'histogram': {
+                    f'<={bucket}s' if bucket != math.inf else f'>{LATENCY_BUCKETS[-1]}s': count
+                    for bucket, count in zip([*LATENCY_BUCKETS, math.inf], histogram)
+                },
+            },
+            'queue_seconds': {
+                'total': round(self.queue_seconds, 2),
+                'mean': round(self.queue_seconds / calls, 2) if calls else 0.0,
+            },
+            'tokens': {
+                'prompt': self.prompt_tokens,
+                'candidates': self.candidate_tokens,
+                'prompt_per_row': round(self.prompt_tokens / self.rows, 1) if self.rows else 0.0,
+            },
+            'cost': round(
+                self.prompt_tokens * input_cost / 1_000_000
+                + self.candidate_tokens * output_cost / 1_000_000,
+                4,
+            ),
+        }
+
+
+class Telemetry:
+    """
+    Collects one record per extraction call - wall time, time spent queued on the rate limiter and the
+    credential pool, retries, prompt/candidate tokens, rows and outcome - and aggregates them by store,
+    prompt template and model into a machine-readable run summary.
+
+    Args:
+        input_cost_per_million (float, optional): Cost of a million prompt tokens. Defaults to 0.
+        output_cost_per_million (float, optional): Cost of a million candidate tokens. Defaults to 0.
+
+    """
+
+    def __init__(
+        self,
+        input_cost_per_million: float = 0.0,
+        output_cost_per_million: float = 0.0,
+    ) -> None:
+        self._input_cost = input_cost_per_million
+        self._output_cost = output_cost_per_million
+        self._started_at = datetime.now()
+
+        self._total = _CallGroup()
+        self._groups: dict[str, dict[str, _CallGroup]] = {
+            'store': defaultdict(_CallGroup),
+            'template': defaultdict(_CallGroup),
+            'model': defaultdict(_CallGroup),
+        }
+
+    def record(
+        self,
+        store: str,
+        template: str,
+        model: str,
+        wall_seconds: float,
+        metrics: CallMetrics,
+        rows: int,
+        outcome: str,
+    ) -> None:
+        self._total.add(wall_seconds, metrics, rows, outcome)
+        for group, key in (('store', store), ('template', template), ('model', model)):
+            self._groups[group][key].add(wall_seconds, metrics, rows, outcome)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            'started_at': self._started_at.isoformat(),
+            'finished_at': datetime.now().isoformat(),
+            'total': self._total.summary(self._input_cost, self._output_cost),
+            **{
+                f'by_{group}': {
+                    key: call_group.summary(self._input_cost, self._output_cost)
+                    for key, call_group in sorted(call_groups.items())
+                }
+                for group, call_groups in self._groups.items()
+            },
+        }
+
+    def write_summary(self, path: str) -> dict[str, Any]:
+        summary = self.summary()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_bytes(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
+
+        return summary
+
+
+def get_telemetry() -> Telemetry:
+    global _telemetry
+
+    if _telemetry is None:
+        default_section = get_config()['config']
+        _telemetry = Telemetry(
+            input_cost_per_million=default_section.getfloat('COST_PER_MILLION_INPUT_TOKENS', 0),
+            output_cost_per_million=default_section.getfloat('COST_PER_MILLION_OUTPUT_TOKENS', 0),
+        )
+
+    return _telemetry
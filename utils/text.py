@@ -9,3 +9,8 @@ def clean_text(text: str) -> str | None:
     return re.sub(
         r"[^a-zA-Z\u00C0-\u00ff\s |$#!%&*(),':.\[\]?\\/\"><+_\-0-9]", '', text
     )
+
+
+def estimate_tokens(text: str) -> int:
+    # Gemini averages roughly four characters per token for English text
+    return len(text) // 4 + 1